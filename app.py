@@ -1,53 +1,103 @@
 from __future__ import annotations
 
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Tuple
 
 import streamlit as st
 
+from catalog_db import SqliteCatalog, ensure_catalog_imported
+from catalog_store import SharedCatalog, attach_shared_catalog
 from config import (
     APP_SUBTITLE,
     APP_TITLE,
     ENABLE_OPENAI_BY_DEFAULT,
     ENABLE_WEB_RESEARCH_BY_DEFAULT,
+    JOB_WORKERS,
     OPENAI_MODEL,
+    OPENAI_USE_STUB,
     OPENAI_WEB_MODEL,
-    TOP_MATCH_COUNT,
+    PROFILE_DIR,
+    USE_SHARED_CATALOG,
+    USE_SQLITE_CATALOG,
 )
 from db import ensure_db
-from drafting import create_application_draft
-from matching import match_foundations
-from models import ApplicantInsights, ApplicantProfile, MatchResult
+from drafting import create_application_drafts, render_draft
+from jobs import (
+    ACTIVE_STATUSES,
+    JobWorkerPool,
+    build_enrichment_handlers,
+    cancel_job,
+    list_jobs_for_application,
+)
+from matching import score_foundation
+from models import ApplicantInsights, ApplicantProfile, Foundation, MatchResult
 from openai_service import (
-    create_application_draft_ai,
-    extract_applicant_insights,
+    get_call_metrics,
     is_openai_available,
-    research_foundations_on_web,
+    iter_application_drafts_ai,
+    set_client_factory,
+)
+from openai_stub import StubOpenAI
+from profiling import PROFILING_ENABLED, profiled, slowest_reports
+from repository import (
+    list_recent_applications,
+    load_application,
+    load_insights,
+    load_latest_drafts,
+    load_match_results,
+    load_research,
+    max_application_id,
+    save_draft,
+    search_applications,
 )
-from repository import save_application, save_matches
+from rescoring import foundation_hash
+from reverse_matching import applicant_page, rank_applicant_ids
 from seed import load_foundations
+from stats import read_stats
+from submission import submit_profile
 
 st.set_page_config(page_title=APP_TITLE, page_icon='📄', layout='centered')
 
-ensure_db()
-FOUNDATIONS = load_foundations()
-OPENAI_READY = is_openai_available()
+
+def load_catalog() -> List[Foundation] | SharedCatalog | SqliteCatalog:
+    if USE_SQLITE_CATALOG:
+        return ensure_catalog_imported()
+    return attach_shared_catalog() if USE_SHARED_CATALOG else load_foundations()
+
+
+@st.cache_resource
+def start_job_workers() -> JobWorkerPool:
+    return JobWorkerPool(build_enrichment_handlers(load_catalog), workers=JOB_WORKERS).start()
+
 
 SESSION_DEFAULTS = {
     'submitted_profile': None,
     'matches': [],
     'application_id': None,
     'draft': '',
+    'multi_draft': False,
+    'drafts': {},
     'ai_insights': None,
     'ai_enabled': False,
     'web_research': '',
     'ai_error': '',
+    'awaiting_jobs': False,
+    'applicant_ranking_query': None,
 }
-for key, value in SESSION_DEFAULTS.items():
-    if key not in st.session_state:
-        st.session_state[key] = value
+
+JOB_LABELS = {'insights': 'AI-tolkning', 'draft': 'AI-utkast', 'research': 'Webbresearch'}
+RANKING_PAGE_SIZE = 20
+RANKING_PAGES_PER_BLOCK = 10
+
+
+def init_session_state() -> None:
+    for key, value in SESSION_DEFAULTS.items():
+        if key not in st.session_state:
+            st.session_state[key] = value
 
 
 def foundation_counts() -> Dict[str, int]:
+    if isinstance(FOUNDATIONS, (SharedCatalog, SqliteCatalog)):
+        return FOUNDATIONS.term_counts('categories')
     categories: Dict[str, int] = {}
     for foundation in FOUNDATIONS:
         for category in foundation.categories:
@@ -90,50 +140,164 @@ def render_header() -> None:
         st.write('Den lokala matchningen kör alltid mot repo:ts egen stiftelsekatalog.')
         st.write(f'Textmodell: `{OPENAI_MODEL}`')
         st.write(f'Webbmodell: `{OPENAI_WEB_MODEL}`')
+        metrics = get_call_metrics()
+        st.write(
+            f"AI-anrop: {metrics['calls']} · sammanslagna: {metrics['coalesced']} · "
+            f"köade: {metrics['throttled']} · avvisade: {metrics['rejected']}"
+        )
         if not OPENAI_READY:
             st.info('Lägg till OPENAI_API_KEY i .env om du vill aktivera AI-tolkning och bättre utkast.')
+    render_stats_panel()
+    if PROFILING_ENABLED:
+        render_profiling_panel()
+
+
+def render_profiling_panel() -> None:
+    with st.expander('Profilering (admin)', expanded=False):
+        label = st.radio('Visa', ['rerun', 'submit'], horizontal=True, format_func={'rerun': 'Omkörningar', 'submit': 'Inskick'}.get)
+        reports = slowest_reports(PROFILE_DIR, label=label, limit=10)
+        if not reports:
+            st.write('Inga rapporter ännu.')
+            return
+        st.dataframe(
+            [
+                {
+                    'Start (UTC)': report['started_at'],
+                    'Sekunder': report['seconds'],
+                    'Topp-minne (KiB)': report['peak_kib'],
+                    'Heta funktioner': ', '.join(report['hot']),
+                    'Rapport': report['stem'],
+                }
+                for report in reports
+            ],
+            width='stretch',
+            hide_index=True,
+        )
+        st.caption(f'Rapporterna ligger i `{PROFILE_DIR}`. `.folded`-filerna kan läsas av flamegraph.pl och speedscope.')
+
+
+def render_stats_panel() -> None:
+    stats = read_stats()
+    with st.expander('Statistik för handläggare', expanded=False):
+        col1, col2, col3 = st.columns(3)
+        col1.metric('Ansökningar', stats['applications'])
+        col2.metric('Matchningar', stats['matches'])
+        col3.metric('Saknar underlag', f"{stats['missing_documents_share']:.0%}")
+        if stats['applications_per_category']:
+            st.markdown('**Ansökningar per kategori**')
+            st.bar_chart(stats['applications_per_category'], horizontal=True)
+        if stats['top_foundations']:
+            st.markdown('**Mest matchade stiftelser**')
+            st.dataframe(
+                [
+                    {
+                        'Stiftelse': row['foundation_name'],
+                        'Matchningar': row['match_count'],
+                        'Snittpoäng': row['average_score'],
+                        'Saknar underlag': f"{row['missing_documents_share']:.0%}",
+                    }
+                    for row in stats['top_foundations']
+                ],
+                width='stretch',
+                hide_index=True,
+            )
 
 
-def submit_application(profile: ApplicantProfile, use_ai: bool, use_web_research: bool) -> None:
-    ai_error = ''
-    insights: ApplicantInsights | None = None
-    extra_keywords: list[str] = []
-
-    if use_ai and OPENAI_READY:
-        try:
-            insights = extract_applicant_insights(profile)
-            extra_keywords = insights.extra_keywords
-        except Exception as exc:
-            ai_error = f'AI-tolkningen kunde inte köras: {exc}'
-
-    matches = match_foundations(profile, FOUNDATIONS, top_n=TOP_MATCH_COUNT, extra_keywords=extra_keywords)
-    application_id = save_application(profile)
-    save_matches(application_id, matches)
-
-    if use_ai and OPENAI_READY:
-        try:
-            draft = create_application_draft_ai(profile, matches, insights)
-        except Exception as exc:
-            ai_error = (ai_error + "\n" if ai_error else "") + f"AI-utkastet kunde inte köras: {exc}"
-            draft = create_application_draft(profile, matches, insights)
-    else:
-        draft = create_application_draft(profile, matches, insights)
+def submit_application(
+    profile: ApplicantProfile,
+    use_ai: bool,
+    use_web_research: bool,
+    multi_draft: bool = False,
+) -> None:
+    # Only local work happens here; AI insights, the AI draft and web research
+    # are queued as background jobs and picked up by render_job_progress.
+    use_ai = bool(use_ai and OPENAI_READY)
+    submission = submit_profile(profile, FOUNDATIONS, use_ai, use_web_research, multi_draft)
 
-    web_research = ''
-    if use_ai and use_web_research and OPENAI_READY:
-        try:
-            web_research = research_foundations_on_web(profile, insights)
-        except Exception as exc:
-            ai_error = (ai_error + "\n" if ai_error else "") + f"Webbresearch kunde inte köras: {exc}"
+    st.session_state.submitted_profile = profile
+    st.session_state.matches = submission.matches
+    st.session_state.application_id = submission.application_id
+    st.session_state.draft = submission.draft
+    st.session_state.multi_draft = multi_draft
+    st.session_state.drafts = {}
+    st.session_state.ai_insights = None
+    st.session_state.ai_enabled = use_ai
+    st.session_state.web_research = ''
+    st.session_state.ai_error = ''
+    st.session_state.awaiting_jobs = use_ai
+
+
+def find_foundation(foundation_id: str) -> Foundation | None:
+    if isinstance(FOUNDATIONS, (SharedCatalog, SqliteCatalog)):
+        return FOUNDATIONS.find(foundation_id)
+    return next((foundation for foundation in FOUNDATIONS if foundation.id == foundation_id), None)
+
+
+def open_application(application_id: int, multi_draft: bool | None = None) -> bool:
+    profile = load_application(application_id)
+    if profile is None:
+        return False
+    insights = load_insights(application_id)
+    drafts = load_latest_drafts(application_id)
+    jobs = list_jobs_for_application(application_id)
 
     st.session_state.submitted_profile = profile
-    st.session_state.matches = matches
+    st.session_state.matches = load_match_results(application_id, find_foundation)
     st.session_state.application_id = application_id
-    st.session_state.draft = draft
+    st.session_state.draft = drafts.pop('', {}).get('body', '')
+    st.session_state.multi_draft = bool(drafts) if multi_draft is None else multi_draft
+    st.session_state.drafts = {foundation_id: row['body'] for foundation_id, row in drafts.items()}
     st.session_state.ai_insights = insights
-    st.session_state.ai_enabled = bool(use_ai and OPENAI_READY)
-    st.session_state.web_research = web_research
-    st.session_state.ai_error = ai_error
+    st.session_state.ai_enabled = bool(OPENAI_READY and insights is not None)
+    st.session_state.web_research = load_research(application_id)
+    st.session_state.ai_error = '\n'.join(
+        f'{JOB_LABELS.get(job.kind, job.kind)} kunde inte köras: {job.error}' for job in jobs if job.status == 'failed'
+    )
+    st.session_state.awaiting_jobs = any(job.status in ACTIVE_STATUSES for job in jobs)
+    return True
+
+
+@st.fragment(run_every=2)
+def render_job_progress() -> None:
+    application_id = st.session_state.application_id
+    if application_id is None or not st.session_state.awaiting_jobs:
+        return
+
+    jobs = list_jobs_for_application(application_id)
+    active = [job for job in jobs if job.status in ACTIVE_STATUSES]
+    if not active:
+        open_application(application_id, multi_draft=st.session_state.multi_draft)
+        st.rerun()
+
+    for job in active:
+        label = JOB_LABELS.get(job.kind, job.kind)
+        status = f'pågår (försök {job.attempts} av {job.max_attempts})' if job.status == 'running' else 'står i kö'
+        info_col, cancel_col = st.columns([4, 1])
+        info_col.info(f'{label} {status} …')
+        if cancel_col.button('Avbryt', key=f'cancel_job_{job.id}'):
+            cancel_job(job.id)
+
+
+def render_open_application() -> None:
+    recent = list_recent_applications(limit=20)
+    if not recent:
+        return
+    with st.expander('Öppna tidigare ansökan', expanded=False):
+        query = st.text_input('Sök i beskrivningar', placeholder='implantat, hyresskuld …')
+        rows = search_applications(query, limit=20) if query.strip() else recent
+        if not rows:
+            st.info('Inga ansökningar matchar sökningen.')
+            return
+        labels = {
+            row['id']: f"#{row['id']} · {row['full_name']} · {row['need_category']} · {row['created_at'][:10]}"
+            for row in rows
+        }
+        selected_id = st.selectbox('Ansökan', list(labels), format_func=labels.get)
+        if query.strip():
+            snippets = {row['id']: row['snippet'] for row in rows}
+            st.caption(snippets[selected_id])
+        if st.button('Öppna', key='open_application') and not open_application(int(selected_id)):
+            st.error('Ansökan kunde inte hittas.')
 
 
 def render_input_tab() -> None:
@@ -190,6 +354,7 @@ def render_input_tab() -> None:
                 value=web_default,
                 disabled=not (OPENAI_READY and use_ai),
             )
+        multi_draft = st.checkbox('Skapa ett anpassat utkast för varje föreslagen stiftelse')
         consent = st.checkbox('Jag godkänner att uppgifterna används för att hitta relevanta stiftelser.', value=True)
 
         submitted = st.form_submit_button('Hitta stiftelser', width='stretch')
@@ -227,7 +392,8 @@ def render_input_tab() -> None:
         st.error(f'Kunde inte tolka formuläret: {exc}')
         return
 
-    submit_application(profile, bool(use_ai), bool(use_web_research))
+    with profiled('submit'):
+        submit_application(profile, bool(use_ai), bool(use_web_research), bool(multi_draft))
     st.success('Klart! Gå till fliken Resultat för att se dina matchningar och ansökningsutkastet.')
 
 
@@ -252,6 +418,7 @@ def render_match_card(match: MatchResult, rank: int) -> None:
 
 def render_results_tab() -> None:
     st.subheader('2. Resultat')
+    render_open_application()
     matches: List[MatchResult] = st.session_state.matches
     if not matches:
         st.info('Fyll i inmatningsfliken först.')
@@ -265,6 +432,7 @@ def render_results_tab() -> None:
     summary_col2.metric('Behov', profile.need_category)
     summary_col3.metric('Belopp', f'{profile.requested_amount_sek:,} SEK')
 
+    render_job_progress()
     if st.session_state.ai_error:
         st.warning(st.session_state.ai_error)
 
@@ -289,8 +457,65 @@ def render_results_tab() -> None:
             st.markdown(st.session_state.web_research)
             st.info('Kontrollera alltid riktiga kriterier, deadlines och ansökningslänkar manuellt.')
 
-    st.markdown('### Första utkast till ansökan')
-    st.text_area('Redigerbart utkast', value=st.session_state.draft, height=340)
+    if st.session_state.multi_draft:
+        render_match_drafts(profile, matches, insights)
+    else:
+        st.markdown('### Första utkast till ansökan')
+        edited = st.text_area('Redigerbart utkast', value=st.session_state.draft, height=340)
+        if st.button('Spara ändringar', key='save_draft') and edited != st.session_state.draft:
+            version = save_draft(st.session_state.application_id, edited, 'handläggare')
+            st.session_state.draft = edited
+            st.success(f'Utkastet sparades som version {version}.')
+
+
+def show_match_draft(placeholder: Any, match: MatchResult, draft: str) -> None:
+    foundation_id = match.foundation.id
+    with placeholder.container():
+        edited = st.text_area(
+            f'Utkast till {match.foundation.name}',
+            value=draft,
+            height=300,
+            key=f'draft_{foundation_id}',
+        )
+        if st.button('Spara ändringar', key=f'save_draft_{foundation_id}') and edited != draft:
+            version = save_draft(st.session_state.application_id, edited, 'handläggare', foundation_id)
+            st.session_state.drafts[foundation_id] = edited
+            st.success(f'Utkastet sparades som version {version}.')
+
+
+def render_match_drafts(
+    profile: ApplicantProfile,
+    matches: List[MatchResult],
+    insights: ApplicantInsights | None,
+) -> None:
+    st.markdown('### Utkast per stiftelse')
+    drafts: Dict[str, str] = st.session_state.drafts
+    placeholders = {}
+    for match in matches:
+        placeholders[match.foundation.id] = st.empty()
+        if match.foundation.id in drafts:
+            show_match_draft(placeholders[match.foundation.id], match, drafts[match.foundation.id])
+        else:
+            placeholders[match.foundation.id].info(f'Skriver utkast till {match.foundation.name} …')
+
+    pending = [match for match in matches if match.foundation.id not in drafts]
+    if not pending or st.session_state.awaiting_jobs:
+        return
+
+    if st.session_state.ai_enabled:
+        for index, draft, error in iter_application_drafts_ai(profile, pending, insights):
+            match = pending[index]
+            if error is not None:
+                st.warning(f'AI-utkastet till {match.foundation.name} kunde inte köras: {error}')
+                draft = render_draft(profile, match, insights)
+            save_draft(st.session_state.application_id, draft, 'lokal' if error else 'ai', match.foundation.id)
+            drafts[match.foundation.id] = draft
+            show_match_draft(placeholders[match.foundation.id], match, draft)
+    else:
+        for match, draft in zip(pending, create_application_drafts(profile, pending, insights)):
+            save_draft(st.session_state.application_id, draft, 'lokal', match.foundation.id)
+            drafts[match.foundation.id] = draft
+            show_match_draft(placeholders[match.foundation.id], match, draft)
 
 
 def bonus_status(match: MatchResult) -> Tuple[str, str]:
@@ -355,14 +580,94 @@ def render_bonus_tab() -> None:
             st.markdown('**Flaggor för handläggare**')
             for warning in selected_match.warnings:
                 st.write(f'- {warning}')
+        if st.toggle('Visa poängfördelning per regel'):
+            insights: ApplicantInsights | None = st.session_state.ai_insights
+            explained = score_foundation(
+                st.session_state.submitted_profile,
+                selected_match.foundation,
+                extra_keywords=insights.extra_keywords if insights else None,
+                explain=True,
+            )
+            st.dataframe(
+                [{'Regel': name, 'Poäng': points} for name, points in explained.contributions.items()],
+                width='stretch',
+                hide_index=True,
+            )
         st.info('Detta bonusläge är tänkt som ett AI-snålt och förklarbart beslutsstöd för första sortering.')
 
 
-render_header()
-input_tab, results_tab, bonus_tab = st.tabs(['Inmatning', 'Resultat', 'Bonus'])
-with input_tab:
-    render_input_tab()
-with results_tab:
-    render_results_tab()
-with bonus_tab:
-    render_bonus_tab()
+@st.cache_data(max_entries=32, show_spinner='Rangordnar sökande …')
+def cached_applicant_order(
+    _foundation: Foundation, foundation_id: str, content_hash: str, latest_application_id: int, depth: int
+) -> Tuple[int, List[Tuple[int, int]]]:
+    # Keyed on the foundation, its content and the newest application, so a new
+    # application or an edited foundation ranks again and paging never does.
+    return rank_applicant_ids(_foundation, depth=depth)
+
+
+def render_applicant_ranking() -> None:
+    st.markdown('#### Sökande som passar en stiftelse')
+    matches: List[MatchResult] = st.session_state.matches
+    with st.form('applicant_ranking'):
+        col1, col2 = st.columns([3, 1])
+        foundation_id = col1.text_input('Stiftelse-id', value=matches[0].foundation.id if matches else '')
+        page = col2.number_input('Sida', min_value=1, value=1, step=1)
+        if st.form_submit_button('Visa sökande'):
+            st.session_state.applicant_ranking_query = (foundation_id.strip(), int(page))
+    query = st.session_state.applicant_ranking_query
+    if not query or not query[0]:
+        return
+    foundation_id, page = query
+    foundation = find_foundation(foundation_id)
+    if foundation is None:
+        st.warning(f'Hittade ingen stiftelse med id {foundation_id}.')
+        return
+
+    offset = (page - 1) * RANKING_PAGE_SIZE
+    # Rank a block of pages at a time; later pages in the block are served from the cache.
+    block = RANKING_PAGE_SIZE * RANKING_PAGES_PER_BLOCK
+    depth = (offset // block + 1) * block
+    total, order = cached_applicant_order(
+        foundation, foundation.id, foundation_hash(foundation), max_application_id(), depth
+    )
+    st.caption(f'{total} sparade sökande uppfyller ålder, inkomsttak, ändamål eller målgrupp och geografi för {foundation.name}.')
+    page_matches = applicant_page(foundation, order, offset, RANKING_PAGE_SIZE)
+    if not page_matches:
+        st.info('Inga sökande på den här sidan.')
+        return
+    rows = []
+    for match in page_matches:
+        status, _ = bonus_status(match.result)
+        rows.append(
+            {
+                'Ansökan': f'#{match.application_id}',
+                'Namn': match.applicant.full_name,
+                'Kommun': match.applicant.municipality,
+                'Ålder': match.applicant.age,
+                'Behov': match.applicant.need_category,
+                'Poäng': match.result.score,
+                'Status': status,
+                'Inkom': match.created_at[:10],
+            }
+        )
+    st.dataframe(rows, width='stretch', hide_index=True)
+
+
+with profiled('rerun'):
+    ensure_db()
+    if OPENAI_USE_STUB:
+        set_client_factory(StubOpenAI)
+    FOUNDATIONS = load_catalog()
+    OPENAI_READY = is_openai_available()
+    start_job_workers()
+    init_session_state()
+
+    render_header()
+    input_tab, results_tab, bonus_tab = st.tabs(['Inmatning', 'Resultat', 'Bonus'])
+    with input_tab:
+        render_input_tab()
+    with results_tab:
+        render_results_tab()
+    with bonus_tab:
+        render_bonus_tab()
+        render_applicant_ranking()
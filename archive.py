@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import statistics
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence
+
+import db
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_DIR
+from jobs import ACTIVE_STATUSES
+from stats import forget_application_stats
+
+
+# Old applications move, together with everything that belongs to them, into one
+# archive database per calendar year (data/archive/stiftelseforum-2024.db). Every
+# batch is its own short write transaction, so live submissions wait for at most
+# one batch. Rows are copied with INSERT OR IGNORE before they are deleted, so an
+# interrupted run is finished by running it again.
+
+ARCHIVED_TABLES = ("applications", "matches", "application_insights", "application_drafts", "application_research")
+ARCHIVE_PREFIX = "stiftelseforum-"
+ARCHIVE_BATCH_SIZE = 500
+
+LATENCY_QUERIES = {
+    "recent": ("SELECT * FROM applications ORDER BY id DESC LIMIT 20", ()),
+    "search": (
+        "SELECT rowid FROM applications_fts WHERE applications_fts MATCH ? ORDER BY rank LIMIT 20",
+        ('"stöd"*',),
+    ),
+    "category_counts": ("SELECT need_category, COUNT(*) FROM applications GROUP BY need_category", ()),
+    "matches_by_municipality": (
+        """
+        SELECT a.municipality, COUNT(*), AVG(m.score)
+        FROM matches AS m
+        JOIN applications AS a ON a.id = m.application_id
+        GROUP BY a.municipality
+        """,
+        (),
+    ),
+}
+
+
+def _key_column(table: str) -> str:
+    return "id" if table == "applications" else "application_id"
+
+
+def _columns(connection: sqlite3.Connection, table: str, schema: str = "main") -> List[str]:
+    return [row[1] for row in connection.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _placeholders(values: Sequence[Any]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def archive_path(period: str, directory: Path = ARCHIVE_DIR) -> Path:
+    return Path(directory) / f"{ARCHIVE_PREFIX}{period}.db"
+
+
+def list_archives(directory: Path = ARCHIVE_DIR) -> List[tuple[str, Path]]:
+    """(period, path) for every archive file, newest period first."""
+    archives = []
+    for path in Path(directory).glob(f"{ARCHIVE_PREFIX}*.db"):
+        period = path.stem[len(ARCHIVE_PREFIX):]
+        if period.isdigit():
+            archives.append((period, path))
+    return sorted(archives, reverse=True)
+
+
+def _ensure_archive(hot: sqlite3.Connection, path: Path) -> None:
+    """Create the archived tables and their indexes from the hot schema, adding columns the hot side gained."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(path)) as archive:
+        existing = {row[0] for row in archive.execute("SELECT name FROM sqlite_master")}
+        statements = hot.execute(
+            f"""
+            SELECT type, name, sql FROM main.sqlite_master
+            WHERE type IN ('table', 'index') AND sql IS NOT NULL AND tbl_name IN ({_placeholders(ARCHIVED_TABLES)})
+            ORDER BY type = 'index'
+            """,
+            ARCHIVED_TABLES,
+        ).fetchall()
+        indexes = []
+        for kind, name, sql in statements:
+            if name in existing:
+                continue
+            if kind == "index":
+                indexes.append(sql)  # after the new columns below, which they may cover
+            else:
+                archive.execute(sql)
+        for table in ARCHIVED_TABLES:
+            archived = set(_columns(archive, table))
+            for _, column, column_type, *_ in hot.execute(f"PRAGMA main.table_info({table})"):
+                if column not in archived:
+                    archive.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        for sql in indexes:
+            archive.execute(sql)
+        archive.commit()
+
+
+_CANDIDATES_SQL = f"""
+    SELECT id, created_at FROM applications AS a
+    WHERE created_at < ? AND (created_at, id) > (?, ?)
+      AND NOT EXISTS (
+          SELECT 1 FROM jobs WHERE jobs.application_id = a.id AND jobs.status IN ({_placeholders(ACTIVE_STATUSES)})
+      )
+    ORDER BY created_at, id
+    LIMIT ?
+"""
+
+
+def archive_applications(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    pause: float = 0.05,
+    directory: Path = ARCHIVE_DIR,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Move applications created more than ``older_than_days`` ago into yearly archives.
+
+    Applications with queued or running jobs stay until the jobs are done. Returns
+    the number of applications moved (or, with ``dry_run``, due to move) per year.
+    """
+    cutoff = db.utc_now(-older_than_days * 86400)
+    moved: Dict[str, int] = {}
+    position: tuple[str, int] = ("", 0)
+    with closing(sqlite3.connect(db.DB_PATH, timeout=30)) as connection:
+        while rows := connection.execute(_CANDIDATES_SQL, (cutoff, *position, *ACTIVE_STATUSES, batch_size)).fetchall():
+            position = (rows[-1][1], rows[-1][0])
+            by_period: Dict[str, List[int]] = {}
+            for application_id, created_at in rows:
+                by_period.setdefault(created_at[:4], []).append(application_id)
+            for period, application_ids in sorted(by_period.items()):
+                count = len(application_ids) if dry_run else _move_batch(connection, period, application_ids, directory)
+                moved[period] = moved.get(period, 0) + count
+            if not dry_run:
+                time.sleep(pause)  # let queued writers take the lock between batches
+    return moved
+
+
+def _move_batch(connection: sqlite3.Connection, period: str, application_ids: List[int], directory: Path) -> int:
+    if not period.isdigit():
+        raise ValueError(f"Ogiltig arkivperiod: {period!r}")
+    path = archive_path(period, directory)
+    _ensure_archive(connection, path)
+    schema = f"archive_{period}"
+    connection.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock: a job may have been queued since the scan.
+            ids = [
+                row[0]
+                for row in connection.execute(
+                    f"""
+                    SELECT id FROM applications AS a
+                    WHERE id IN ({_placeholders(application_ids)})
+                      AND NOT EXISTS (
+                          SELECT 1 FROM jobs
+                          WHERE jobs.application_id = a.id AND jobs.status IN ({_placeholders(ACTIVE_STATUSES)})
+                      )
+                    """,
+                    (*application_ids, *ACTIVE_STATUSES),
+                )
+            ]
+            if ids:
+                placeholders = _placeholders(ids)
+                forget_application_stats(connection, ids)
+                for table in ARCHIVED_TABLES:
+                    columns = ", ".join(_columns(connection, table))
+                    connection.execute(
+                        f"""
+                        INSERT OR IGNORE INTO {schema}.{table} ({columns})
+                        SELECT {columns} FROM main.{table} WHERE {_key_column(table)} IN ({placeholders})
+                        """,
+                        ids,
+                    )
+                connection.execute(f"DELETE FROM main.jobs WHERE application_id IN ({placeholders})", ids)
+                for table in reversed(ARCHIVED_TABLES):
+                    connection.execute(f"DELETE FROM main.{table} WHERE {_key_column(table)} IN ({placeholders})", ids)
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+    finally:
+        connection.execute(f"DETACH DATABASE {schema}")
+    return len(ids)
+
+
+def compact(pages_per_step: int = 2000, pause: float = 0.05, full: bool = False) -> Dict[str, Any]:
+    """Return free pages in the hot database to the file system.
+
+    Databases created by ensure_db use auto_vacuum=INCREMENTAL, so pages are freed
+    in short steps that writers can slip in between. Older files have auto_vacuum
+    off; ``full=True`` converts them with a one-off VACUUM, which holds the write
+    lock for its whole duration.
+    """
+    with closing(sqlite3.connect(db.DB_PATH, timeout=30)) as connection:
+        free_before = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            if not full:
+                return {"mode": "skipped", "freed_pages": 0}
+            connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.execute("VACUUM")
+            return {"mode": "full", "freed_pages": free_before}
+
+        free = free_before
+        while free > 0:
+            # execute() steps this pragma once and frees a single page; executescript runs it to completion.
+            connection.executescript(f"PRAGMA incremental_vacuum({int(pages_per_step)});")
+            remaining = connection.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free:
+                break
+            free = remaining
+            time.sleep(pause)
+        return {"mode": "incremental", "freed_pages": free_before - free}
+
+
+def database_report(repeats: int = 5) -> Dict[str, Any]:
+    """Size of the hot database and the median latency of a few typical queries.
+
+    Every sample opens a new connection, so SQLite's page cache starts cold (the
+    operating system's file cache does not).
+    """
+    path = Path(db.DB_PATH)
+    with closing(sqlite3.connect(path)) as connection:
+        page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        applications = connection.execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+    latency = {}
+    for name, (sql, params) in LATENCY_QUERIES.items():
+        samples = []
+        for _ in range(repeats):
+            with closing(sqlite3.connect(path)) as connection:
+                started = time.perf_counter()
+                connection.execute(sql, params).fetchall()
+                samples.append(time.perf_counter() - started)
+        latency[name] = round(statistics.median(samples) * 1000, 2)
+    return {
+        "file_mib": round(path.stat().st_size / 2**20, 2),
+        "free_mib": round(free_pages * page_size / 2**20, 2),
+        "applications": applications,
+        "latency_ms": latency,
+    }
+
+
+@contextmanager
+def archive_connection(directory: Path = ARCHIVE_DIR) -> Iterator[sqlite3.Connection]:
+    """The hot database with every archive attached read-only.
+
+    The temporary views ``all_applications`` and ``all_matches`` cover the hot
+    tables and all attached archives; their ``archive`` column holds the period
+    (``''`` for the hot database). SQLite caps the number of attached files, so
+    only the newest archives beyond that limit are visible.
+    """
+    connection = sqlite3.connect(Path(db.DB_PATH).resolve().as_uri(), uri=True)
+    connection.row_factory = sqlite3.Row
+    try:
+        schemas = [("main", "")]
+        for period, path in list_archives(directory)[: connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)]:
+            schema = f"archive_{period}"
+            connection.execute(f"ATTACH DATABASE ? AS {schema}", (f"{path.resolve().as_uri()}?mode=ro",))
+            schemas.append((schema, period))
+        for table, view in (("applications", "all_applications"), ("matches", "all_matches")):
+            columns = _columns(connection, table)
+            selects = []
+            for schema, period in schemas:
+                # Archives written before the hot table gained a column lack it.
+                present = set(_columns(connection, table, schema))
+                listed = ", ".join(column if column in present else f"NULL AS {column}" for column in columns)
+                selects.append(f"SELECT {listed}, '{period}' AS archive FROM {schema}.{table}")
+            connection.execute(f"CREATE TEMP VIEW {view} AS " + " UNION ALL ".join(selects))
+        yield connection
+    finally:
+        connection.close()
+
+
+def load_archived_application(application_id: int, directory: Path = ARCHIVE_DIR) -> dict | None:
+    """An archived application row with its match rows under ``"matches"``."""
+    with archive_connection(directory) as connection:
+        row = connection.execute(
+            "SELECT * FROM all_applications WHERE id = ? AND archive != ''", (application_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        matches = connection.execute(
+            "SELECT * FROM all_matches WHERE application_id = ? AND archive = ? ORDER BY score DESC, id",
+            (application_id, row["archive"]),
+        ).fetchall()
+    return {**dict(row), "matches": [dict(match) for match in matches]}
+
+
+def format_report(before: Dict[str, Any], after: Dict[str, Any]) -> List[str]:
+    lines = [
+        f"{'':<30}{'före':>12}{'efter':>12}",
+        f"{'ansökningar':<30}{before['applications']:>12,}{after['applications']:>12,}",
+        f"{'filstorlek (MiB)':<30}{before['file_mib']:>12.2f}{after['file_mib']:>12.2f}",
+        f"{'ledigt utrymme (MiB)':<30}{before['free_mib']:>12.2f}{after['free_mib']:>12.2f}",
+    ]
+    for name, milliseconds in before["latency_ms"].items():
+        lines.append(f"{name + ' (ms)':<30}{milliseconds:>12.2f}{after['latency_ms'][name]:>12.2f}")
+    return lines
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Flytta gamla ansökningar till årsarkiv och krymp databasen.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=0.05, help="Sekunder mellan batcher.")
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Visa vad som skulle arkiveras.")
+    parser.add_argument(
+        "--vacuum-full",
+        action="store_true",
+        help="Gör en engångs-VACUUM om databasen saknar inkrementell vacuum (blockerar skrivningar).",
+    )
+    args = parser.parse_args(argv)
+
+    db.ensure_db()
+    before = database_report()
+    moved = archive_applications(
+        args.older_than_days, args.batch_size, args.pause, directory=args.archive_dir, dry_run=args.dry_run
+    )
+    verb = "Skulle arkivera" if args.dry_run else "Arkiverade"
+    print(f"{verb} {sum(moved.values())} ansökningar" + "".join(f", {period}: {count}" for period, count in moved.items()))
+    if args.dry_run:
+        return 0
+
+    compaction = compact(pause=args.pause, full=args.vacuum_full)
+    if compaction["mode"] == "skipped":
+        print("Databasen saknar inkrementell vacuum; kör en gång med --vacuum-full för att krympa filen.")
+    else:
+        print(f"Frigjorde {compaction['freed_pages']} sidor ({compaction['mode']}).")
+    for line in format_report(before, database_report()):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
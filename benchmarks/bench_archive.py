@@ -0,0 +1,143 @@
+"""Measure what archiving old applications does to the hot database.
+
+Run from the repo root:
+
+    python benchmarks/bench_archive.py --rows 500000 --years 4
+
+The script fills a temporary database with applications (three matches each)
+spread evenly over the last ``--years`` years, archives everything older than
+``--older-than-days`` and prints the hot database size and query latency before
+and after, together with how long the archival and the incremental vacuum took
+and the longest time a concurrent writer had to wait for the lock.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import archive  # noqa: E402
+import db  # noqa: E402
+from geography import fold  # noqa: E402
+from repository import APPLICATION_INSERT_WITH_ID_SQL, MATCH_INSERT_SQL  # noqa: E402
+from stats import rebuild_stats  # noqa: E402
+
+CATEGORIES = ["tandvård", "glasögon", "boende", "studier", "forskning", "allmänt_stöd"]
+MUNICIPALITIES = ["Stockholm", "Göteborg", "Malmö", "Uppsala", "Umeå", "Luleå", "Örebro", "Lund"]
+DESCRIPTIONS = [
+    "Jag är pensionär med låg inkomst och behöver stöd till tandvård.",
+    "Studerar på distans och behöver stöd till kurslitteratur.",
+    "Akut behov av stöd till boende efter en lång sjukskrivning.",
+    "Har fått en offert på nya glasögon men kan inte betala själv.",
+]
+
+
+def fill(rows: int, years: int, rng: random.Random) -> None:
+    now = datetime.utcnow()
+    step = timedelta(days=365 * years) / rows
+    with db.get_connection() as connection:
+        for start in range(0, rows, 10_000):
+            applications, matches = [], []
+            for application_id in range(start + 1, min(rows, start + 10_000) + 1):
+                created_at = (now - step * (rows - application_id)).isoformat(timespec="seconds")
+                municipality = rng.choice(MUNICIPALITIES)
+                applications.append(
+                    (
+                        application_id,
+                        f"Sökande {application_id}",
+                        f"sokande{application_id}@example.se",
+                        municipality,
+                        rng.randint(18, 90),
+                        "behövande",
+                        rng.choice(CATEGORIES),
+                        rng.randrange(2000, 50000, 1000),
+                        rng.randrange(8000, 30000, 1000),
+                        "Medel",
+                        rng.choice(DESCRIPTIONS),
+                        1,
+                        0,
+                        0,
+                        0,
+                        created_at,
+                        fold(municipality),
+                    )
+                )
+                for _ in range(3):
+                    matches.append(
+                        (
+                            application_id,
+                            f"sf-{rng.randint(1, 40):03d}",
+                            "Stiftelse",
+                            rng.randint(20, 95),
+                            json.dumps(["Passar ändamålet"], ensure_ascii=False),
+                            json.dumps([], ensure_ascii=False),
+                            created_at,
+                        )
+                    )
+            connection.executemany(APPLICATION_INSERT_WITH_ID_SQL, applications)
+            connection.executemany(MATCH_INSERT_SQL, matches)
+        rebuild_stats(connection)
+
+
+class WriterProbe(threading.Thread):
+    """Takes and releases the write lock in a loop, recording the longest wait."""
+
+    def __init__(self) -> None:
+        super().__init__(daemon=True)
+        self.longest = 0.0
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        connection = sqlite3.connect(db.DB_PATH, timeout=60, isolation_level=None)
+        while not self.stopped.wait(0.01):
+            started = time.perf_counter()
+            connection.execute("BEGIN IMMEDIATE")
+            self.longest = max(self.longest, time.perf_counter() - started)
+            connection.execute("COMMIT")
+        connection.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--older-than-days", type=int, default=730)
+    parser.add_argument("--batch-size", type=int, default=archive.ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.ensure_db()
+        fill(args.rows, args.years, random.Random(7))
+        before = archive.database_report()
+
+        probe = WriterProbe()
+        probe.start()
+        started = time.perf_counter()
+        moved = archive.archive_applications(args.older_than_days, args.batch_size, directory=Path(tmp) / "archive")
+        archived = time.perf_counter() - started
+        started = time.perf_counter()
+        compaction = archive.compact()
+        compacted = time.perf_counter() - started
+        probe.stopped.set()
+        probe.join()
+
+        print(f"archived {sum(moved.values()):,} applications {moved} in {archived:.1f} s")
+        print(f"incremental vacuum freed {compaction['freed_pages']:,} pages in {compacted:.1f} s")
+        print(f"longest writer wait during the run: {probe.longest * 1000:.1f} ms")
+        for line in archive.format_report(before, archive.database_report()):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,150 @@
+"""Compare full-text search with a LIKE scan over application descriptions.
+
+Run from the repo root:
+
+    python benchmarks/bench_fts_search.py --rows 1000000
+
+The script fills a temporary database without the search index, runs the
+ensure_db migration (which backfills applications_fts) and then times a few
+caseworker queries both ways. It also measures what the sync triggers cost
+on inserts.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+from geography import fold  # noqa: E402
+from repository import APPLICATION_INSERT_SQL, search_applications  # noqa: E402
+
+PHRASES = [
+    "Jag är pensionär med låg inkomst",
+    "behöver stöd till tandvård",
+    "har fått en offert på nya glasögon",
+    "studerar på distans och behöver kurslitteratur",
+    "akut behov av stöd till boende",
+    "ensamstående förälder med två barn",
+]
+# Case details are what caseworkers search for; each is rare in the table.
+DETAILS = [
+    "implantat",
+    "hyresskulder efter en lång sjukskrivning",
+    "forskning om demens",
+    "tandprotesen har gått sönder",
+    "läkarintyg om synnedsättning",
+    "vräkning hotar",
+    "rullstol",
+    "elräkning",
+    "hörapparat",
+    "flytt till äldreboende",
+]
+MUNICIPALITIES = ["Stockholm", "Göteborg", "Malmö", "Uppsala", "Umeå", "Luleå", "Örebro", "Lund"]
+CATEGORIES = ["tandvård", "glasögon", "boende", "studier", "forskning", "allmänt_stöd"]
+QUERIES = ["implantat", "hyresskuld", "demens göteborg", "hörapparat umeå", "synnedsattning", "tandvård"]
+
+
+def synthetic_rows(count: int, start: int, rng: random.Random):
+    for index in range(start, start + count):
+        words = " ".join(rng.sample(PHRASES, 2))
+        if rng.random() < 0.05:
+            words = f"{words} {rng.choice(DETAILS)}"
+        municipality = MUNICIPALITIES[index % len(MUNICIPALITIES)]
+        yield (
+            f"Sökande {index}",
+            f"sokande{index}@example.se",
+            municipality,
+            20 + index % 70,
+            "behövande",
+            CATEGORIES[index % len(CATEGORIES)],
+            5000 + index % 40000,
+            12000 + index % 20000,
+            "Medel",
+            f"{words}. Ärende {index}.",
+            index % 2,
+            0,
+            index % 3 == 0,
+            0,
+            "2026-01-01T00:00:00",
+            fold(municipality),
+        )
+
+
+def drop_search_index(connection) -> None:
+    for trigger in ("applications_fts_insert", "applications_fts_delete", "applications_fts_update"):
+        connection.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    connection.execute("DROP TABLE IF EXISTS applications_fts")
+
+
+def timed(function, repeats: int) -> tuple[float, object]:
+    samples = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def like_search(terms: list[str], limit: int) -> list:
+    where = " AND ".join("description LIKE ?" for _ in terms)
+    with db.get_connection() as connection:
+        return connection.execute(
+            f"SELECT id FROM applications WHERE {where} ORDER BY id DESC LIMIT ?",
+            (*[f"%{term}%" for term in terms], limit),
+        ).fetchall()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.ensure_db()
+        with db.get_connection() as connection:
+            drop_search_index(connection)
+            started = time.perf_counter()
+            connection.executemany(APPLICATION_INSERT_SQL, synthetic_rows(args.rows, 0, rng))
+            connection.commit()
+            plain_insert = time.perf_counter() - started
+
+        started = time.perf_counter()
+        db.ensure_db()
+        backfill = time.perf_counter() - started
+
+        sample = 50_000
+        with db.get_connection() as connection:
+            started = time.perf_counter()
+            connection.executemany(APPLICATION_INSERT_SQL, synthetic_rows(sample, args.rows, rng))
+            connection.commit()
+            indexed_insert = time.perf_counter() - started
+        size_mib = db.DB_PATH.stat().st_size / 2**20
+
+        print(f"rows: {args.rows + sample:,}  database: {size_mib:,.1f} MiB")
+        print(f"insert without index: {args.rows / plain_insert:,.0f} rows/s")
+        print(f"insert with triggers: {sample / indexed_insert:,.0f} rows/s")
+        print(f"backfill migration:   {backfill:,.1f} s")
+        print(f"{'query':<18}{'fts hits':>10}{'fts ms':>10}{'like hits':>11}{'like ms':>10}")
+        for query in QUERIES:
+            fts_seconds, fts_hits = timed(lambda: search_applications(query, limit=20), args.repeats)
+            like_seconds, like_hits = timed(lambda: like_search(query.split(), 20), args.repeats)
+            print(
+                f"{query:<18}{len(fts_hits):>10}{fts_seconds * 1000:>10.1f}"
+                f"{len(like_hits):>11}{like_seconds * 1000:>10.1f}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
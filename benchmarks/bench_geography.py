@@ -0,0 +1,136 @@
+"""Compare the bitset geography rule with the string comparisons it replaced.
+
+Run from the repo root:
+
+    python benchmarks/bench_geography.py --foundations 100000 --applicants 20
+
+The script builds a synthetic catalog whose geography tags mix "hela sverige",
+"regional", municipalities (some spelled without diacritics or in capitals),
+counties, regions and unknown places. It times compiling the lookup table,
+then evaluates the geography rule for every applicant against every
+foundation with the old normalise-and-compare check, with a check that
+resolves each tag through the table on every call, and twice with the
+compiled plan's bitset rule (the first run fills the per-tag-list cache, the
+second reuses it). It prints the time per pair and how many pairs each rule
+counts as a geography match; the bitset rule finds more because it
+understands spelling variants, counties and regions.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_shared_catalog import synthetic_catalog  # noqa: E402
+from config import GEOGRAPHY_PATH  # noqa: E402
+from geography import GeographyIndex, fold, get_geography_index  # noqa: E402
+from matching import get_scoring_plan, normalize  # noqa: E402
+from models import ApplicantProfile, Foundation  # noqa: E402
+
+INDEX = get_geography_index()
+
+
+def legacy_rule(municipality: str, foundation: Foundation, reasons: list[str], match: int, regional: int) -> int:
+    geographies = list(map(normalize, foundation.geographies))
+    if "hela sverige" in geographies or municipality in geographies:
+        reasons.append("Geografin matchar.")
+        return match
+    if "regional" in geographies:
+        reasons.append("Regionalt stöd kan vara möjligt.")
+        return regional
+    return 0
+
+
+def lookup_rule(areas: set[str], foundation: Foundation, reasons: list[str], match: int, regional: int) -> int:
+    # Resolving every tag through the table on each call, without the compiled bitsets.
+    geographies = [INDEX.canonical(tag) for tag in foundation.geographies]
+    if "hela sverige" in geographies or not areas.isdisjoint(geographies):
+        reasons.append("Geografin matchar.")
+        return match
+    if "regional" in geographies:
+        reasons.append("Regionalt stöd kan vara möjligt.")
+        return regional
+    return 0
+
+
+def synthetic_tags(table: dict, rng: random.Random) -> list[str]:
+    counties = table["counties"]
+    county = rng.choice(counties)
+    municipality = rng.choice(county["municipalities"])
+    pick = rng.random()
+    if pick < 0.15:
+        return ["hela sverige"]
+    if pick < 0.25:
+        return ["regional"]
+    if pick < 0.55:
+        return [municipality, rng.choice(rng.choice(counties)["municipalities"])]
+    if pick < 0.7:
+        return [rng.choice([fold(municipality), municipality.upper()])]
+    if pick < 0.85:
+        return [county["name"]]
+    if pick < 0.95:
+        return [f"Riksområde {county['region']}"]
+    return [f"Ort {rng.randrange(1000)}"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--foundations", type=int, default=100_000)
+    parser.add_argument("--applicants", type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(11)
+    table = json.loads(GEOGRAPHY_PATH.read_text(encoding="utf-8"))
+
+    started = time.perf_counter()
+    index = GeographyIndex(table)
+    print(f"lookup table: {index.size} municipalities compiled in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    catalog = [
+        Foundation.model_validate({**item, "geographies": synthetic_tags(table, rng)})
+        for item in synthetic_catalog(args.foundations)
+    ]
+    municipalities = [name for county in table["counties"] for name in county["municipalities"]]
+    applicants = [
+        ApplicantProfile.model_construct(
+            municipality=rng.choice(municipalities), applicant_type="senior", need_category="tandvård",
+            urgency="Normal", description="", has_quote=False, has_invoice=False,
+            has_income_statement=False, has_id_copy=False,
+        )
+        for _ in range(args.applicants)
+    ]
+    plan = get_scoring_plan()
+    geography_rule = dict(plan.steps)["geografi"]
+    pairs = args.foundations * args.applicants
+
+    print(f"{args.applicants} applicants x {args.foundations:,} foundations = {pairs:,} pairs")
+    print(f"{'rule':<16}{'seconds':>9}{'ns/pair':>9}{'matches':>10}{'regional':>10}")
+    match, regional = plan.rules.geography.match, plan.rules.geography.regional
+    runs = ["strings", "per-call lookup", "bitset (cold)", "bitset (warm)"]
+    for name in runs:
+        hits = {match: 0, regional: 0, 0: 0}
+        started = time.perf_counter()
+        for applicant in applicants:
+            if name == "strings":
+                municipality = normalize(applicant.municipality)
+                for foundation in catalog:
+                    hits[legacy_rule(municipality, foundation, [], match, regional)] += 1
+            elif name == "per-call lookup":
+                areas = set(INDEX.area_keys(applicant.municipality))
+                for foundation in catalog:
+                    hits[lookup_rule(areas, foundation, [], match, regional)] += 1
+            else:
+                context = plan.context(applicant)
+                for foundation in catalog:
+                    hits[geography_rule(context, foundation, [], [])] += 1
+        seconds = time.perf_counter() - started
+        print(f"{name:<16}{seconds:>9.2f}{seconds / pairs * 1e9:>9.0f}{hits[match]:>10,}{hits[regional]:>10,}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+"""Rebuild ApplicantProfile objects from the applications table, validated and trusted.
+
+Run from the repo root:
+
+    python benchmarks/bench_profile_rows.py --rows 1000000
+
+The script fills a temporary database with synthetic applications and reads
+them all back twice: once through ``ApplicantProfile.model_validate``, as
+``load_application`` used to, and once through ``repository.profile_from_row``,
+which trusts stored rows. It then times building a scoring context for every
+profile, which reads ``document_flags``, and checks on a sample that both paths
+give equal profiles.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+from bench_reverse_matching import synthetic_rows  # noqa: E402
+from matching import get_scoring_plan  # noqa: E402
+from models import ApplicantProfile  # noqa: E402
+from repository import APPLICATION_COLUMNS, APPLICATION_INSERT_SQL, profile_from_row  # noqa: E402
+
+PROFILE_COLUMNS = APPLICATION_COLUMNS[:-1]
+
+
+def validated(row) -> ApplicantProfile:
+    return ApplicantProfile.model_validate({column: row[column] for column in PROFILE_COLUMNS})
+
+
+def rebuild(build) -> tuple[float, list]:
+    started = time.perf_counter()
+    with db.get_connection() as connection:
+        profiles = [build(row) for row in connection.execute(f"SELECT {', '.join(PROFILE_COLUMNS)} FROM applications")]
+    return time.perf_counter() - started, profiles
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.ensure_db()
+        with db.get_connection() as connection:
+            connection.executemany(APPLICATION_INSERT_SQL, synthetic_rows(args.rows, random.Random(3)))
+
+        plan = get_scoring_plan()
+        print(f"{'path':<12}{'rebuild s':>11}{'per row µs':>12}{'contexts s':>12}")
+        results = {}
+        for name, build in (("validated", validated), ("trusted", profile_from_row)):
+            seconds, profiles = rebuild(build)
+            started = time.perf_counter()
+            for profile in profiles:
+                plan.context(profile)
+            contexts = time.perf_counter() - started
+            print(f"{name:<12}{seconds:>11.1f}{seconds / args.rows * 1e6:>12.1f}{contexts:>12.1f}")
+            results[name] = profiles[:: max(1, args.rows // 1000)]
+            del profiles
+        print(f"sample equal: {results['validated'] == results['trusted']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""Compare incremental re-scoring after a catalog edit with a full recompute.
+
+Run from the repo root:
+
+    python benchmarks/bench_rescoring.py --rows 10000 --foundations 100
+
+The script stores ``--rows`` synthetic applications, scores them against a
+synthetic catalog from scratch (the full recompute) and saves that database.
+Then, on a fresh copy per scenario, it edits 1, 5 or 25 foundations (a changed
+income cap, plus one removed and one added foundation) and times
+rescoring.rescore_changed. For each scenario it prints the pairs scored, the
+pairs avoided, the fallbacks to a full per-application recompute and the
+rankings rewritten.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+from bench_reverse_matching import synthetic_rows  # noqa: E402
+from bench_shared_catalog import synthetic_catalog  # noqa: E402
+from models import Foundation  # noqa: E402
+from repository import APPLICATION_INSERT_SQL  # noqa: E402
+from rescoring import rescore_changed  # noqa: E402
+
+
+def edited(catalog: list[Foundation], count: int, rng: random.Random) -> list[Foundation]:
+    catalog = list(catalog)
+    for index in rng.sample(range(len(catalog)), count):
+        cap = catalog[index].monthly_income_cap_sek
+        catalog[index] = catalog[index].model_copy(update={"monthly_income_cap_sek": (cap or 30000) - 2000})
+    removed = catalog.pop(rng.randrange(len(catalog)))
+    catalog.append(removed.model_copy(update={"id": "syn-added", "name": "Tillagd stiftelse"}))
+    return catalog
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--foundations", type=int, default=100)
+    args = parser.parse_args()
+    rng = random.Random(5)
+    catalog = [Foundation.model_validate(item) for item in synthetic_catalog(args.foundations)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scored = Path(tmp) / "scored.db"
+        db.DB_PATH = scored
+        db.ensure_db()
+        with db.get_connection() as connection:
+            connection.executemany(APPLICATION_INSERT_SQL, synthetic_rows(args.rows, rng))
+        started = time.perf_counter()
+        full = rescore_changed(catalog, batch_size=500, pause=0)
+        full_seconds = time.perf_counter() - started
+        print(f"{args.rows:,} applications x {args.foundations} foundations")
+        print(f"full recompute: {full['scored_pairs']:,} pairs in {full_seconds:.1f} s")
+
+        print(f"{'edited':>7}{'pairs scored':>14}{'avoided':>12}{'fallbacks':>11}{'rewritten':>11}{'seconds':>9}{'speedup':>9}")
+        for count in (1, 5, 25):
+            db.DB_PATH = Path(tmp) / f"edited-{count}.db"
+            shutil.copyfile(scored, db.DB_PATH)
+            started = time.perf_counter()
+            report = rescore_changed(edited(catalog, count, rng), batch_size=500, pause=0)
+            seconds = time.perf_counter() - started
+            print(
+                f"{count:>7}{report['scored_pairs']:>14,}{report['avoided_pairs']:>12,}{report['full_rescores']:>11,}"
+                f"{report['rewritten']:>11,}{seconds:>9.1f}{full_seconds / seconds:>8.1f}x"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
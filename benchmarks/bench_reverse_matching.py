@@ -0,0 +1,149 @@
+"""Rank stored applicants for each catalog foundation, with and without the SQL prefilter.
+
+Run from the repo root:
+
+    python benchmarks/bench_reverse_matching.py --rows 1000000
+
+The script fills a temporary database with synthetic applications, then for
+every foundation in data/stiftelser.json times the first and a later page of
+reverse_matching.rank_applicants and reports how many applicants survived the
+prefilter. It then times ranking the first 50 pages once with
+rank_applicant_ids and serving page 50 from that order with applicant_page,
+which is how the bonus view pages. The baseline scores every stored application in Python, which is
+what the bonus view would otherwise have to do. It also measures what the
+three prefilter indexes cost on inserts.
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+from geography import fold  # noqa: E402
+from matching import get_scoring_plan  # noqa: E402
+from models import APPLICANT_TYPE_VALUES, NEED_CATEGORY_VALUES, URGENCY_VALUES  # noqa: E402
+from repository import APPLICATION_COLUMNS, APPLICATION_INSERT_SQL, profile_from_row  # noqa: E402
+from reverse_matching import applicant_page, candidate_ids, rank_applicant_ids, rank_applicants  # noqa: E402
+from seed import load_foundations  # noqa: E402
+
+MUNICIPALITIES = ["Stockholm", "Göteborg", "Malmö", "Uppsala", "Umeå", "Luleå", "Örebro", "Lund", "Kiruna", "Visby"]
+PREFILTER_INDEXES = (
+    "idx_applications_need_category",
+    "idx_applications_applicant_type",
+    "idx_applications_folded_municipality",
+)
+
+
+def synthetic_rows(count: int, rng: random.Random):
+    for index in range(count):
+        municipality = rng.choice(MUNICIPALITIES)
+        if index % 50 == 0:
+            municipality = municipality.upper()
+        yield (
+            f"Sökande {index}",
+            f"sokande{index}@example.se",
+            municipality,
+            rng.randint(16, 95),
+            rng.choice(APPLICANT_TYPE_VALUES),
+            rng.choice(NEED_CATEGORY_VALUES),
+            rng.randrange(1000, 60000, 500),
+            rng.randrange(5000, 45000, 500),
+            rng.choice(URGENCY_VALUES),
+            "Jag behöver stöd till tandvård och har en offert från tandläkaren.",
+            rng.random() < 0.6,
+            rng.random() < 0.3,
+            rng.random() < 0.2,
+            0,
+            "2026-01-01T00:00:00",
+            fold(municipality),
+        )
+
+
+def insert_rate(rows: int, rng: random.Random) -> float:
+    started = time.perf_counter()
+    with db.get_connection() as connection:
+        connection.executemany(APPLICATION_INSERT_SQL, synthetic_rows(rows, rng))
+    return rows / (time.perf_counter() - started)
+
+
+def score_everything(foundation, limit: int) -> tuple[float, int]:
+    plan = get_scoring_plan()
+    started = time.perf_counter()
+    columns = ", ".join(APPLICATION_COLUMNS)
+    with db.get_connection() as connection:
+        rows = connection.execute(f"SELECT id, {columns} FROM applications")
+        top = heapq.nlargest(
+            limit,
+            ((plan.score(plan.context(profile_from_row(row)), foundation).score, row["id"]) for row in rows),
+        )
+    return time.perf_counter() - started, top[0][0] if top else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+    rng = random.Random(11)
+    foundations = load_foundations()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.ensure_db()
+        with db.get_connection() as connection:
+            connection.executemany(APPLICATION_INSERT_SQL, synthetic_rows(args.rows, rng))
+            connection.execute("ANALYZE")
+
+        sample = 50_000
+        with_indexes = insert_rate(sample, rng)
+        with db.get_connection() as connection:
+            for index in PREFILTER_INDEXES:
+                connection.execute(f"DROP INDEX {index}")
+        without_indexes = insert_rate(sample, rng)
+        db.ensure_db()
+        print(f"applications: {args.rows + 2 * sample:,}")
+        print(f"insert rate without / with prefilter indexes: {without_indexes:,.0f} / {with_indexes:,.0f} rows/s")
+
+        print(
+            f"{'foundation':<36}{'survivors':>11}{'filter ms':>11}{'page 1 ms':>11}{'page 50 ms':>12}"
+            f"{'order ms':>10}{'cached ms':>11}{'top':>6}"
+        )
+        for foundation in foundations:
+            started = time.perf_counter()
+            survivors = len(candidate_ids(foundation))
+            filtered = time.perf_counter() - started
+            started = time.perf_counter()
+            first = rank_applicants(foundation, limit=args.page_size)
+            page_one = time.perf_counter() - started
+            started = time.perf_counter()
+            rank_applicants(foundation, limit=args.page_size, offset=49 * args.page_size)
+            page_fifty = time.perf_counter() - started
+            started = time.perf_counter()
+            _, order = rank_applicant_ids(foundation, depth=50 * args.page_size)
+            ordered = time.perf_counter() - started
+            started = time.perf_counter()
+            applicant_page(foundation, order, 49 * args.page_size, args.page_size)
+            cached = time.perf_counter() - started
+            top = first.matches[0].result.score if first.matches else 0
+            print(
+                f"{foundation.name:<36}{survivors:>11,}{filtered * 1000:>11.0f}"
+                f"{page_one * 1000:>11.0f}{page_fifty * 1000:>12.0f}"
+                f"{ordered * 1000:>10.0f}{cached * 1000:>11.1f}{top:>6}"
+            )
+
+        if not args.skip_baseline:
+            seconds, top = score_everything(foundations[0], args.page_size)
+            print(f"baseline, scoring every application for {foundations[0].name}: {seconds * 1000:,.0f} ms (top {top})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,127 @@
+"""Compare per-worker memory for private vs shared catalogs.
+
+Run from the repo root:
+
+    python benchmarks/bench_shared_catalog.py --workers 8 --size 100000
+
+Each worker loads the catalog, runs one match, and reports RSS and PSS from
+/proc (Linux only). PSS splits shared pages between the processes mapping them,
+so it is the fair per-worker figure for the shared mode.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from catalog_store import SharedCatalog, publish_catalog  # noqa: E402
+from matching import match_foundations  # noqa: E402
+from models import ApplicantProfile  # noqa: E402
+from seed import load_foundations  # noqa: E402
+
+MUNICIPALITIES = ["stockholm", "göteborg", "malmö", "uppsala", "umeå", "luleå", "örebro", "lund"]
+
+APPLICANT = dict(
+    full_name="Anna Andersson",
+    email="anna@example.se",
+    municipality="Stockholm",
+    age=72,
+    applicant_type="senior",
+    need_category="tandvård",
+    requested_amount_sek=12000,
+    monthly_income_sek=15000,
+    urgency="Hög",
+    description="Jag är pensionär med låg inkomst och behöver tandvård.",
+    has_quote=True,
+)
+
+
+def synthetic_catalog(size: int) -> list[dict]:
+    seeds = [foundation.model_dump() for foundation in load_foundations()]
+    catalog = []
+    for index in range(size):
+        item = dict(seeds[index % len(seeds)])
+        item["id"] = f"syn-{index:07d}"
+        item["name"] = f"{item['name']} {index}"
+        item["description"] = f"{item['description']} Variant {index % 997}."
+        item["geographies"] = (
+            item["geographies"] if index % 3 else [MUNICIPALITIES[index % len(MUNICIPALITIES)]]
+        )
+        item["age_min"] = index % 40
+        catalog.append(item)
+    return catalog
+
+
+def memory_kb() -> tuple[int, int]:
+    rss = pss = 0
+    with open("/proc/self/status", encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    with open("/proc/self/smaps_rollup", encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def worker(mode: str, source: str, barrier, results) -> None:
+    applicant = ApplicantProfile(**APPLICANT)
+    if mode == "private":
+        foundations = load_foundations(Path(source))
+        match_foundations(applicant, foundations, top_n=3)
+    else:
+        foundations = SharedCatalog(Path(source))
+        match_foundations(
+            applicant,
+            foundations.candidates(categories=[applicant.need_category], target_groups=[applicant.applicant_type]),
+            top_n=3,
+        )
+    barrier.wait()
+    results.put(memory_kb())
+    barrier.wait()
+
+
+def run(mode: str, source: Path, workers: int) -> list[tuple[int, int]]:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(mode, str(source), barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measurements
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = Path(tmp) / "catalog.json"
+        json_path.write_text(json.dumps(synthetic_catalog(args.size), ensure_ascii=False), encoding="utf-8")
+        shared_dir = Path(tmp) / "shared"
+        publish_catalog(load_foundations(json_path), shared_dir)
+        catalog_bytes = sum(path.stat().st_size for path in shared_dir.glob("catalog-*.bin"))
+
+        print(f"{args.size} stiftelser, {args.workers} workers, katalogfil {catalog_bytes / 1024 / 1024:.1f} MiB")
+        print(f"{'läge':<8} {'RSS/worker MiB':>15} {'PSS/worker MiB':>15} {'PSS totalt MiB':>15}")
+        for mode, source in (("private", json_path), ("shared", shared_dir)):
+            measurements = run(mode, source, args.workers)
+            rss = sum(item[0] for item in measurements) / len(measurements) / 1024
+            pss = sum(item[1] for item in measurements) / len(measurements) / 1024
+            print(f"{mode:<8} {rss:>15.1f} {pss:>15.1f} {pss * args.workers:>15.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
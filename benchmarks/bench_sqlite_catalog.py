@@ -0,0 +1,89 @@
+"""Compare matching against the JSON catalog with the SQLite prefilter mode.
+
+Run from the repo root:
+
+    python benchmarks/bench_sqlite_catalog.py --size 500000
+
+The JSON mode loads the whole catalog into Python and scores every foundation.
+The SQLite mode asks the indexed child tables for eligible foundations and only
+materialises those, one batch at a time. Peak memory is measured with
+tracemalloc in separate passes so it does not skew the timings.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import db  # noqa: E402
+from bench_shared_catalog import APPLICANT, synthetic_catalog  # noqa: E402
+from catalog_db import SqliteCatalog, import_foundations  # noqa: E402
+from matching import match_foundations  # noqa: E402
+from models import ApplicantProfile  # noqa: E402
+from seed import load_foundations  # noqa: E402
+
+APPLICANTS = [
+    ApplicantProfile(**APPLICANT),
+    ApplicantProfile(**{**APPLICANT, "municipality": "Umeå", "applicant_type": "student", "need_category": "studier", "age": 23}),
+    ApplicantProfile(**{**APPLICANT, "municipality": "Lund", "applicant_type": "forskare", "need_category": "forskning", "age": 45}),
+]
+
+
+def json_mode(path: Path) -> list:
+    foundations = load_foundations(path)
+    return [match_foundations(applicant, foundations, top_n=3) for applicant in APPLICANTS]
+
+
+def sqlite_mode() -> list:
+    catalog = SqliteCatalog()
+    return [match_foundations(applicant, catalog, top_n=3) for applicant in APPLICANTS]
+
+
+def measure(function, *args) -> tuple[float, float]:
+    started = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=500_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "stiftelser.json"
+        source.write_text(json.dumps(synthetic_catalog(args.size), ensure_ascii=False), encoding="utf-8")
+        db.DB_PATH = Path(tmp) / "bench.db"
+        db.ensure_db()
+
+        started = time.perf_counter()
+        import_foundations(load_foundations(source))
+        print(f"import {args.size:,} foundations: {time.perf_counter() - started:.1f} s")
+
+        catalog = SqliteCatalog()
+        for applicant in APPLICANTS:
+            print(
+                f"{applicant.applicant_type}/{applicant.need_category}/{applicant.municipality}: "
+                f"{len(catalog.candidate_positions(applicant)):,} candidates"
+            )
+        print(f"{'mode':<8}{'3 matches s':>14}{'peak MiB':>12}")
+        for name, function, function_args in (("json", json_mode, (source,)), ("sqlite", sqlite_mode, ())):
+            seconds, peak = measure(function, *function_args)
+            print(f"{name:<8}{seconds:>14.2f}{peak:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
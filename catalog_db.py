@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+from config import GEOGRAPHY_PATH, STIFTELSER_PATH
+from db import FOUNDATION_LIST_TABLES, ensure_db, get_connection
+from geography import NATIONWIDE, REGIONAL, get_geography_index
+from matching import APPLICANT_GROUP_ALIASES, normalize
+from models import ApplicantProfile, Foundation
+from seed import load_foundations
+
+
+FOUNDATION_COLUMNS = (
+    "id",
+    "name",
+    "description",
+    "age_min",
+    "age_max",
+    "monthly_income_cap_sek",
+    "typical_amount_min_sek",
+    "typical_amount_max_sek",
+    "application_url",
+    "notes",
+)
+FOUNDATION_INSERT_SQL = (
+    f"INSERT INTO foundations (position, {', '.join(FOUNDATION_COLUMNS)}) "
+    f"VALUES (?, {', '.join('?' for _ in FOUNDATION_COLUMNS)})"
+)
+
+# Geographies that geography_rule gives points for regardless of municipality.
+OPEN_GEOGRAPHIES = (NATIONWIDE, REGIONAL)
+# Bump when the value_key of a list table changes meaning, so stored catalogs are re-imported.
+VALUE_KEY_VERSION = 2
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def source_fingerprint(path: Path) -> str:
+    """Identifies one version of a catalog file without reading it."""
+    stat = path.stat()
+    return json.dumps({"path": str(path.resolve()), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size})
+
+
+def value_key_version() -> str:
+    """Identifies how value_keys are computed: ``VALUE_KEY_VERSION`` and the geography table."""
+    return json.dumps({"version": VALUE_KEY_VERSION, "geography": source_fingerprint(GEOGRAPHY_PATH)})
+
+
+def import_foundations(foundations: Iterable[Foundation], chunk_size: int = 1000, source: str = "") -> int:
+    """Replace the catalog tables with ``foundations``, keeping their order.
+
+    ``source`` is recorded as the catalog's origin (see ``source_fingerprint``),
+    next to the ``value_key_version`` the keys were computed with.
+    """
+    count = 0
+    # Geography tags are keyed by the municipality, county or region they resolve
+    # to, so "Goteborg" and "Göteborg" land on the same key.
+    keys = {field: normalize for field in FOUNDATION_LIST_TABLES}
+    keys["geographies"] = get_geography_index().canonical
+    with get_connection() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        for table in FOUNDATION_LIST_TABLES.values():
+            connection.execute(f"DELETE FROM {table}")
+        connection.execute("DELETE FROM foundations")
+        for chunk in _chunks(foundations, chunk_size):
+            connection.executemany(
+                FOUNDATION_INSERT_SQL,
+                [
+                    (count + offset, *(getattr(foundation, column) for column in FOUNDATION_COLUMNS))
+                    for offset, foundation in enumerate(chunk)
+                ],
+            )
+            for field, table in FOUNDATION_LIST_TABLES.items():
+                connection.executemany(
+                    f"INSERT INTO {table} (foundation_position, ordinal, value, value_key) VALUES (?, ?, ?, ?)",
+                    [
+                        (count + offset, ordinal, value, keys[field](value))
+                        for offset, foundation in enumerate(chunk)
+                        for ordinal, value in enumerate(getattr(foundation, field))
+                    ],
+                )
+            count += len(chunk)
+        connection.executemany(
+            "INSERT INTO catalog_meta (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            [("source", source), ("value_keys", value_key_version())],
+        )
+    return count
+
+
+def _load_positions(connection: sqlite3.Connection, positions: Sequence[int]) -> List[Foundation]:
+    placeholders = ", ".join("?" for _ in positions)
+    rows = connection.execute(
+        f"SELECT * FROM foundations WHERE position IN ({placeholders}) ORDER BY position",
+        positions,
+    ).fetchall()
+    lists: Dict[int, Dict[str, List[str]]] = {row["position"]: {field: [] for field in FOUNDATION_LIST_TABLES} for row in rows}
+    for field, table in FOUNDATION_LIST_TABLES.items():
+        for position, value in connection.execute(
+            f"SELECT foundation_position, value FROM {table} WHERE foundation_position IN ({placeholders}) "
+            "ORDER BY foundation_position, ordinal",
+            positions,
+        ):
+            lists[position][field].append(value)
+    # The rows were validated when the catalog was imported.
+    return [
+        Foundation.model_construct(**{column: row[column] for column in FOUNDATION_COLUMNS}, **lists[row["position"]])
+        for row in rows
+    ]
+
+
+class SqliteCatalog:
+    """The foundation catalog read from SQLite in batches instead of held in memory.
+
+    ``prefilter`` narrows a matching run to the foundations an applicant can be
+    eligible for, using the indexed child tables, so only those are materialised
+    and scored.
+    """
+
+    def __init__(self, batch_size: int = 500) -> None:
+        self.batch_size = batch_size
+
+    def __len__(self) -> int:
+        with get_connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM foundations").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Foundation]:
+        after = -1
+        while True:
+            with get_connection() as connection:
+                positions = [
+                    row[0]
+                    for row in connection.execute(
+                        "SELECT position FROM foundations WHERE position > ? ORDER BY position LIMIT ?",
+                        (after, self.batch_size),
+                    )
+                ]
+                if not positions:
+                    return
+                batch = _load_positions(connection, positions)
+            yield from batch
+            after = positions[-1]
+
+    def find(self, foundation_id: str) -> Foundation | None:
+        with get_connection() as connection:
+            row = connection.execute("SELECT position FROM foundations WHERE id = ?", (foundation_id,)).fetchone()
+            return _load_positions(connection, [row[0]])[0] if row else None
+
+    def term_counts(self, field: str) -> Dict[str, int]:
+        with get_connection() as connection:
+            rows = connection.execute(
+                f"SELECT value_key, COUNT(*) FROM {FOUNDATION_LIST_TABLES[field]} GROUP BY value_key"
+            ).fetchall()
+        return {value: count for value, count in rows}
+
+    def candidate_positions(self, applicant: ApplicantProfile) -> List[int]:
+        """Foundations that share the applicant's category or target group and cover their geography."""
+        applicant_type = normalize(applicant.applicant_type)
+        aliases = APPLICANT_GROUP_ALIASES.get(applicant_type, [applicant_type])
+        geographies = [*OPEN_GEOGRAPHIES, *get_geography_index().area_keys(applicant.municipality)]
+        # Compound selects evaluate left to right: (category UNION group) INTERSECT geography.
+        with get_connection() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT foundation_position FROM foundation_categories WHERE value_key = ?
+                UNION
+                SELECT foundation_position FROM foundation_target_groups
+                WHERE value_key IN ({", ".join("?" for _ in aliases)})
+                INTERSECT
+                SELECT foundation_position FROM foundation_geographies
+                WHERE value_key IN ({", ".join("?" for _ in geographies)})
+                ORDER BY 1
+                """,
+                (normalize(applicant.need_category), *aliases, *geographies),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def prefilter(self, applicant: ApplicantProfile) -> Iterator[Foundation]:
+        positions = self.candidate_positions(applicant)
+        for start in range(0, len(positions), self.batch_size):
+            with get_connection() as connection:
+                batch = _load_positions(connection, positions[start : start + self.batch_size])
+            yield from batch
+
+
+def ensure_catalog_imported(path: Path = STIFTELSER_PATH) -> SqliteCatalog:
+    """Return the SQLite catalog, importing ``path`` whenever it differs from the last import.
+
+    A catalog whose value_keys were computed another way (an older key version or
+    another geography table) is imported again too.
+    """
+    fingerprint = source_fingerprint(path)
+    with get_connection() as connection:
+        meta = dict(connection.execute("SELECT name, value FROM catalog_meta").fetchall())
+    if meta.get("source") != fingerprint or meta.get("value_keys") != value_key_version():
+        import_foundations(load_foundations(path), source=fingerprint)
+    return SqliteCatalog()
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Importera stiftelsekatalogen till SQLite.")
+    parser.add_argument("source", type=Path, nargs="?", default=STIFTELSER_PATH)
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    fingerprint = source_fingerprint(args.source)
+    count = import_foundations(load_foundations(args.source), source=fingerprint)
+    print(f"Importerade {count} stiftelser från {args.source}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, List, Sequence, overload
+
+from config import SHARED_CATALOG_DIR, STIFTELSER_PATH
+from matching import normalize
+from models import Foundation
+from seed import load_foundations
+
+
+# File layout: MAGIC | u32 header length | JSON header | 8-byte aligned sections.
+# The header maps section name -> [offset, byte length, array typecode], so a
+# reader can view every column straight out of the mapping with memoryview.cast.
+MAGIC = b"SFCAT01\0"
+CURRENT_FILE = "CURRENT"
+SCALAR_STRING_FIELDS = ("id", "name", "description", "application_url", "notes")
+LIST_FIELDS = ("target_groups", "categories", "geographies", "required_documents")
+INDEXED_FIELDS = ("target_groups", "categories", "geographies")
+NUMERIC_FIELDS = ("age_min", "age_max", "monthly_income_cap_sek", "typical_amount_min_sek", "typical_amount_max_sek")
+NO_INCOME_CAP = -1
+
+
+def _catalog_path(directory: Path, generation: int) -> Path:
+    return directory / f"catalog-{generation:06d}.bin"
+
+
+def read_generation(directory: Path) -> int:
+    try:
+        return int((directory / CURRENT_FILE).read_text(encoding="utf-8").strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _compile_sections(foundations: Sequence[Foundation]) -> Dict[str, array]:
+    strings = set()
+    for foundation in foundations:
+        strings.update(getattr(foundation, name) for name in SCALAR_STRING_FIELDS)
+        for name in LIST_FIELDS:
+            values = getattr(foundation, name)
+            strings.update(values)
+            if name in INDEXED_FIELDS:
+                strings.update(normalize(value) for value in values)
+
+    # Sorted interning lets readers look terms up by bisection without a dict.
+    table = sorted(strings)
+    string_ids = {value: index for index, value in enumerate(table)}
+    encoded = [value.encode("utf-8") for value in table]
+    string_offsets = array("Q", [0])
+    for blob in encoded:
+        string_offsets.append(string_offsets[-1] + len(blob))
+
+    sections: Dict[str, array] = {
+        "strings.offsets": string_offsets,
+        "strings.data": array("B", b"".join(encoded)),
+    }
+    for name in NUMERIC_FIELDS:
+        sections[name] = array(
+            "q",
+            (
+                NO_INCOME_CAP if getattr(foundation, name) is None else getattr(foundation, name)
+                for foundation in foundations
+            ),
+        )
+    for name in SCALAR_STRING_FIELDS:
+        sections[name] = array("I", (string_ids[getattr(foundation, name)] for foundation in foundations))
+
+    for name in LIST_FIELDS:
+        offsets = array("I", [0])
+        values = array("I")
+        postings: Dict[int, List[int]] = {}
+        for position, foundation in enumerate(foundations):
+            for value in getattr(foundation, name):
+                values.append(string_ids[value])
+                if name in INDEXED_FIELDS:
+                    term_postings = postings.setdefault(string_ids[normalize(value)], [])
+                    if not term_postings or term_postings[-1] != position:
+                        term_postings.append(position)
+            offsets.append(len(values))
+        sections[f"{name}.offsets"] = offsets
+        sections[f"{name}.values"] = values
+
+        if name in INDEXED_FIELDS:
+            terms = array("I", sorted(postings))
+            posting_offsets = array("I", [0])
+            posting_values = array("I")
+            for term in terms:
+                posting_values.extend(postings[term])
+                posting_offsets.append(len(posting_values))
+            sections[f"{name}.index.terms"] = terms
+            sections[f"{name}.index.offsets"] = posting_offsets
+            sections[f"{name}.index.postings"] = posting_values
+    return sections
+
+
+def publish_catalog(foundations: Sequence[Foundation], directory: Path = SHARED_CATALOG_DIR) -> int:
+    """Write a new catalog generation and atomically make it current.
+
+    Views of an older generation keep reading their mapping until they are
+    dropped; the last two generations are kept on disk.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    generation = read_generation(directory) + 1
+    sections = _compile_sections(foundations)
+
+    layout: Dict[str, list] = {}
+    offset = 0
+    for name, values in sections.items():
+        size = len(values) * values.itemsize
+        layout[name] = [offset, size, values.typecode]
+        offset += size + (-size % 8)
+    header = json.dumps(
+        {"generation": generation, "count": len(foundations), "sections": layout},
+        separators=(",", ":"),
+    ).encode("utf-8")
+    data_start = len(MAGIC) + 4 + len(header)
+    data_start += -data_start % 8
+
+    target = _catalog_path(directory, generation)
+    temporary = target.with_suffix(".tmp")
+    with temporary.open("wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<I", data_start - len(MAGIC) - 4))
+        file.write(header.ljust(data_start - len(MAGIC) - 4, b" "))
+        for name, values in sections.items():
+            file.seek(data_start + layout[name][0])
+            values.tofile(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, target)
+
+    current = directory / f"{CURRENT_FILE}.tmp"
+    current.write_text(str(generation), encoding="utf-8")
+    os.replace(current, directory / CURRENT_FILE)
+
+    for old in sorted(directory.glob("catalog-*.bin"))[:-2]:
+        try:
+            old.unlink()
+        except OSError:  # pragma: no cover - still mapped on platforms that lock open files
+            pass
+    return generation
+
+
+class SharedCatalog(Sequence[Foundation]):
+    """Read-only, zero-copy view of one published catalog generation.
+
+    Columns are memoryviews into a shared mapping, so any number of worker
+    processes share the same physical pages. ``Foundation`` objects are only
+    built for the rows a caller actually asks for.
+
+    A view never changes generation: ``attach_shared_catalog`` hands out a new
+    view when the publisher moves on, and the old mapping is unmapped once the
+    last thread holding it lets go.
+    """
+
+    def __init__(self, directory: Path = SHARED_CATALOG_DIR, generation: int | None = None) -> None:
+        self.directory = directory
+        generation = read_generation(directory) if generation is None else generation
+        if generation <= 0:
+            raise RuntimeError(f"Ingen publicerad katalog finns i {directory}. Kör catalog_store.py publish.")
+        with _catalog_path(directory, generation).open("rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapping[: len(MAGIC)] != MAGIC:
+            mapping.close()
+            raise RuntimeError("Katalogfilen har fel format.")
+        (header_length,) = struct.unpack_from("<I", mapping, len(MAGIC))
+        header_start = len(MAGIC) + 4
+        header = json.loads(bytes(mapping[header_start : header_start + header_length]))
+        data_start = header_start + header_length
+
+        whole = memoryview(mapping)
+        self._views: Dict[str, memoryview] = {
+            name: whole[data_start + offset : data_start + offset + size].cast(typecode)
+            for name, (offset, size, typecode) in header["sections"].items()
+        }
+        whole.release()
+        self._mmap: mmap.mmap | None = mapping
+        self._count: int = header["count"]
+        self.generation: int = header["generation"]
+
+    def close(self) -> None:
+        """Unmap the catalog now. Only for a view no other thread can still be reading."""
+        for view in self._views.values():
+            view.release()
+        self._views = {}
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A caller still holds a postings view; the mapping is freed with it.
+                pass
+            self._mmap = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, index: int) -> Foundation: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Foundation]: ...
+
+    def __getitem__(self, index: int | slice) -> Foundation | List[Foundation]:
+        if isinstance(index, slice):
+            return [self.foundation(position) for position in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self.foundation(index)
+
+    def __iter__(self) -> Iterator[Foundation]:
+        for position in range(self._count):
+            yield self.foundation(position)
+
+    def string(self, string_id: int) -> str:
+        offsets = self._views["strings.offsets"]
+        return bytes(self._views["strings.data"][offsets[string_id] : offsets[string_id + 1]]).decode("utf-8")
+
+    def string_id(self, value: str) -> int | None:
+        offsets = self._views["strings.offsets"]
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.string(middle) < value:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(offsets) - 1 and self.string(low) == value:
+            return low
+        return None
+
+    def _list(self, name: str, position: int) -> List[str]:
+        offsets = self._views[f"{name}.offsets"]
+        values = self._views[f"{name}.values"]
+        return [self.string(value) for value in values[offsets[position] : offsets[position + 1]]]
+
+    def foundation(self, position: int) -> Foundation:
+        views = self._views
+        income_cap = views["monthly_income_cap_sek"][position]
+        return Foundation.model_construct(
+            **{name: self.string(views[name][position]) for name in SCALAR_STRING_FIELDS},
+            **{name: self._list(name, position) for name in LIST_FIELDS},
+            age_min=views["age_min"][position],
+            age_max=views["age_max"][position],
+            monthly_income_cap_sek=None if income_cap == NO_INCOME_CAP else income_cap,
+            typical_amount_min_sek=views["typical_amount_min_sek"][position],
+            typical_amount_max_sek=views["typical_amount_max_sek"][position],
+        )
+
+    def find(self, foundation_id: str) -> Foundation | None:
+        string_id = self.string_id(foundation_id)
+        if string_id is None:
+            return None
+        ids = self._views["id"]
+        for position in range(self._count):
+            if ids[position] == string_id:
+                return self.foundation(position)
+        return None
+
+    def postings(self, field: str, term: str) -> memoryview:
+        """Return the positions of foundations whose ``field`` contains ``term``.
+
+        The view points into the mapping and keeps it alive while it is held.
+        """
+        terms = self._views[f"{field}.index.terms"]
+        offsets = self._views[f"{field}.index.offsets"]
+        string_id = self.string_id(normalize(term))
+        if string_id is not None:
+            slot = bisect.bisect_left(terms, string_id)
+            if slot < len(terms) and terms[slot] == string_id:
+                return self._views[f"{field}.index.postings"][offsets[slot] : offsets[slot + 1]]
+        return memoryview(array("I"))
+
+    def term_counts(self, field: str) -> Dict[str, int]:
+        terms = self._views[f"{field}.index.terms"]
+        offsets = self._views[f"{field}.index.offsets"]
+        return {self.string(term): offsets[slot + 1] - offsets[slot] for slot, term in enumerate(terms)}
+
+    def candidates(self, categories: Sequence[str] = (), target_groups: Sequence[str] = ()) -> List[Foundation]:
+        positions = set()
+        for category in categories:
+            positions.update(self.postings("categories", category))
+        for group in target_groups:
+            positions.update(self.postings("target_groups", group))
+        return [self.foundation(position) for position in sorted(positions)]
+
+
+_attached: Dict[Path, SharedCatalog] = {}
+_attach_lock = Lock()
+
+
+def attach_shared_catalog(directory: Path = SHARED_CATALOG_DIR) -> SharedCatalog:
+    """Return this process's view of the current catalog generation.
+
+    Threads share one view per generation. When a newer generation has been
+    published a new view replaces it here; threads still reading the old one
+    keep it until they drop their reference.
+    """
+    with _attach_lock:
+        catalog = _attached.get(directory)
+        if catalog is None or catalog.generation != read_generation(directory):
+            catalog = _attached[directory] = SharedCatalog(directory)
+        return catalog
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Publicera stiftelsekatalogen till delat minne.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    publish = subcommands.add_parser("publish", help="Skriv en ny katalog-generation.")
+    publish.add_argument("--source", type=Path, default=STIFTELSER_PATH)
+    publish.add_argument("--directory", type=Path, default=SHARED_CATALOG_DIR)
+    info = subcommands.add_parser("info", help="Visa aktuell generation.")
+    info.add_argument("--directory", type=Path, default=SHARED_CATALOG_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "publish":
+        generation = publish_catalog(load_foundations(args.source), args.directory)
+        print(f"Publicerade generation {generation} i {args.directory}.")
+    else:
+        catalog = SharedCatalog(args.directory)
+        print(f"Generation {catalog.generation}: {len(catalog)} stiftelser.")
+        catalog.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
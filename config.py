@@ -15,6 +15,19 @@ if load_dotenv is not None:
 DATA_DIR = BASE_DIR / "data"
 DB_PATH = DATA_DIR / "stiftelseforum.db"
 STIFTELSER_PATH = DATA_DIR / "stiftelser.json"
+GEOGRAPHY_PATH = DATA_DIR / "geografi.json"
+SCORING_RULES_PATH = Path(os.getenv("SCORING_RULES_PATH", DATA_DIR / "scoring_rules.json"))
+SCORING_RULES_CHECK_SECONDS = float(os.getenv("SCORING_RULES_CHECK_SECONDS", "1"))
+SHARED_CATALOG_DIR = Path(os.getenv("SHARED_CATALOG_DIR", DATA_DIR / "shared_catalog"))
+USE_SHARED_CATALOG = os.getenv("USE_SHARED_CATALOG", "false").lower() == "true"
+USE_SQLITE_CATALOG = os.getenv("USE_SQLITE_CATALOG", "false").lower() == "true"
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").lower()
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", DATA_DIR / "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "false").lower() == "true"
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", DATA_DIR / "archive"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "730"))
 APP_TITLE = "Stiftelseforum MVP"
 APP_SUBTITLE = "Inmatning → resultat → bonus för stiftelsen"
 TOP_MATCH_COUNT = 3
@@ -23,5 +36,15 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5-mini")
 OPENAI_REASONING_EFFORT = os.getenv("OPENAI_REASONING_EFFORT", "low")
 OPENAI_WEB_MODEL = os.getenv("OPENAI_WEB_MODEL", "gpt-5.2")
+OPENAI_DRAFT_CONCURRENCY = max(1, int(os.getenv("OPENAI_DRAFT_CONCURRENCY", "3")))
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "60"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+OPENAI_MAX_QUEUE_SECONDS = float(os.getenv("OPENAI_MAX_QUEUE_SECONDS", "5"))
+OPENAI_USE_STUB = os.getenv("OPENAI_USE_STUB", "false").lower() == "true"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10"))
 ENABLE_OPENAI_BY_DEFAULT = os.getenv("ENABLE_OPENAI_BY_DEFAULT", "true").lower() == "true"
 ENABLE_WEB_RESEARCH_BY_DEFAULT = os.getenv("ENABLE_WEB_RESEARCH_BY_DEFAULT", "false").lower() == "true"
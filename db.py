@@ -2,17 +2,28 @@ from __future__ import annotations
 
 import sqlite3
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Iterator
 
 from config import DB_PATH
+from geography import fold
+
+FOUNDATION_LIST_TABLES = {
+    "categories": "foundation_categories",
+    "target_groups": "foundation_target_groups",
+    "geographies": "foundation_geographies",
+    "required_documents": "foundation_documents",
+}
 
 
 def ensure_db() -> None:
     Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
     with sqlite3.connect(DB_PATH) as connection:
         cursor = connection.cursor()
+        # Only takes effect on a new, empty file; lets archive.compact() return
+        # freed pages to the OS without a blocking full VACUUM.
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS applications (
@@ -31,10 +42,12 @@ def ensure_db() -> None:
                 has_invoice INTEGER NOT NULL,
                 has_medical_certificate INTEGER NOT NULL,
                 has_research_summary INTEGER NOT NULL,
-                created_at TEXT NOT NULL
+                created_at TEXT NOT NULL,
+                municipality_key TEXT NOT NULL DEFAULT ''
             )
             """
         )
+        _ensure_municipality_key(connection)
         cursor.execute(
             """
             CREATE TABLE IF NOT EXISTS matches (
@@ -50,9 +63,275 @@ def ensure_db() -> None:
             )
             """
         )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_matches_application_id ON matches(application_id)"
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_applications_created_at ON applications(created_at)")
+        # Reverse matching narrows applicants by these before scoring (reverse_matching.py).
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_applications_need_category ON applications(need_category, age)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_applications_applicant_type ON applications(applicant_type, age)")
+        # Superseded by the index on the municipality_key column below.
+        cursor.execute("DROP INDEX IF EXISTS idx_applications_municipality_key")
+        cursor.execute("DROP INDEX IF EXISTS idx_applications_municipality_fold")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_applications_folded_municipality ON applications(municipality_key, age)"
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS export_watermarks (
+                name TEXT PRIMARY KEY,
+                last_application_id INTEGER NOT NULL,
+                last_match_id INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS stats_totals (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS stats_categories (
+                need_category TEXT PRIMARY KEY,
+                application_count INTEGER NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS stats_foundations (
+                foundation_id TEXT PRIMARY KEY,
+                foundation_name TEXT NOT NULL,
+                match_count INTEGER NOT NULL,
+                score_total INTEGER NOT NULL,
+                missing_documents_count INTEGER NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stats_foundations_match_count ON stats_foundations(match_count DESC)"
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS application_insights (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                application_id INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                insights_json TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY(application_id) REFERENCES applications(id)
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS application_drafts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                application_id INTEGER NOT NULL,
+                foundation_id TEXT NOT NULL DEFAULT '',
+                version INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                body TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                UNIQUE(application_id, foundation_id, version),
+                FOREIGN KEY(application_id) REFERENCES applications(id)
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS application_research (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                application_id INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                markdown TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY(application_id) REFERENCES applications(id)
+            )
+            """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                application_id INTEGER,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_after TEXT NOT NULL,
+                lease_owner TEXT,
+                lease_expires_at TEXT,
+                error TEXT NOT NULL DEFAULT '',
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_application_id ON jobs(application_id)")
+        for table in ("application_insights", "application_research"):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_application_id ON {table}(application_id)")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_prompt_hash ON {table}(prompt_hash)")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS openai_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                operation TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                cached_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                reasoning_tokens INTEGER NOT NULL,
+                wait_seconds REAL NOT NULL,
+                seconds REAL NOT NULL,
+                error TEXT NOT NULL DEFAULT '',
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_openai_usage_created_at ON openai_usage(created_at)")
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS foundations (
+                position INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                description TEXT NOT NULL,
+                age_min INTEGER NOT NULL,
+                age_max INTEGER NOT NULL,
+                monthly_income_cap_sek INTEGER,
+                typical_amount_min_sek INTEGER NOT NULL,
+                typical_amount_max_sek INTEGER NOT NULL,
+                application_url TEXT NOT NULL,
+                notes TEXT NOT NULL
+            )
+            """
+        )
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_foundations_age ON foundations(age_min, age_max)")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_foundations_amount ON foundations(typical_amount_min_sek, typical_amount_max_sek)"
+        )
+        # One child table per list field; ordinal keeps the catalog order and
+        # value_key is the normalised value the prefilter looks up.
+        for table in FOUNDATION_LIST_TABLES.values():
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    foundation_position INTEGER NOT NULL,
+                    ordinal INTEGER NOT NULL,
+                    value TEXT NOT NULL,
+                    value_key TEXT NOT NULL,
+                    PRIMARY KEY (foundation_position, ordinal),
+                    FOREIGN KEY(foundation_position) REFERENCES foundations(position)
+                ) WITHOUT ROWID
+                """
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_value_key ON {table}(value_key, foundation_position)")
+        # What the catalog tables were imported from, so a changed source is re-imported (catalog_db.py).
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        # The catalog version the stored matches were scored against (rescoring.py).
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scored_foundations (
+                foundation_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                scored_at TEXT NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        _ensure_search_index(cursor)
+        if cursor.execute("SELECT 1 FROM stats_totals WHERE name = 'applications'").fetchone() is None:
+            from stats import rebuild_stats
+
+            rebuild_stats(connection)
         connection.commit()
 
 
+def _ensure_municipality_key(connection: sqlite3.Connection) -> None:
+    """Add ``applications.municipality_key`` to older databases and backfill it.
+
+    The column holds ``geography.fold(municipality)``, written by the repository
+    on insert, so reverse matching can look municipalities up with an index that
+    agrees exactly with the Python spelling rules.
+    """
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(applications)")}
+    if "municipality_key" in columns:
+        return
+    connection.execute("ALTER TABLE applications ADD COLUMN municipality_key TEXT NOT NULL DEFAULT ''")
+    connection.create_function("geography_fold", 1, fold, deterministic=True)
+    connection.execute("UPDATE applications SET municipality_key = geography_fold(municipality)")
+
+
+def _ensure_search_index(cursor: sqlite3.Cursor) -> None:
+    """Full-text index over the free-text columns of ``applications``.
+
+    It is an external-content FTS5 table kept in sync by triggers. unicode61
+    with remove_diacritics 2 folds å/ä/ö to a/o, so "tandvard" finds "tandvård".
+    The first run backfills existing rows.
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'applications_fts'"
+    ).fetchone()
+    cursor.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS applications_fts USING fts5(
+            description,
+            need_category,
+            municipality,
+            content = 'applications',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS applications_fts_insert AFTER INSERT ON applications BEGIN
+            INSERT INTO applications_fts (rowid, description, need_category, municipality)
+            VALUES (new.id, new.description, new.need_category, new.municipality);
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS applications_fts_delete AFTER DELETE ON applications BEGIN
+            INSERT INTO applications_fts (applications_fts, rowid, description, need_category, municipality)
+            VALUES ('delete', old.id, old.description, old.need_category, old.municipality);
+        END
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS applications_fts_update
+        AFTER UPDATE OF description, need_category, municipality ON applications BEGIN
+            INSERT INTO applications_fts (applications_fts, rowid, description, need_category, municipality)
+            VALUES ('delete', old.id, old.description, old.need_category, old.municipality);
+            INSERT INTO applications_fts (rowid, description, need_category, municipality)
+            VALUES (new.id, new.description, new.need_category, new.municipality);
+        END
+        """
+    )
+    if exists is None:
+        cursor.execute("INSERT INTO applications_fts (applications_fts) VALUES ('rebuild')")
+
+
 @contextmanager
 def get_connection() -> Iterator[sqlite3.Connection]:
     connection = sqlite3.connect(DB_PATH)
@@ -64,5 +343,5 @@ def get_connection() -> Iterator[sqlite3.Connection]:
         connection.close()
 
 
-def utc_now() -> str:
-    return datetime.utcnow().isoformat(timespec="seconds")
+def utc_now(offset_seconds: float = 0) -> str:
+    return (datetime.utcnow() + timedelta(seconds=offset_seconds)).isoformat(timespec="seconds")
@@ -1,56 +1,86 @@
 from __future__ import annotations
 
+from string import Template
 from textwrap import dedent
 from typing import List
 
 from models import ApplicantInsights, ApplicantProfile, MatchResult
 
 
-def create_application_draft(
-    applicant: ApplicantProfile,
-    matches: List[MatchResult],
-    insights: ApplicantInsights | None = None,
-) -> str:
-    top_match = matches[0] if matches else None
-    target_name = top_match.foundation.name if top_match else "vald stiftelse"
-
-    reasons = "\n".join(f"- {reason}" for reason in (top_match.reasons[:3] if top_match else []))
-    documents = applicant.document_flags or ["inga dokument angivna ännu"]
-    document_list = "\n".join(f"- {doc}" for doc in documents)
-    summary = insights.concise_summary if insights else applicant.description
-    missing_info = insights.missing_information if insights else []
-    missing_info_block = "\n".join(f"- {item}" for item in missing_info)
-    completion_block = f"Följande kan behöva kompletteras:\n{missing_info_block}" if missing_info_block else ""
-
-    return dedent(
-        f"""
+DRAFT_TEMPLATE = Template(
+    dedent(
+        """
         Ansökningsutkast
         =================
 
-        Till: {target_name}
+        Till: $target_name
 
         Hej,
 
-        Jag heter {applicant.full_name} och skickar denna ansökan för att söka stöd för {applicant.need_category.lower()}.
-        Jag bor i {applicant.municipality}, är {applicant.age} år och beskriver min situation så här:
+        Jag heter $full_name och skickar denna ansökan för att söka stöd för $need_category.
+        Jag bor i $municipality, är $age år och beskriver min situation så här:
 
-        {summary}
+        $summary
 
-        Jag söker {applicant.requested_amount_sek:,} SEK för detta behov. Min ungefärliga månadsinkomst är
-        {applicant.monthly_income_sek:,} SEK.
+        Jag söker $requested_amount SEK för detta behov. Min ungefärliga månadsinkomst är
+        $monthly_income SEK.
 
         Varför denna stiftelse verkar passa:
-        {reasons or '- Matchningen behöver granskas manuellt.'}
+        $reasons
 
         Underlag som just nu finns:
-        {document_list}
+        $document_list
 
-        {completion_block}
+        $completion_block
 
         Jag hoppas att min ansökan kan prövas och kompletterar gärna med ytterligare information vid behov.
 
         Vänliga hälsningar,
-        {applicant.full_name}
-        {applicant.email}
+        $full_name
+        $email
         """
     ).strip()
+)
+
+
+def _bullets(items: List[str]) -> str:
+    return "\n".join(f"- {item}" for item in items)
+
+
+def render_draft(
+    applicant: ApplicantProfile,
+    match: MatchResult | None,
+    insights: ApplicantInsights | None = None,
+) -> str:
+    missing_info_block = _bullets(insights.missing_information if insights else [])
+    return DRAFT_TEMPLATE.substitute(
+        target_name=match.foundation.name if match else "vald stiftelse",
+        full_name=applicant.full_name,
+        need_category=applicant.need_category.lower(),
+        municipality=applicant.municipality,
+        age=applicant.age,
+        summary=insights.concise_summary if insights else applicant.description,
+        requested_amount=f"{applicant.requested_amount_sek:,}",
+        monthly_income=f"{applicant.monthly_income_sek:,}",
+        reasons=_bullets(match.reasons[:3] if match else []) or "- Matchningen behöver granskas manuellt.",
+        document_list=_bullets(applicant.document_flags or ["inga dokument angivna ännu"]),
+        completion_block=f"Följande kan behöva kompletteras:\n{missing_info_block}" if missing_info_block else "",
+        email=applicant.email,
+    )
+
+
+def create_application_draft(
+    applicant: ApplicantProfile,
+    matches: List[MatchResult],
+    insights: ApplicantInsights | None = None,
+) -> str:
+    return render_draft(applicant, matches[0] if matches else None, insights)
+
+
+def create_application_drafts(
+    applicant: ApplicantProfile,
+    matches: List[MatchResult],
+    insights: ApplicantInsights | None = None,
+) -> List[str]:
+    """Render one tailored draft per match, in the same order as ``matches``."""
+    return [render_draft(applicant, match, insights) for match in matches]
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+from db import ensure_db
+from repository import (
+    EXPORT_COLUMNS,
+    export_high_water,
+    get_export_watermark,
+    iter_application_match_chunks,
+    set_export_watermark,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - parquet export is optional
+    pa = None  # type: ignore[assignment]
+    pq = None  # type: ignore[assignment]
+
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_WATERMARK = "default"
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+@dataclass(slots=True)
+class ExportReport:
+    rows_written: int
+    first_application_id: int
+    last_application_id: int
+    elapsed_seconds: float
+
+
+def _parquet_schema() -> "pa.Schema":
+    integer_columns = {
+        "application_id",
+        "age",
+        "requested_amount_sek",
+        "monthly_income_sek",
+        "has_quote",
+        "has_invoice",
+        "has_medical_certificate",
+        "has_research_summary",
+        "match_id",
+        "score",
+    }
+    return pa.schema(
+        [(column, pa.int64() if column in integer_columns else pa.string()) for column in EXPORT_COLUMNS]
+    )
+
+
+def export_applications(
+    path: Path,
+    file_format: str = "csv",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    incremental: bool = False,
+    watermark: str = DEFAULT_WATERMARK,
+) -> ExportReport:
+    """Write applications joined with matches to ``path`` one chunk at a time.
+
+    In incremental mode only applications after the stored watermark are written,
+    plus earlier applications whose matches were written or rewritten since (the
+    insights job and rescoring replace match rows). Such an application is written
+    again with all its current matches, so readers should keep the latest rows per
+    ``application_id``. The watermark is advanced once the file is complete.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Okänt exportformat: {file_format}.")
+    if file_format == "parquet" and pa is None:
+        raise RuntimeError("Paketet pyarrow är inte installerat. Kör pip install pyarrow för Parquet-export.")
+
+    started = time.perf_counter()
+    after_id, after_match_id = get_export_watermark(watermark) if incremental else (0, 0)
+    until_id, until_match_id = export_high_water()
+    # A full export already has every match; only incremental runs look for rewrites.
+    chunks = iter_application_match_chunks(
+        after_id=after_id,
+        until_id=until_id,
+        chunk_size=chunk_size,
+        after_match_id=after_match_id,
+        until_match_id=until_match_id if incremental else after_match_id,
+    )
+    rows_written = 0
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if file_format == "csv":
+        with path.open("w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_COLUMNS)
+            for chunk in chunks:
+                writer.writerows(chunk)
+                rows_written += len(chunk)
+    else:
+        schema = _parquet_schema()
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunks:
+                columns = list(zip(*chunk))
+                writer.write_table(pa.Table.from_arrays([pa.array(column) for column in columns], schema=schema))
+                rows_written += len(chunk)
+
+    if incremental:
+        # Archiving can delete the newest match rows; match ids are never reused.
+        set_export_watermark(watermark, until_id, max(after_match_id, until_match_id))
+
+    return ExportReport(
+        rows_written=rows_written,
+        first_application_id=after_id + 1,
+        last_application_id=until_id,
+        elapsed_seconds=time.perf_counter() - started,
+    )
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Exportera ansökningar och matchningar för analys.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--incremental", action="store_true", help="Exportera bara rader efter senaste vattenmärket.")
+    parser.add_argument("--watermark", default=DEFAULT_WATERMARK)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("parquet" if args.path.suffix.lower() == ".parquet" else "csv")
+    ensure_db()
+    report = export_applications(
+        args.path,
+        file_format=file_format,
+        chunk_size=args.chunk_size,
+        incremental=args.incremental,
+        watermark=args.watermark,
+    )
+    print(
+        f"Skrev {report.rows_written} rader (ansökningar {report.first_application_id}–"
+        f"{report.last_application_id}) på {report.elapsed_seconds:.2f} s."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
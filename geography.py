@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import json
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from config import GEOGRAPHY_PATH
+
+
+NATIONWIDE = "hela sverige"
+REGIONAL = "regional"
+# Bit 0 is set for every applicant, so "hela sverige" is a plain bitset hit.
+NATIONWIDE_BIT = 1
+REGION_PREFIX = "riksområde "
+
+
+def _key(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def fold(text: str) -> str:
+    """Case- and diacritic-insensitive spelling: "Göteborg", "GOTEBORG" and "goteborg" agree.
+
+    Hyphens count as spaces so "Upplands-Bro" and "Upplands Bro" agree too.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _key(stripped.replace("-", " "))
+
+
+@dataclass(frozen=True, slots=True)
+class Coverage:
+    """The area one foundation's geography tags cover, compiled once per tag list.
+
+    ``bits`` has one bit per covered municipality (plus ``NATIONWIDE_BIT`` for
+    "hela sverige"). Tags that are not in the table keep working as before
+    through ``places``, which holds their folded spelling. ``places`` also holds
+    the key of every county or region tag, for applicants who give an area
+    instead of a municipality.
+    """
+
+    bits: int
+    places: frozenset[str]
+    regional: bool
+
+
+class GeographyIndex:
+    """Municipality → county → region lookup compiled from ``data/geografi.json``.
+
+    Every municipality gets one bit; a county or region tag resolves to the OR of
+    its municipalities. Names are looked up by exact (case-insensitive) spelling
+    first and by folded spelling second. A folded spelling shared by two
+    municipalities (Håbo and Habo) is left out, so it only resolves when spelled
+    exactly. A name that is both a municipality and a county ("Uppsala") means
+    the municipality, as it always has; the county is "Uppsala län".
+
+    An applicant may also give a county or region. That matches tags for the
+    same area or an area around it, but not tags for single municipalities.
+    """
+
+    def __init__(self, table: dict) -> None:
+        municipality_aliases: Dict[str, List[str]] = table.get("municipality_aliases", {})
+        self._exact: Dict[str, Tuple[int, str]] = {}
+        self._folded: Dict[str, Tuple[int, str] | None] = {}
+        self._area_exact: Dict[str, Tuple[int, str]] = {}
+        self._area_folded: Dict[str, Tuple[int, str] | None] = {}
+        self._areas: Dict[str, List[str]] = {}
+        # County or region key -> its own key and the region around it.
+        self._area_parents: Dict[str, List[str]] = {}
+        # County or region key -> folded spellings of itself and every area inside it.
+        self._area_spellings: Dict[str, set[str]] = {REGION_PREFIX + _key(name): set() for name in table["regions"]}
+        self._spellings: Dict[int, List[str]] = {}
+        self._coverage: Dict[Tuple[str, ...], Coverage] = {}
+
+        region_masks: Dict[str, int] = {name: 0 for name in table["regions"]}
+        position = 1
+        for county in table["counties"]:
+            county_key = _key(county["name"])
+            region_key = REGION_PREFIX + _key(county["region"])
+            county_mask = 0
+            for name in county["municipalities"]:
+                bit = 1 << position
+                position += 1
+                county_mask |= bit
+                entry = (bit, _key(name))
+                spellings = [name, *municipality_aliases.get(name, [])]
+                self._areas[_key(name)] = [_key(name), county_key, region_key]
+                self._spellings[bit] = sorted({fold(spelling) for spelling in spellings})
+                for spelling in spellings:
+                    self._exact.setdefault(_key(spelling), entry)
+                    self._register(self._folded, fold(spelling), entry)
+            region_masks[county["region"]] |= county_mask
+            county_spellings = [county["name"], *county.get("aliases", [])]
+            self._area_parents[county_key] = [county_key, region_key]
+            self._area_spellings[county_key] = {fold(spelling) for spelling in county_spellings}
+            self._area_spellings[region_key].update(self._area_spellings[county_key])
+            for spelling in county_spellings:
+                self._area_exact.setdefault(_key(spelling), (county_mask, county_key))
+                self._register(self._area_folded, fold(spelling), (county_mask, county_key))
+        for name, mask in region_masks.items():
+            entry = (mask, REGION_PREFIX + _key(name))
+            self._area_parents[entry[1]] = [entry[1]]
+            self._area_spellings[entry[1]].add(fold(REGION_PREFIX + name))
+            self._area_exact.setdefault(REGION_PREFIX + _key(name), entry)
+            self._register(self._area_folded, fold(REGION_PREFIX + name), entry)
+        self.size = position - 1
+
+    @staticmethod
+    def _register(lookup: Dict[str, Tuple[int, str] | None], key: str, entry: Tuple[int, str]) -> None:
+        if key in lookup and lookup[key] != entry:
+            lookup[key] = None
+        else:
+            lookup[key] = entry
+
+    def _municipality(self, text: str) -> Tuple[int, str] | None:
+        return self._exact.get(_key(text)) or self._folded.get(fold(text))
+
+    def _area(self, text: str) -> Tuple[int, str] | None:
+        return self._area_exact.get(_key(text)) or self._area_folded.get(fold(text))
+
+    def _resolve(self, tag: str) -> Tuple[int, str] | None:
+        return self._municipality(tag) or self._area(tag)
+
+    def applicant_bits(self, municipality: str) -> int:
+        entry = self._municipality(municipality)
+        return NATIONWIDE_BIT | (entry[0] if entry else 0)
+
+    def applicant_places(self, municipality: str) -> frozenset[str]:
+        """What the applicant's text can match in ``Coverage.places``.
+
+        Its folded spelling, plus the keys of the county or region it names and
+        the region around that county.
+        """
+        places = {fold(municipality)}
+        if self._municipality(municipality) is None and (area := self._area(municipality)) is not None:
+            places.update(self._area_parents[area[1]])
+        return frozenset(places)
+
+    def coverage(self, geographies: Sequence[str]) -> Coverage:
+        """The compiled ``Coverage`` of one foundation's tags, cached per tag list."""
+        cache_key = tuple(geographies)
+        cached = self._coverage.get(cache_key)
+        if cached is not None:
+            return cached
+        bits = 0
+        places = set()
+        regional = False
+        for tag in geographies:
+            key = _key(tag)
+            if key == NATIONWIDE:
+                bits |= NATIONWIDE_BIT
+            elif key == REGIONAL:
+                regional = True
+            elif (entry := self._resolve(tag)) is not None:
+                bits |= entry[0]
+                if entry[1] in self._area_parents:
+                    places.add(entry[1])
+            else:
+                places.add(fold(tag))
+        coverage = Coverage(bits=bits, places=frozenset(places), regional=regional)
+        self._coverage[cache_key] = coverage
+        return coverage
+
+    def canonical(self, tag: str) -> str:
+        """The key a tag is stored under in ``foundation_geographies.value_key``."""
+        key = _key(tag)
+        if key in (NATIONWIDE, REGIONAL):
+            return key
+        entry = self._resolve(tag)
+        return entry[1] if entry else fold(tag)
+
+    def area_keys(self, municipality: str) -> List[str]:
+        """Canonical keys of the municipality, its county and its region.
+
+        For a county or region the keys of that area and the region around it.
+        """
+        entry = self._municipality(municipality)
+        if entry is not None:
+            return list(self._areas[entry[1]])
+        area = self._area(municipality)
+        return list(self._area_parents[area[1]]) if area else [fold(municipality)]
+
+    def municipality_spellings(self, geographies: Iterable[str]) -> List[str]:
+        """Folded spellings of every municipality the tags cover, for SQL filters.
+
+        County and region tags add the spellings of themselves and every area
+        inside them. Tags outside the table contribute their own folded spelling.
+        """
+        spellings = set()
+        for tag in geographies:
+            entry = self._resolve(tag)
+            if entry is None:
+                spellings.add(fold(tag))
+                continue
+            spellings.update(self._area_spellings.get(entry[1], ()))
+            mask = entry[0]
+            while mask:
+                bit = mask & -mask
+                spellings.update(self._spellings[bit])
+                mask ^= bit
+        return sorted(spellings)
+
+
+def load_geography(path: Path = GEOGRAPHY_PATH) -> GeographyIndex:
+    with path.open("r", encoding="utf-8") as handle:
+        return GeographyIndex(json.load(handle))
+
+
+_index_cache: dict[Path, GeographyIndex] = {}
+_index_lock = Lock()
+
+
+def get_geography_index(path: Path = GEOGRAPHY_PATH) -> GeographyIndex:
+    """Return the compiled index for ``path``, built once per process."""
+    cached = _index_cache.get(path)
+    if cached is not None:
+        return cached
+    with _index_lock:
+        if path not in _index_cache:
+            _index_cache[path] = load_geography(path)
+        return _index_cache[path]
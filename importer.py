@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Sequence
+
+from pydantic import ValidationError
+
+from config import TOP_MATCH_COUNT
+from db import ensure_db
+from matching import match_foundations
+from models import (
+    APPLICANT_TYPE_VALUES,
+    NEED_CATEGORY_VALUES,
+    URGENCY_VALUES,
+    ApplicantProfile,
+    Foundation,
+    MatchResult,
+)
+from repository import save_applications_batch
+from seed import load_foundations
+
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_STORED_ERRORS = 1000
+
+TRUE_VALUES = {"1", "true", "ja", "yes", "y", "x"}
+FALSE_VALUES = {"", "0", "false", "nej", "no", "n"}
+BOOLEAN_FIELDS = (
+    "has_quote",
+    "has_invoice",
+    "has_medical_certificate",
+    "has_research_summary",
+    "consent",
+)
+
+
+@dataclass(slots=True)
+class ImportRowError:
+    line: int
+    message: str
+
+
+@dataclass(slots=True)
+class ImportReport:
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_failed: int = 0
+    elapsed_seconds: float = 0.0
+    errors: List[ImportRowError] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.rows_read / self.elapsed_seconds
+
+
+def _detect_format(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix in {".jsonl", ".ndjson"}:
+        return "jsonl"
+    if suffix == ".csv":
+        return "csv"
+    raise ValueError(f"Okänt filformat för {path.name}. Använd .csv eller .jsonl.")
+
+
+def iter_rows(path: Path, file_format: str | None = None) -> Iterator[tuple[int, dict[str, Any] | None, str]]:
+    """Yield ``(line, row, error)`` one record at a time without reading the whole file."""
+    file_format = file_format or _detect_format(path)
+    with path.open("r", encoding="utf-8-sig", newline="") as file:
+        if file_format == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row, ""
+        else:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield line_number, None, f"Ogiltig JSON: {exc.msg}."
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, None, "Raden är inte ett JSON-objekt."
+                    continue
+                yield line_number, row, ""
+
+
+def _coerce_bool(value: Any) -> Any:
+    if isinstance(value, str):
+        normalized = value.strip().lower()
+        if normalized in TRUE_VALUES:
+            return True
+        if normalized in FALSE_VALUES:
+            return False
+    return value
+
+
+def parse_profile(row: dict[str, Any]) -> ApplicantProfile:
+    data = {key.strip(): value.strip() if isinstance(value, str) else value for key, value in row.items() if key}
+    for name in BOOLEAN_FIELDS:
+        if name in data:
+            data[name] = _coerce_bool(data[name])
+
+    profile = ApplicantProfile.model_validate(data)
+    if profile.applicant_type not in APPLICANT_TYPE_VALUES:
+        raise ValueError(f"Okänd sökandetyp: {profile.applicant_type}.")
+    if profile.need_category not in NEED_CATEGORY_VALUES:
+        raise ValueError(f"Okänd behovskategori: {profile.need_category}.")
+    if profile.urgency not in URGENCY_VALUES:
+        raise ValueError(f"Okänd angelägenhetsgrad: {profile.urgency}.")
+    if not profile.consent:
+        raise ValueError("Samtycke saknas.")
+    return profile
+
+
+def _format_validation_error(exc: ValidationError) -> str:
+    parts = []
+    for error in exc.errors():
+        location = ".".join(str(item) for item in error.get("loc", ())) or "rad"
+        parts.append(f"{location}: {error.get('msg', 'ogiltigt värde')}")
+    return "; ".join(parts)
+
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_applications(
+    path: Path,
+    foundations: Sequence[Foundation] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    file_format: str | None = None,
+    top_n: int = TOP_MATCH_COUNT,
+    max_stored_errors: int = DEFAULT_MAX_STORED_ERRORS,
+) -> ImportReport:
+    """Stream an intake file into the database chunk by chunk.
+
+    Only one chunk of profiles and matches is held in memory at a time, and at most
+    ``max_stored_errors`` row errors are kept (the rest are only counted).
+    """
+    catalog = list(foundations) if foundations is not None else load_foundations()
+    report = ImportReport()
+    started = time.perf_counter()
+
+    for chunk in _chunks(iter_rows(path, file_format), chunk_size):
+        batch: List[tuple[ApplicantProfile, List[MatchResult]]] = []
+        for line, row, error in chunk:
+            report.rows_read += 1
+            if row is not None:
+                try:
+                    profile = parse_profile(row)
+                except ValidationError as exc:
+                    error = _format_validation_error(exc)
+                except ValueError as exc:
+                    error = str(exc)
+                else:
+                    batch.append((profile, match_foundations(profile, catalog, top_n=top_n)))
+                    continue
+
+            report.rows_failed += 1
+            if len(report.errors) < max_stored_errors:
+                report.errors.append(ImportRowError(line=line, message=error))
+
+        save_applications_batch(batch)
+        report.rows_imported += len(batch)
+
+    report.elapsed_seconds = time.perf_counter() - started
+    return report
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Importera ansökningar från CSV eller JSONL.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    report = import_applications(args.path, chunk_size=args.chunk_size, file_format=args.format)
+
+    print(f"Lästa rader: {report.rows_read}")
+    print(f"Importerade: {report.rows_imported}")
+    print(f"Felaktiga: {report.rows_failed}")
+    print(f"Tid: {report.elapsed_seconds:.2f} s ({report.rows_per_second:.0f} rader/s)")
+    for error in report.errors[:20]:
+        print(f"  rad {error.line}: {error.message}")
+    if report.rows_failed > 20:
+        print(f"  ... och {report.rows_failed - 20} fel till")
+    return 0 if report.rows_imported or not report.rows_read else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
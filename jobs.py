@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence
+
+from config import (
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_SECONDS,
+    JOB_RETRY_BACKOFF_SECONDS,
+    OPENAI_MODEL,
+    OPENAI_WEB_MODEL,
+    TOP_MATCH_COUNT,
+)
+from db import get_connection, utc_now
+from matching import match_foundations
+from models import ApplicantProfile, Foundation
+from openai_service import (
+    create_application_draft_ai,
+    extract_applicant_insights,
+    insights_prompt_hash,
+    research_foundations_on_web,
+    research_prompt_hash,
+)
+from repository import (
+    find_insights,
+    find_research,
+    load_application,
+    load_insights,
+    load_match_results,
+    replace_matches,
+    save_draft,
+    save_insights,
+    save_research,
+)
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job was cancelled while it ran."""
+
+
+class JobDeferred(Exception):
+    """Raised inside a handler whose job should wait; it is requeued without using an attempt."""
+
+    def __init__(self, seconds: float) -> None:
+        super().__init__(seconds)
+        self.seconds = seconds
+
+
+@dataclass(slots=True)
+class Job:
+    id: int
+    kind: str
+    application_id: int | None
+    payload: Dict[str, Any] = field(default_factory=dict)
+    status: str = "queued"
+    attempts: int = 0
+    max_attempts: int = JOB_MAX_ATTEMPTS
+    error: str = ""
+    lease_owner: str | None = None
+
+
+def _job_from_row(row: Any) -> Job:
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        application_id=row["application_id"],
+        payload=json.loads(row["payload"]),
+        status=row["status"],
+        attempts=row["attempts"],
+        max_attempts=row["max_attempts"],
+        error=row["error"],
+        lease_owner=row["lease_owner"],
+    )
+
+
+def enqueue_job(
+    kind: str,
+    application_id: int | None,
+    payload: Dict[str, Any] | None = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> int:
+    now = utc_now()
+    with get_connection() as connection:
+        cursor = connection.execute(
+            """
+            INSERT INTO jobs (kind, application_id, payload, status, max_attempts, run_after, created_at, updated_at)
+            VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)
+            """,
+            (kind, application_id, json.dumps(payload or {}, ensure_ascii=False), max_attempts, now, now, now),
+        )
+        return int(cursor.lastrowid)
+
+
+def claim_job(worker_id: str, kinds: Sequence[str], lease_seconds: float = JOB_LEASE_SECONDS) -> Job | None:
+    """Lease the oldest runnable job, including running jobs whose lease has expired."""
+    placeholders = ", ".join("?" for _ in kinds)
+    with get_connection() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        now = utc_now()
+        while True:
+            row = connection.execute(
+                f"""
+                SELECT *
+                FROM jobs
+                WHERE kind IN ({placeholders})
+                  AND ((status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_expires_at < ?))
+                ORDER BY id
+                LIMIT 1
+                """,
+                (*kinds, now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["attempts"] >= row["max_attempts"]:
+                connection.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_owner = NULL, updated_at = ? WHERE id = ?",
+                    (row["error"] or "Leasingtiden gick ut för många gånger.", now, row["id"]),
+                )
+                continue
+            connection.execute(
+                """
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (worker_id, utc_now(lease_seconds), now, row["id"]),
+            )
+            job = _job_from_row(row)
+            job.status, job.attempts, job.lease_owner = "running", job.attempts + 1, worker_id
+            return job
+
+
+def renew_lease(job: Job, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+    """Extend a running job's lease; returns False if the lease was lost or the job cancelled."""
+    with get_connection() as connection:
+        cursor = connection.execute(
+            """
+            UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+            WHERE id = ? AND status = 'running' AND lease_owner = ?
+            """,
+            (utc_now(lease_seconds), utc_now(), job.id, job.lease_owner),
+        )
+        return cursor.rowcount == 1
+
+
+def complete_job(job: Job) -> bool:
+    """Mark a leased job as done; returns False if the lease was lost or the job cancelled."""
+    with get_connection() as connection:
+        cursor = connection.execute(
+            """
+            UPDATE jobs SET status = 'done', lease_owner = NULL, error = '', updated_at = ?
+            WHERE id = ? AND status = 'running' AND lease_owner = ?
+            """,
+            (utc_now(), job.id, job.lease_owner),
+        )
+        return cursor.rowcount == 1
+
+
+def fail_job(job: Job, error: str, backoff_seconds: float = JOB_RETRY_BACKOFF_SECONDS) -> str:
+    """Requeue a failed attempt with linear backoff, or give up after ``max_attempts``."""
+    status = "queued" if job.attempts < job.max_attempts else "failed"
+    with get_connection() as connection:
+        connection.execute(
+            """
+            UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_owner = NULL, updated_at = ?
+            WHERE id = ? AND status = 'running' AND lease_owner = ?
+            """,
+            (status, error, utc_now(backoff_seconds * job.attempts), utc_now(), job.id, job.lease_owner),
+        )
+    return status
+
+
+def defer_job(job: Job, seconds: float) -> bool:
+    """Put a leased job back in the queue for ``seconds`` without counting the attempt."""
+    with get_connection() as connection:
+        cursor = connection.execute(
+            """
+            UPDATE jobs SET status = 'queued', attempts = attempts - 1, run_after = ?, lease_owner = NULL, updated_at = ?
+            WHERE id = ? AND status = 'running' AND lease_owner = ?
+            """,
+            (utc_now(seconds), utc_now(), job.id, job.lease_owner),
+        )
+        return cursor.rowcount == 1
+
+
+def cancel_job(job_id: int) -> bool:
+    with get_connection() as connection:
+        cursor = connection.execute(
+            "UPDATE jobs SET status = 'cancelled', lease_owner = NULL, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (utc_now(), job_id, *ACTIVE_STATUSES),
+        )
+        return cursor.rowcount == 1
+
+
+def get_jobs(job_ids: Iterable[int]) -> List[Job]:
+    job_ids = list(job_ids)
+    if not job_ids:
+        return []
+    with get_connection() as connection:
+        rows = connection.execute(
+            f"SELECT * FROM jobs WHERE id IN ({', '.join('?' for _ in job_ids)}) ORDER BY id",
+            job_ids,
+        ).fetchall()
+    return [_job_from_row(row) for row in rows]
+
+
+def list_jobs_for_application(application_id: int) -> List[Job]:
+    with get_connection() as connection:
+        rows = connection.execute("SELECT * FROM jobs WHERE application_id = ? ORDER BY id", (application_id,)).fetchall()
+    return [_job_from_row(row) for row in rows]
+
+
+def _ensure_not_cancelled(job: Job) -> None:
+    current = get_jobs([job.id])
+    if not current or current[0].status != "running" or current[0].lease_owner != job.lease_owner:
+        raise JobCancelled()
+
+
+def build_enrichment_handlers(foundations: Callable[[], Iterable[Foundation]]) -> Dict[str, Callable[[Job], None]]:
+    """Handlers for the slow AI work that used to block the form submit.
+
+    Each step is its own job so a failure only retries that step: "insights"
+    saves the interpretation and re-ranks the matches, then queues "draft" when
+    the payload asks for one. "research" is queued at submit time and waits
+    while the application's insights job is still active, so it can use them.
+    Cancellation is checked before every write.
+    """
+
+    def load_profile(job: Job) -> ApplicantProfile:
+        profile = load_application(job.application_id)
+        if profile is None:
+            raise RuntimeError(f"Ansökan {job.application_id} finns inte.")
+        return profile
+
+    def run_insights(job: Job) -> None:
+        profile = load_profile(job)
+        prompt_hash = insights_prompt_hash(profile)
+        insights = find_insights(prompt_hash) or extract_applicant_insights(profile)
+        _ensure_not_cancelled(job)
+        save_insights(job.application_id, insights, OPENAI_MODEL, prompt_hash)
+
+        matches = match_foundations(
+            profile,
+            foundations(),
+            top_n=TOP_MATCH_COUNT,
+            extra_keywords=insights.extra_keywords,
+        )
+        _ensure_not_cancelled(job)
+        replace_matches(job.application_id, matches)
+        if job.payload.get("draft"):
+            _ensure_not_cancelled(job)
+            enqueue_job("draft", job.application_id)
+
+    def run_draft(job: Job) -> None:
+        profile = load_profile(job)
+        insights = load_insights(job.application_id)
+        # The stored ranking, so the draft addresses the foundations the applicant sees
+        # even if the catalog or the scoring rules changed since it was written.
+        catalog = foundations()
+        if hasattr(catalog, "find"):
+            find_foundation = catalog.find
+        else:
+            find_foundation = {foundation.id: foundation for foundation in catalog}.get
+        matches = load_match_results(job.application_id, find_foundation)
+        draft = create_application_draft_ai(profile, matches, insights)
+        _ensure_not_cancelled(job)
+        save_draft(job.application_id, draft, "ai")
+
+    def run_research(job: Job) -> None:
+        if any(
+            other.kind == "insights" and other.status in ACTIVE_STATUSES
+            for other in list_jobs_for_application(job.application_id)
+        ):
+            raise JobDeferred(JOB_POLL_SECONDS)
+        profile = load_profile(job)
+        insights = load_insights(job.application_id)
+        prompt_hash = research_prompt_hash(profile, insights)
+        markdown = find_research(prompt_hash) or research_foundations_on_web(profile, insights)
+        _ensure_not_cancelled(job)
+        save_research(job.application_id, markdown, OPENAI_WEB_MODEL, prompt_hash)
+
+    return {"insights": run_insights, "draft": run_draft, "research": run_research}
+
+
+class JobWorkerPool:
+    """Background threads that lease jobs from the ``jobs`` table and run their handlers."""
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[Job], None]],
+        workers: int = 2,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+    ) -> None:
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "JobWorkerPool":
+        for index in range(self.workers):
+            worker_id = f"{uuid.uuid4().hex[:8]}-{index}"
+            thread = threading.Thread(target=self._run, args=(worker_id,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_once(self, worker_id: str = "inline") -> bool:
+        """Claim and run a single job; returns False when nothing was runnable."""
+        job = claim_job(worker_id, list(self.handlers), self.lease_seconds)
+        if job is None:
+            return False
+        try:
+            with self._heartbeat(job):
+                self.handlers[job.kind](job)
+        except JobCancelled:
+            logger.info("Jobb %s avbröts.", job.id)
+        except JobDeferred as deferred:
+            defer_job(job, deferred.seconds)
+        except Exception as exc:
+            logger.warning("Jobb %s (%s) misslyckades: %s", job.id, job.kind, exc)
+            fail_job(job, str(exc))
+        else:
+            complete_job(job)
+        return True
+
+    @contextmanager
+    def _heartbeat(self, job: Job) -> Iterator[None]:
+        """Renew the job's lease every third of the lease while its handler runs.
+
+        A slow OpenAI call then never outlives the lease and gets claimed (and
+        paid for) a second time by another worker.
+        """
+        done = threading.Event()
+
+        def beat() -> None:
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    if not renew_lease(job, self.lease_seconds):
+                        return  # cancelled or lost; the handler notices before its next write
+                except Exception:  # pragma: no cover - try again on the next beat
+                    logger.exception("Kunde inte förlänga leasingtiden för jobb %s.", job.id)
+
+        thread = threading.Thread(target=beat, name=f"job-lease-{job.id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                worked = self.run_once(worker_id)
+            except Exception:  # pragma: no cover - keep the worker alive on database hiccups
+                logger.exception("Jobbworkern kunde inte hämta jobb.")
+                worked = False
+            if not worked:
+                self._stop.wait(self.poll_seconds)
@@ -0,0 +1,418 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+import db
+from config import BASE_DIR, DATA_DIR, OPENAI_MAX_QUEUE_SECONDS, OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE
+from jobs import ACTIVE_STATUSES, Job, JobDeferred, JobWorkerPool, build_enrichment_handlers
+from models import APPLICANT_TYPE_VALUES, NEED_CATEGORY_VALUES, URGENCY_VALUES, ApplicantProfile, Foundation
+from openai_service import get_call_metrics, set_client_factory, set_rate_limits
+from openai_stub import StubOpenAI, lognormal_latency
+from seed import load_foundations
+from submission import SUBMIT_STAGES, submit_profile
+
+
+STAGE_ORDER = (
+    "admission",
+    *SUBMIT_STAGES,
+    "submit_total",
+    "insights_queue",
+    "insights_run",
+    "draft_queue",
+    "draft_run",
+    "research_queue",
+    "research_run",
+    "enrichment_total",
+)
+LOADTEST_DIR = DATA_DIR / "loadtests"
+MUNICIPALITIES = ["Stockholm", "Göteborg", "Malmö", "Uppsala", "Umeå", "Lund", "Örebro", "Kiruna"]
+DESCRIPTIONS = [
+    "Jag är pensionär med låg inkomst och behöver tandvård efter en kostnadsberäkning.",
+    "Jag behöver nya glasögon men har inte råd efter hyran och elräkningen.",
+    "Vi har hyresskulder efter en lång sjukskrivning och riskerar att förlora bostaden.",
+    "Jag studerar på distans och behöver stöd till kurslitteratur och en dator.",
+    "Vårt forskningsprojekt om demens behöver medel för datainsamling och metodutveckling.",
+]
+
+
+@dataclass(slots=True)
+class LoadTestConfig:
+    applicants: int = 100
+    rate: float = 5.0
+    concurrency: int = 8
+    job_workers: int = 2
+    latency_scale: float = 0.1
+    latency_sigma: float = 0.5
+    failure_rate: float = 0.0
+    ai_share: float = 1.0
+    web_research_share: float = 0.3
+    requests_per_minute: float = OPENAI_REQUESTS_PER_MINUTE
+    tokens_per_minute: float = OPENAI_TOKENS_PER_MINUTE
+    max_queue_seconds: float = OPENAI_MAX_QUEUE_SECONDS
+    drain_timeout: float = 120.0
+    seed: int = 7
+    label: str = ""
+
+
+def synthetic_profile(rng: random.Random, index: int) -> ApplicantProfile:
+    return ApplicantProfile(
+        full_name=f"Sökande {index}",
+        email=f"sokande{index}@example.se",
+        municipality=rng.choice(MUNICIPALITIES),
+        age=rng.randint(18, 95),
+        applicant_type=rng.choice(APPLICANT_TYPE_VALUES),
+        need_category=rng.choice(NEED_CATEGORY_VALUES),
+        requested_amount_sek=rng.randrange(1000, 60000, 500),
+        monthly_income_sek=rng.randrange(8000, 45000, 500),
+        urgency=rng.choice(URGENCY_VALUES),
+        description=rng.choice(DESCRIPTIONS),
+        has_quote=rng.random() < 0.6,
+        has_invoice=rng.random() < 0.3,
+        has_medical_certificate=rng.random() < 0.3,
+        has_research_summary=rng.random() < 0.1,
+    )
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/max in milliseconds."""
+    if not values:
+        return {"count": 0}
+    if len(values) == 1:
+        p50 = p95 = p99 = values[0]
+    else:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    return {
+        "count": len(values),
+        "p50_ms": round(p50 * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "p99_ms": round(p99 * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+def is_lock_error(exc: BaseException) -> bool:
+    return isinstance(exc, sqlite3.OperationalError) and "locked" in str(exc)
+
+
+class Recorder:
+    """Thread-safe latency samples per stage, plus error counters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter[str] = Counter()
+        self.lock_errors = 0
+        self.pending: Dict[tuple[int, str], float] = {}
+        self.started: Dict[int, float] = {}
+        self.finished: Dict[int, float] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def error(self, stage: str, exc: BaseException) -> None:
+        with self._lock:
+            self.errors[f"{stage}: {type(exc).__name__}"] += 1
+            self.lock_errors += is_lock_error(exc)
+
+    def queued(self, application_id: int, kind: str, at: float) -> None:
+        with self._lock:
+            self.pending[(application_id, kind)] = at
+
+    def claimed(self, application_id: int, kind: str) -> float | None:
+        with self._lock:
+            return self.pending.pop((application_id, kind), None)
+
+    def done(self, application_id: int, at: float) -> None:
+        # Enrichment ends when the application's last job does.
+        with self._lock:
+            self.finished[application_id] = max(at, self.finished.get(application_id, at))
+
+
+def _timed_handlers(handlers: Dict[str, Callable[[Job], None]], recorder: Recorder) -> Dict[str, Callable[[Job], None]]:
+    def wrap(kind: str, handler: Callable[[Job], None]) -> Callable[[Job], None]:
+        def run(job: Job) -> None:
+            started = time.perf_counter()
+            queued_at = recorder.claimed(job.application_id, kind)
+            try:
+                handler(job)
+            except JobDeferred:
+                if queued_at is not None:
+                    recorder.queued(job.application_id, kind, queued_at)
+                raise
+            except Exception as exc:
+                recorder.error(kind, exc)
+                raise
+            finished = time.perf_counter()
+            if queued_at is not None:
+                recorder.record(f"{kind}_queue", started - queued_at)
+            recorder.record(f"{kind}_run", finished - started)
+            if kind == "insights" and job.payload.get("draft"):
+                recorder.queued(job.application_id, "draft", finished)
+            recorder.done(job.application_id, finished)
+
+        return run
+
+    return {kind: wrap(kind, handler) for kind, handler in handlers.items()}
+
+
+class WriteLockProbe:
+    """Measures SQLite write-lock contention directly.
+
+    A separate connection repeatedly takes the write lock with BEGIN IMMEDIATE
+    and records how long it had to wait, the same wait every writer in the app
+    sees while another transaction holds the lock.
+    """
+
+    def __init__(self, recorder: Recorder, interval: float = 0.02) -> None:
+        self.recorder = recorder
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sqlite-lock-probe", daemon=True)
+
+    def start(self) -> "WriteLockProbe":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        connection = sqlite3.connect(db.DB_PATH, timeout=30, isolation_level=None)
+        try:
+            while not self._stop.wait(self.interval):
+                started = time.perf_counter()
+                try:
+                    connection.execute("BEGIN IMMEDIATE")
+                except sqlite3.OperationalError as exc:
+                    self.recorder.error("lock_probe", exc)
+                    continue
+                self.recorder.record("write_lock_wait", time.perf_counter() - started)
+                connection.execute("ROLLBACK")
+        finally:
+            connection.close()
+
+
+def _active_jobs() -> int:
+    with db.get_connection() as connection:
+        return connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+        ).fetchone()[0]
+
+
+def _job_outcomes() -> Dict[str, int]:
+    with db.get_connection() as connection:
+        rows = connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        locked = connection.execute("SELECT COUNT(*) FROM jobs WHERE error LIKE '%locked%'").fetchone()[0]
+    return {**{status: count for status, count in rows}, "lock_errors": locked}
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_load_test(config: LoadTestConfig, foundations: Iterable[Foundation] | None = None) -> Dict[str, Any]:
+    """Drive ``submit_profile`` with open-loop arrivals against the job queue and the stub.
+
+    Arrivals follow a Poisson process at ``config.rate`` per second and are served by
+    ``config.concurrency`` threads; ``admission`` is how long an arrival waited for a
+    free thread. The database at ``db.DB_PATH`` must already exist.
+    """
+    rng = random.Random(config.seed)
+    foundations = list(foundations if foundations is not None else load_foundations())
+    recorder = Recorder()
+    set_rate_limits(config.requests_per_minute, config.tokens_per_minute, config.max_queue_seconds)
+    latency = lognormal_latency(sigma=config.latency_sigma, scale=config.latency_scale, seed=config.seed)
+    set_client_factory(lambda: StubOpenAI(latency=latency, failure_rate=config.failure_rate))
+    pool = JobWorkerPool(
+        _timed_handlers(build_enrichment_handlers(lambda: foundations), recorder),
+        workers=config.job_workers,
+        poll_seconds=0.05,
+    )
+
+    def submit(profile: ApplicantProfile, use_ai: bool, use_web_research: bool, arrived: float) -> None:
+        started = time.perf_counter()
+        recorder.record("admission", started - arrived)
+        try:
+            submission = submit_profile(profile, foundations, use_ai, use_web_research)
+        except Exception as exc:
+            recorder.error("submit", exc)
+            return
+        finished = time.perf_counter()
+        for stage, seconds in submission.timings.items():
+            recorder.record(stage, seconds)
+        recorder.record("submit_total", finished - started)
+        recorder.started[submission.application_id] = arrived
+        if use_ai:
+            recorder.queued(submission.application_id, "insights", finished)
+            if use_web_research:
+                recorder.queued(submission.application_id, "research", finished)
+
+    started_at = datetime.utcnow()
+    probe = WriteLockProbe(recorder).start()
+    pool.start()
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=config.concurrency, thread_name_prefix="applicant") as executor:
+            next_arrival = started
+            for index in range(config.applicants):
+                next_arrival += rng.expovariate(config.rate)
+                time.sleep(max(0.0, next_arrival - time.perf_counter()))
+                executor.submit(
+                    submit,
+                    synthetic_profile(rng, index),
+                    rng.random() < config.ai_share,
+                    rng.random() < config.web_research_share,
+                    time.perf_counter(),
+                )
+        submitted = time.perf_counter()
+        deadline = submitted + config.drain_timeout
+        while _active_jobs() and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        drained = time.perf_counter()
+    finally:
+        pool.stop()
+        probe.stop()
+        openai_calls = get_call_metrics()
+        set_client_factory(None)
+        set_rate_limits()
+
+    for application_id, finished in recorder.finished.items():
+        if application_id in recorder.started:
+            recorder.record("enrichment_total", finished - recorder.started[application_id])
+    completed = len(recorder.samples["submit_total"])
+    return {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "config": asdict(config),
+        "throughput": {
+            "submissions": completed,
+            "submissions_per_second": round(completed / max(submitted - started, 1e-9), 2),
+            "enrichments": len(recorder.samples["enrichment_total"]),
+            "enrichments_per_second": round(len(recorder.samples["enrichment_total"]) / max(drained - started, 1e-9), 2),
+            "drained": not _active_jobs(),
+        },
+        "stages": {stage: percentiles(recorder.samples[stage]) for stage in STAGE_ORDER if recorder.samples.get(stage)},
+        "sqlite": {
+            "write_lock_wait": percentiles(recorder.samples["write_lock_wait"]),
+            "lock_errors": recorder.lock_errors,
+            "jobs": _job_outcomes(),
+        },
+        "errors": dict(recorder.errors),
+        "openai": openai_calls,
+    }
+
+
+def save_result(result: Dict[str, Any], directory: Path = LOADTEST_DIR) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    label = f"-{result['config']['label']}" if result["config"]["label"] else ""
+    path = directory / f"{result['started_at'].replace(':', '')}{label}.json"
+    path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def compare_results(directory: Path = LOADTEST_DIR) -> List[str]:
+    """One line per saved run, oldest first, with the figures worth tracking over time."""
+    lines = [
+        f"{'körning':<34}{'rev':<9}{'rate':>6}{'inskick/s':>11}{'submit p95':>12}"
+        f"{'klar p95':>11}{'lås p95':>9}{'låsfel':>8}"
+    ]
+    for path in sorted(directory.glob("*.json")):
+        result = json.loads(path.read_text(encoding="utf-8"))
+        stages = result["stages"]
+        lines.append(
+            f"{path.stem:<34}{result['revision']:<9}{result['config']['rate']:>6}"
+            f"{result['throughput']['submissions_per_second']:>11}"
+            f"{stages.get('submit_total', {}).get('p95_ms', '-'):>12}"
+            f"{stages.get('enrichment_total', {}).get('p95_ms', '-'):>11}"
+            f"{result['sqlite'].get('write_lock_wait', {}).get('p95_ms', '-'):>9}"
+            f"{result['sqlite']['lock_errors'] + result['sqlite']['jobs']['lock_errors']:>8}"
+        )
+    return lines
+
+
+def format_result(result: Dict[str, Any]) -> List[str]:
+    throughput = result["throughput"]
+    lines = [
+        f"inskick: {throughput['submissions']} ({throughput['submissions_per_second']}/s), "
+        f"berikade: {throughput['enrichments']} ({throughput['enrichments_per_second']}/s), "
+        f"kön tömd: {'ja' if throughput['drained'] else 'nej'}",
+        f"{'steg':<18}{'antal':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for stage, row in result["stages"].items():
+        lines.append(
+            f"{stage:<18}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}"
+        )
+    wait = result["sqlite"]["write_lock_wait"]
+    lines.append(
+        f"SQLite skrivlås, väntan: p50 {wait.get('p50_ms')} ms, p95 {wait.get('p95_ms')} ms, "
+        f"p99 {wait.get('p99_ms')} ms ({wait['count']} prov)"
+    )
+    lines.append(f"SQLite-låsfel: {result['sqlite']['lock_errors']}, jobb: {result['sqlite']['jobs']}")
+    if result["errors"]:
+        lines.append(f"Fel: {result['errors']}")
+    lines.append(f"AI-anrop: {result['openai']}")
+    return lines
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    defaults = LoadTestConfig()
+    parser = argparse.ArgumentParser(description="Lasttesta inskicksflödet med syntetiska sökande och en lokal AI-stubbe.")
+    parser.add_argument("--applicants", type=int, default=defaults.applicants)
+    parser.add_argument("--rate", type=float, default=defaults.rate, help="Ankomster per sekund (Poisson).")
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency)
+    parser.add_argument("--job-workers", type=int, default=defaults.job_workers)
+    parser.add_argument("--latency-scale", type=float, default=defaults.latency_scale, help="1.0 = realistiska AI-svarstider.")
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate)
+    parser.add_argument("--ai-share", type=float, default=defaults.ai_share)
+    parser.add_argument("--web-research-share", type=float, default=defaults.web_research_share)
+    parser.add_argument("--requests-per-minute", type=float, default=defaults.requests_per_minute)
+    parser.add_argument("--tokens-per-minute", type=float, default=defaults.tokens_per_minute)
+    parser.add_argument("--drain-timeout", type=float, default=defaults.drain_timeout)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--db", type=Path, help="Databas att köra mot (standard: en tillfällig fil).")
+    parser.add_argument("--results-dir", type=Path, default=LOADTEST_DIR)
+    parser.add_argument("--compare", action="store_true", help="Visa sparade körningar i stället för att köra.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print("\n".join(compare_results(args.results_dir)))
+        return 0
+
+    config = LoadTestConfig(
+        **{name: getattr(args, name) for name in asdict(defaults) if name not in ("max_queue_seconds",)}
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = args.db or Path(tmp) / "loadtest.db"
+        db.ensure_db()
+        result = run_load_test(config)
+    print("\n".join(format_result(result)))
+    print(f"Sparade {save_result(result, args.results_dir)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,19 @@
 from __future__ import annotations
 
-from typing import Iterable, List, Sequence
-
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from config import SCORING_RULES_CHECK_SECONDS, SCORING_RULES_PATH
+from geography import get_geography_index
 from models import ApplicantProfile, Foundation, MatchResult
+from scoring_rules import ScoringRules, load_scoring_rules
 
+logger = logging.getLogger(__name__)
 
 KEYWORDS_BY_CATEGORY = {
     "tandvård": ["tand", "tandvård", "implantat", "protes", "bett"],
@@ -23,27 +33,24 @@ APPLICANT_GROUP_ALIASES = {
 }
 
 
-URGENCY_BONUS = {
-    "Låg": 0,
-    "Medel": 2,
-    "Hög": 4,
-    "Akut": 6,
-}
-
-
 MISSING_DOC_WARNING = "Vissa dokument saknas för att ansökan ska bli stark."
 
 
-def _normalize(text: str) -> str:
+def normalize(text: str) -> str:
     return text.strip().lower()
 
 
 def _contains_any(description: str, keywords: Iterable[str]) -> bool:
-    normalized = _normalize(description)
-    return any(_normalize(keyword) in normalized for keyword in keywords if keyword)
+    normalized = normalize(description)
+    return any(normalize(keyword) in normalized for keyword in keywords if keyword)
 
 
-def _keyword_boost(foundation: Foundation, extra_keywords: Sequence[str] | None) -> tuple[int, list[str]]:
+def _keyword_boost(
+    foundation: Foundation,
+    extra_keywords: Sequence[str] | None,
+    per_keyword: int = 3,
+    max_boost: int = 10,
+) -> tuple[int, list[str]]:
     if not extra_keywords:
         return 0, []
 
@@ -58,108 +65,276 @@ def _keyword_boost(foundation: Foundation, extra_keywords: Sequence[str] | None)
 
     matched_keywords = []
     for keyword in extra_keywords:
-        normalized = _normalize(keyword)
+        normalized = normalize(keyword)
         if normalized and normalized not in matched_keywords and normalized in haystack:
             matched_keywords.append(normalized)
 
     if not matched_keywords:
         return 0, []
 
-    boost = min(10, len(matched_keywords) * 3)
+    boost = min(max_boost, len(matched_keywords) * per_keyword)
     reasons = [f"AI-tolkningen hittade relevanta nyckelord: {', '.join(matched_keywords[:4])}."]
     return boost, reasons
 
 
-def score_foundation(
-    applicant: ApplicantProfile,
-    foundation: Foundation,
-    extra_keywords: Sequence[str] | None = None,
-) -> MatchResult:
-    score = 0
-    reasons: List[str] = []
-    warnings: List[str] = []
-
-    applicant_type = _normalize(applicant.applicant_type)
-    need_category = _normalize(applicant.need_category)
-    municipality = _normalize(applicant.municipality)
-
-    aliases = APPLICANT_GROUP_ALIASES.get(applicant_type, [applicant_type])
-    if any(alias in map(_normalize, foundation.target_groups) for alias in aliases):
-        score += 25
-        reasons.append("Rätt målgrupp för stiftelsen.")
-
-    if need_category in map(_normalize, foundation.categories):
-        score += 30
-        reasons.append("Stiftelsens ändamål matchar behovet väl.")
-    else:
-        keywords = KEYWORDS_BY_CATEGORY.get(need_category, [])
-        if keywords and _contains_any(foundation.description, keywords):
-            score += 12
+@dataclass(slots=True)
+class ApplicantContext:
+    """Applicant-side values that are identical for every foundation in one matching run."""
+
+    applicant: ApplicantProfile
+    aliases: frozenset[str]
+    need_category: str
+    category_keywords: List[str]
+    geography_bits: int
+    places: frozenset[str]
+    document_flags: frozenset[str]
+    urgency_points: int
+    description_points: int
+    extra_keywords: Sequence[str] | None
+
+
+# A rule adds reasons/warnings in place and returns its score contribution.
+Rule = Callable[[ApplicantContext, Foundation, List[str], List[str]], int]
+
+
+@dataclass(slots=True)
+class ScoringPlan:
+    rules: ScoringRules
+    steps: Tuple[Tuple[str, Rule], ...]
+
+    def context(self, applicant: ApplicantProfile, extra_keywords: Sequence[str] | None = None) -> ApplicantContext:
+        applicant_type = normalize(applicant.applicant_type)
+        need_category = normalize(applicant.need_category)
+        category_keywords = KEYWORDS_BY_CATEGORY.get(need_category, [])
+        return ApplicantContext(
+            applicant=applicant,
+            aliases=frozenset(APPLICANT_GROUP_ALIASES.get(applicant_type, [applicant_type])),
+            need_category=need_category,
+            category_keywords=category_keywords,
+            geography_bits=get_geography_index().applicant_bits(applicant.municipality),
+            places=get_geography_index().applicant_places(applicant.municipality),
+            document_flags=frozenset(applicant.document_flags),
+            urgency_points=self.rules.urgency.get(applicant.urgency, 0),
+            description_points=(
+                self.rules.description_keywords if _contains_any(applicant.description, category_keywords) else 0
+            ),
+            extra_keywords=extra_keywords,
+        )
+
+    def score(self, context: ApplicantContext, foundation: Foundation, explain: bool = False) -> MatchResult:
+        score = 0
+        reasons: List[str] = []
+        warnings: List[str] = []
+        contributions: Dict[str, int] = {}
+        for name, rule in self.steps:
+            points = rule(context, foundation, reasons, warnings)
+            score += points
+            if explain:
+                contributions[name] = points
+        return MatchResult(
+            foundation=foundation,
+            score=max(score, 0),
+            reasons=reasons,
+            warnings=warnings,
+            contributions=contributions,
+        )
+
+
+def compile_scoring_plan(rules: ScoringRules) -> ScoringPlan:
+    """Turn validated rule weights into a fixed sequence of specialised closures.
+
+    The weights are bound as closure constants so evaluating a foundation is a
+    straight run of comparisons with no lookups into the rule definition.
+    """
+    target_group = rules.target_group.match
+
+    def target_group_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        if not context.aliases.isdisjoint(map(normalize, foundation.target_groups)):
+            reasons.append("Rätt målgrupp för stiftelsen.")
+            return target_group
+        return 0
+
+    category_match = rules.category.match
+    category_description = rules.category.description_keywords
+
+    def category_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        if context.need_category in map(normalize, foundation.categories):
+            reasons.append("Stiftelsens ändamål matchar behovet väl.")
+            return category_match
+        if context.category_keywords and _contains_any(foundation.description, context.category_keywords):
             reasons.append("Beskrivningen antyder att stiftelsen kan passa behovet.")
-
-    geographies = list(map(_normalize, foundation.geographies))
-    if "hela sverige" in geographies or municipality in geographies:
-        score += 15
-        reasons.append("Geografin matchar.")
-    elif "regional" in geographies:
-        score += 8
-        reasons.append("Regionalt stöd kan vara möjligt.")
-
-    if foundation.age_min <= applicant.age <= foundation.age_max:
-        score += 10
-        reasons.append("Ålderskraven ser ut att passa.")
-    else:
+            return category_description
+        return 0
+
+    geography_match = rules.geography.match
+    geography_regional = rules.geography.regional
+    coverage = get_geography_index().coverage
+
+    def geography_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        covered = coverage(foundation.geographies)
+        if covered.bits & context.geography_bits or not context.places.isdisjoint(covered.places):
+            reasons.append("Geografin matchar.")
+            return geography_match
+        if covered.regional:
+            reasons.append("Regionalt stöd kan vara möjligt.")
+            return geography_regional
+        return 0
+
+    age_within = rules.age.within
+    age_outside = rules.age.outside
+
+    def age_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        if foundation.age_min <= context.applicant.age <= foundation.age_max:
+            reasons.append("Ålderskraven ser ut att passa.")
+            return age_within
         warnings.append("Åldern ligger utanför normal målgrupp.")
-        score -= 15
-
-    if foundation.monthly_income_cap_sek is None:
-        score += 4
-    elif applicant.monthly_income_sek <= foundation.monthly_income_cap_sek:
-        score += 12
-        reasons.append("Inkomstnivån verkar ligga inom kriterierna.")
-    else:
+        return age_outside
+
+    income_no_cap = rules.income.no_cap
+    income_within = rules.income.within
+    income_over = rules.income.over
+
+    def income_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        if foundation.monthly_income_cap_sek is None:
+            return income_no_cap
+        if context.applicant.monthly_income_sek <= foundation.monthly_income_cap_sek:
+            reasons.append("Inkomstnivån verkar ligga inom kriterierna.")
+            return income_within
         warnings.append("Inkomstnivån kan ligga över stiftelsens gräns.")
-        score -= 8
-
-    if foundation.typical_amount_min_sek <= applicant.requested_amount_sek <= foundation.typical_amount_max_sek:
-        score += 10
-        reasons.append("Beloppet ligger nära stiftelsens normala nivå.")
-    elif applicant.requested_amount_sek < foundation.typical_amount_min_sek:
-        score += 4
-    else:
+        return income_over
+
+    amount_within = rules.amount.within
+    amount_below = rules.amount.below
+    amount_above = rules.amount.above
+
+    def amount_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        requested = context.applicant.requested_amount_sek
+        if foundation.typical_amount_min_sek <= requested <= foundation.typical_amount_max_sek:
+            reasons.append("Beloppet ligger nära stiftelsens normala nivå.")
+            return amount_within
+        if requested < foundation.typical_amount_min_sek:
+            return amount_below
         warnings.append("Beloppet är högre än stiftelsens normala spann.")
-        score -= 6
+        return amount_above
+
+    documents_complete = rules.documents.complete
+    documents_missing_each = rules.documents.missing_each
 
-    if foundation.required_documents:
-        missing_docs = [doc for doc in foundation.required_documents if doc not in applicant.document_flags]
+    def documents_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        if not foundation.required_documents:
+            return 0
+        missing_docs = [doc for doc in foundation.required_documents if doc not in context.document_flags]
         if missing_docs:
             warnings.append(f"Saknade dokument: {', '.join(missing_docs)}.")
             warnings.append(MISSING_DOC_WARNING)
-            score -= 5 * len(missing_docs)
-        else:
-            score += 8
-            reasons.append("Nödvändiga underlag verkar finnas.")
-
-    score += URGENCY_BONUS.get(applicant.urgency, 0)
-
-    if _contains_any(applicant.description, KEYWORDS_BY_CATEGORY.get(need_category, [])):
-        score += 4
-
-    keyword_score, keyword_reasons = _keyword_boost(foundation, extra_keywords)
-    score += keyword_score
-    reasons.extend(keyword_reasons)
+            return documents_missing_each * len(missing_docs)
+        reasons.append("Nödvändiga underlag verkar finnas.")
+        return documents_complete
+
+    def urgency_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        return context.urgency_points
+
+    def description_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        return context.description_points
+
+    ai_per_keyword = rules.ai_keywords.per_keyword
+    ai_max = rules.ai_keywords.max
+
+    def ai_keyword_rule(context: ApplicantContext, foundation: Foundation, reasons: List[str], warnings: List[str]) -> int:
+        points, keyword_reasons = _keyword_boost(foundation, context.extra_keywords, ai_per_keyword, ai_max)
+        reasons.extend(keyword_reasons)
+        return points
+
+    return ScoringPlan(
+        rules=rules,
+        steps=(
+            ("målgrupp", target_group_rule),
+            ("ändamål", category_rule),
+            ("geografi", geography_rule),
+            ("ålder", age_rule),
+            ("inkomst", income_rule),
+            ("belopp", amount_rule),
+            ("underlag", documents_rule),
+            ("brådska", urgency_rule),
+            ("beskrivning", description_rule),
+            ("ai_nyckelord", ai_keyword_rule),
+        ),
+    )
+
+
+@dataclass(slots=True)
+class _CachedPlan:
+    plan: ScoringPlan
+    mtime_ns: int
+    checked_at: float
+
+
+_plan_cache: dict[Path, _CachedPlan] = {}
+_plan_lock = Lock()
+
+
+def get_scoring_plan(path: Path = SCORING_RULES_PATH) -> ScoringPlan:
+    """Return the compiled plan for ``path``, recompiling when the file changes on disk.
+
+    The file is looked at no more than once every ``SCORING_RULES_CHECK_SECONDS``.
+    A changed file that cannot be read or compiled (half written, invalid) is
+    logged and the last good plan keeps serving; only the very first load raises.
+    """
+    cached = _plan_cache.get(path)
+    if cached is not None and time.monotonic() - cached.checked_at < SCORING_RULES_CHECK_SECONDS:
+        return cached.plan
+    with _plan_lock:
+        cached = _plan_cache.get(path)
+        now = time.monotonic()
+        if cached is not None and now - cached.checked_at < SCORING_RULES_CHECK_SECONDS:
+            return cached.plan
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+            if cached is None or cached.mtime_ns != mtime_ns:
+                cached = _CachedPlan(compile_scoring_plan(load_scoring_rules(path)), mtime_ns, now)
+                _plan_cache[path] = cached
+        except (OSError, ValueError) as exc:
+            if cached is None:
+                raise
+            logger.warning("Poängreglerna i %s kunde inte läsas (%s); de senast fungerande används.", path, exc)
+        cached.checked_at = now
+        return cached.plan
 
-    score = max(score, 0)
-    return MatchResult(foundation=foundation, score=score, reasons=reasons, warnings=warnings)
 
+def score_foundation(
+    applicant: ApplicantProfile,
+    foundation: Foundation,
+    extra_keywords: Sequence[str] | None = None,
+    plan: ScoringPlan | None = None,
+    explain: bool = False,
+) -> MatchResult:
+    plan = plan or get_scoring_plan()
+    return plan.score(plan.context(applicant, extra_keywords), foundation, explain=explain)
 
 
 def match_foundations(
     applicant: ApplicantProfile,
-    foundations: List[Foundation],
+    foundations: Iterable[Foundation],
     top_n: int = 5,
     extra_keywords: Sequence[str] | None = None,
+    plan: ScoringPlan | None = None,
+    explain: bool = False,
+    prefilter: bool = True,
 ) -> List[MatchResult]:
-    matches = [score_foundation(applicant, foundation, extra_keywords=extra_keywords) for foundation in foundations]
-    matches.sort(key=lambda item: item.score, reverse=True)
-    return matches[:top_n]
+    """Score ``foundations`` and return the ``top_n`` best.
+
+    Catalogs with a ``prefilter(applicant)`` method (``catalog_db.SqliteCatalog``)
+    only hand over the foundations the applicant can be eligible for, unless
+    ``prefilter`` is False.
+    """
+    plan = plan or get_scoring_plan()
+    context = plan.context(applicant, extra_keywords)
+    if prefilter and hasattr(foundations, "prefilter"):
+        foundations = foundations.prefilter(applicant)
+    # nlargest keeps only top_n results alive, so lazily materialised catalogs
+    # are scored in constant memory; ties keep catalog order like a stable sort.
+    return heapq.nlargest(
+        top_n,
+        (plan.score(context, foundation, explain=explain) for foundation in foundations),
+        key=lambda item: item.score,
+    )
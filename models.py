@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import List, Literal
+from typing import Dict, List, Literal
 
 from pydantic import BaseModel, EmailStr, Field, computed_field
 
@@ -79,3 +79,4 @@ class MatchResult:
     score: int
     reasons: List[str] = field(default_factory=list)
     warnings: List[str] = field(default_factory=list)
+    contributions: Dict[str, int] = field(default_factory=dict)
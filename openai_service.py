@@ -1,11 +1,27 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from textwrap import dedent
-from typing import Any, Sequence
+from typing import Any, Callable, Iterator, Sequence, TypeVar
 
-from config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_REASONING_EFFORT, OPENAI_WEB_MODEL
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_DRAFT_CONCURRENCY,
+    OPENAI_MAX_QUEUE_SECONDS,
+    OPENAI_MODEL,
+    OPENAI_REASONING_EFFORT,
+    OPENAI_REQUESTS_PER_MINUTE,
+    OPENAI_TOKENS_PER_MINUTE,
+    OPENAI_WEB_MODEL,
+)
 from models import ApplicantInsights, ApplicantProfile, MatchResult
+from throttling import GuardedCaller, RateLimiter
+from usage import record_usage
+
+T = TypeVar("T")
 
 try:
     from openai import OpenAI
@@ -13,11 +29,78 @@ except ImportError:  # pragma: no cover - handled gracefully in runtime
     OpenAI = None  # type: ignore[assignment]
 
 
+# Rough output budgets used when reserving tokens before a call.
+EXPECTED_OUTPUT_TOKENS = {
+    "insights": 1500,
+    "draft": 2000,
+    "research": 4000,
+}
+
+_guard = GuardedCaller(
+    RateLimiter(OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE),
+    max_wait=OPENAI_MAX_QUEUE_SECONDS,
+)
+
+
+def set_rate_limits(
+    requests_per_minute: float = OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute: float = OPENAI_TOKENS_PER_MINUTE,
+    max_wait: float = OPENAI_MAX_QUEUE_SECONDS,
+) -> None:
+    """Replace the client-side limits (and reset the counters), e.g. for load tests."""
+    global _guard
+    _guard = GuardedCaller(RateLimiter(requests_per_minute, tokens_per_minute), max_wait=max_wait)
+
+
+def get_call_metrics() -> dict[str, float]:
+    """Counters for calls made, coalesced, throttled (queued) and rejected in this process."""
+    return _guard.metrics()
+
+
+def _serialize_request(request: Any) -> str:
+    return json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def prompt_hash(model: str, request: Any) -> str:
+    """Stable hash of the exact model and prompt, used to find stored AI results."""
+    return hashlib.sha256(f"{model}|{_serialize_request(request)}".encode("utf-8")).hexdigest()
+
+
+def _guarded(operation: str, model: str, request: Any, function: Callable[[], T]) -> T:
+    request_hash = prompt_hash(model, request)
+    estimated_tokens = len(_serialize_request(request)) // 3 + EXPECTED_OUTPUT_TOKENS[operation]
+    queued = time.perf_counter()
+
+    def recorded() -> T:
+        # Runs once per real request; coalesced callers share it and are not recorded twice.
+        started = time.perf_counter()
+        try:
+            response = function()
+        except Exception as exc:
+            record_usage(operation, model, request_hash, None, started - queued, time.perf_counter() - started, str(exc))
+            raise
+        record_usage(operation, model, request_hash, response, started - queued, time.perf_counter() - started)
+        return response
+
+    return _guard.call(f"{operation}|{request_hash}", estimated_tokens, recorded)
+
+
+_client_factory: Callable[[], Any] | None = None
+
+
+def set_client_factory(factory: Callable[[], Any] | None) -> None:
+    """Route all calls to another client, e.g. ``openai_stub.StubOpenAI`` for local runs and tests."""
+    global _client_factory
+    _client_factory = factory
+
+
 def is_openai_available() -> bool:
-    return bool(OPENAI_API_KEY and OpenAI is not None)
+    return _client_factory is not None or bool(OPENAI_API_KEY and OpenAI is not None)
 
 
 def _get_client() -> Any:
+    if _client_factory is not None:
+        return _client_factory()
     if not OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY saknas. Lägg den i miljön eller i en lokal .env-fil.")
     if OpenAI is None:
@@ -25,10 +108,66 @@ def _get_client() -> Any:
     return OpenAI(api_key=OPENAI_API_KEY)
 
 
+# Prompts are a fixed system message followed by the per-request JSON, so every
+# call of one kind starts with the same bytes and the provider's prompt cache can
+# reuse that prefix. Payloads leave out what the model does not need (name and
+# e-mail) and are serialized without whitespace.
+INSIGHTS_INSTRUCTIONS = dedent(
+    """
+    Du analyserar ansökningar till svenska stiftelser.
+    Returnera en kort, korrekt och saklig strukturerad analys på svenska.
+    Hitta inga påhittade fakta. Utgå enbart från det användaren uppgett.
+    Extra nyckelord ska vara korta svenska ord eller fraser som kan hjälpa matchning.
+    """
+).strip()
+
+NAME_PLACEHOLDER = "[NAMN]"
+EMAIL_PLACEHOLDER = "[E-POST]"
+
+DRAFT_INSTRUCTIONS = dedent(
+    f"""
+    Du skriver ett första utkast till en svensk stiftelseansökan.
+    Skriv endast utkastet, ingen förklaring före eller efter.
+    Använd ett varmt men professionellt språk.
+    Hitta inte på dokument, diagnoser eller ekonomiska fakta.
+    Om något är osäkert, formulera det försiktigt.
+    Skriv {NAME_PLACEHOLDER} där sökandens namn ska stå och {EMAIL_PLACEHOLDER} för e-postadressen.
+    Struktur:
+    - Rubrik
+    - Till
+    - Kort presentation
+    - Beskrivning av behovet
+    - Ekonomisk situation
+    - Varför stiftelsen passar
+    - Vilka underlag som finns
+    - Avslutning
+    """
+).strip()
+
+RESEARCH_INSTRUCTIONS = dedent(
+    """
+    Hitta 3 till 5 svenska stiftelser, fonder eller stipendieaktörer som kan vara relevanta för denna sökande.
+    Fokusera på verkliga svenska källor och ange varför varje alternativ kan passa.
+    Inkludera en kort varning om att användaren måste kontrollera kriterier och ansökningslänk manuellt.
+    Svara på svenska i markdown med rubriken 'Ytterligare tips från webben'.
+    Användaren skickar profilen som JSON, med en extra tolkning under "insights" om en sådan finns.
+    """
+).strip()
+
+
+def _compact_json(payload: Any) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def _messages(instructions: str, payload: Any) -> list[dict[str, Any]]:
+    return [
+        {"role": "system", "content": instructions},
+        {"role": "user", "content": _compact_json(payload)},
+    ]
+
+
 def _profile_payload(profile: ApplicantProfile) -> dict[str, Any]:
     return {
-        "full_name": profile.full_name,
-        "email": str(profile.email),
         "municipality": profile.municipality,
         "age": profile.age,
         "applicant_type": profile.applicant_type,
@@ -41,29 +180,32 @@ def _profile_payload(profile: ApplicantProfile) -> dict[str, Any]:
     }
 
 
+def _insights_payload(insights: ApplicantInsights | None) -> dict[str, Any]:
+    return {"insights": insights.model_dump(mode="json")} if insights else {}
+
+
+def _insights_input(profile: ApplicantProfile) -> list[dict[str, Any]]:
+    return _messages(INSIGHTS_INSTRUCTIONS, _profile_payload(profile))
+
+
+def insights_prompt_hash(profile: ApplicantProfile) -> str:
+    return prompt_hash(OPENAI_MODEL, _insights_input(profile))
+
+
 def extract_applicant_insights(profile: ApplicantProfile) -> ApplicantInsights:
     client = _get_client()
-    response = client.responses.parse(
-        model=OPENAI_MODEL,
-        reasoning={"effort": OPENAI_REASONING_EFFORT},
-        input=[
-            {
-                "role": "system",
-                "content": dedent(
-                    """
-                    Du analyserar ansökningar till svenska stiftelser.
-                    Returnera en kort, korrekt och saklig strukturerad analys på svenska.
-                    Hitta inga påhittade fakta. Utgå enbart från det användaren uppgett.
-                    Extra nyckelord ska vara korta svenska ord eller fraser som kan hjälpa matchning.
-                    """
-                ).strip(),
-            },
-            {
-                "role": "user",
-                "content": json.dumps(_profile_payload(profile), ensure_ascii=False, indent=2),
-            },
-        ],
-        text_format=ApplicantInsights,
+    request_input = _insights_input(profile)
+    response = _guarded(
+        "insights",
+        OPENAI_MODEL,
+        request_input,
+        lambda: client.responses.parse(
+            model=OPENAI_MODEL,
+            reasoning={"effort": OPENAI_REASONING_EFFORT},
+            input=request_input,
+            text_format=ApplicantInsights,
+            prompt_cache_key="insights",
+        ),
     )
 
     parsed = response.output_parsed
@@ -72,67 +214,89 @@ def extract_applicant_insights(profile: ApplicantProfile) -> ApplicantInsights:
     return parsed
 
 
+def _draft_input(
+    profile: ApplicantProfile,
+    matches: Sequence[MatchResult],
+    insights: ApplicantInsights | None,
+) -> list[dict[str, Any]]:
+    # The matches go last: the per-foundation drafts for one applicant then share
+    # everything up to them.
+    return _messages(
+        DRAFT_INSTRUCTIONS,
+        {
+            "applicant": _profile_payload(profile),
+            **_insights_payload(insights),
+            "top_matches": [
+                {
+                    "name": match.foundation.name,
+                    "score": match.score,
+                    "reasons": match.reasons,
+                    "warnings": match.warnings,
+                }
+                for match in matches[:3]
+            ],
+        },
+    )
+
+
 def create_application_draft_ai(
     profile: ApplicantProfile,
     matches: Sequence[MatchResult],
     insights: ApplicantInsights | None = None,
 ) -> str:
     client = _get_client()
-    match_payload = [
-        {
-            "name": match.foundation.name,
-            "score": match.score,
-            "reasons": match.reasons,
-            "warnings": match.warnings,
-            "application_url": match.foundation.application_url,
-        }
-        for match in matches[:3]
-    ]
-
-    response = client.responses.create(
-        model=OPENAI_MODEL,
-        reasoning={"effort": OPENAI_REASONING_EFFORT},
-        input=[
-            {
-                "role": "system",
-                "content": dedent(
-                    """
-                    Du skriver ett första utkast till en svensk stiftelseansökan.
-                    Skriv endast utkastet, ingen förklaring före eller efter.
-                    Använd ett varmt men professionellt språk.
-                    Hitta inte på dokument, diagnoser eller ekonomiska fakta.
-                    Om något är osäkert, formulera det försiktigt.
-                    Struktur:
-                    - Rubrik
-                    - Till
-                    - Kort presentation
-                    - Beskrivning av behovet
-                    - Ekonomisk situation
-                    - Varför stiftelsen passar
-                    - Vilka underlag som finns
-                    - Avslutning
-                    """
-                ).strip(),
-            },
-            {
-                "role": "user",
-                "content": json.dumps(
-                    {
-                        "applicant": _profile_payload(profile),
-                        "insights": insights.model_dump(mode="json") if insights else None,
-                        "top_matches": match_payload,
-                    },
-                    ensure_ascii=False,
-                    indent=2,
-                ),
-            },
-        ],
+    request_input = _draft_input(profile, matches, insights)
+    response = _guarded(
+        "draft",
+        OPENAI_MODEL,
+        request_input,
+        lambda: client.responses.create(
+            model=OPENAI_MODEL,
+            reasoning={"effort": OPENAI_REASONING_EFFORT},
+            input=request_input,
+            prompt_cache_key="draft",
+        ),
     )
 
     text = (response.output_text or "").strip()
     if not text:
         raise RuntimeError("OpenAI returnerade inget ansökningsutkast.")
-    return text
+    return text.replace(NAME_PLACEHOLDER, profile.full_name).replace(EMAIL_PLACEHOLDER, str(profile.email))
+
+
+def iter_application_drafts_ai(
+    profile: ApplicantProfile,
+    matches: Sequence[MatchResult],
+    insights: ApplicantInsights | None = None,
+    max_concurrency: int = OPENAI_DRAFT_CONCURRENCY,
+) -> Iterator[tuple[int, str | None, Exception | None]]:
+    """Generate one AI draft per match concurrently.
+
+    Yields ``(index, draft, error)`` in completion order so callers can show each
+    draft as soon as it is ready. At most ``max_concurrency`` requests are in flight.
+    """
+    if not matches:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(matches))) as executor:
+        futures = {
+            executor.submit(create_application_draft_ai, profile, [match], insights): index
+            for index, match in enumerate(matches)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield index, future.result(), None
+            except Exception as exc:
+                yield index, None, exc
+
+
+def _research_input(profile: ApplicantProfile, insights: ApplicantInsights | None) -> list[dict[str, Any]]:
+    return _messages(RESEARCH_INSTRUCTIONS, {"applicant": _profile_payload(profile), **_insights_payload(insights)})
+
+
+def research_prompt_hash(profile: ApplicantProfile, insights: ApplicantInsights | None = None) -> str:
+    return prompt_hash(OPENAI_WEB_MODEL, _research_input(profile, insights))
 
 
 def research_foundations_on_web(
@@ -140,25 +304,17 @@ def research_foundations_on_web(
     insights: ApplicantInsights | None = None,
 ) -> str:
     client = _get_client()
-    prompt = dedent(
-        f"""
-        Hitta 3 till 5 svenska stiftelser, fonder eller stipendieaktörer som kan vara relevanta för denna sökande.
-        Fokusera på verkliga svenska källor och ange varför varje alternativ kan passa.
-        Inkludera en kort varning om att användaren måste kontrollera kriterier och ansökningslänk manuellt.
-        Svara på svenska i markdown med rubriken 'Ytterligare tips från webben'.
-
-        Profil:
-        {json.dumps(_profile_payload(profile), ensure_ascii=False, indent=2)}
-
-        Extra tolkning:
-        {json.dumps(insights.model_dump(mode='json'), ensure_ascii=False, indent=2) if insights else 'Ingen extra tolkning'}
-        """
-    ).strip()
-
-    response = client.responses.create(
-        model=OPENAI_WEB_MODEL,
-        tools=[{"type": "web_search"}],
-        input=prompt,
+    request_input = _research_input(profile, insights)
+    response = _guarded(
+        "research",
+        OPENAI_WEB_MODEL,
+        request_input,
+        lambda: client.responses.create(
+            model=OPENAI_WEB_MODEL,
+            tools=[{"type": "web_search"}],
+            input=request_input,
+            prompt_cache_key="research",
+        ),
     )
     text = (response.output_text or "").strip()
     if not text:
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+
+# A local stand-in for the parts of the OpenAI Responses API that
+# openai_service uses. It answers deterministically from the prompt so the app,
+# the job queue and load tests can run without network access or an API key.
+
+
+@dataclass(slots=True)
+class StubTokenDetails:
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
+
+
+@dataclass(slots=True)
+class StubUsage:
+    input_tokens: int
+    output_tokens: int
+    input_tokens_details: StubTokenDetails
+    output_tokens_details: StubTokenDetails
+
+
+@dataclass(slots=True)
+class StubResponse:
+    output_text: str = ""
+    output_parsed: Any = None
+    usage: StubUsage | None = None
+
+
+def _estimate_usage(request_input: Any, output: str) -> StubUsage:
+    # About four characters per token, which is close enough for Swedish prose and JSON.
+    text = request_input if isinstance(request_input, str) else json.dumps(request_input, ensure_ascii=False)
+    return StubUsage(len(text) // 4, len(output) // 4, StubTokenDetails(), StubTokenDetails())
+
+
+def _applicant_payload(request_input: Any) -> dict[str, Any]:
+    if isinstance(request_input, list):
+        content = request_input[-1]["content"]
+        try:
+            payload = json.loads(content)
+        except json.JSONDecodeError:
+            return {}
+        return payload.get("applicant", payload)
+    return {}
+
+
+class _StubResponses:
+    def __init__(self, latency: Callable[[str], float], failure_rate: float, rng: random.Random) -> None:
+        self._latency = latency
+        self._failure_rate = failure_rate
+        self._rng = rng
+
+    def _wait(self, operation: str) -> None:
+        delay = self._latency(operation)
+        if delay > 0:
+            time.sleep(delay)
+        if self._failure_rate and self._rng.random() < self._failure_rate:
+            raise RuntimeError("Stubben simulerade ett fel från OpenAI.")
+
+    def parse(self, *, model: str, input: Any, text_format: type, **_: Any) -> StubResponse:
+        self._wait("insights")
+        payload = _applicant_payload(input)
+        need_category = payload.get("need_category", "allmänt_stöd")
+        description = payload.get("description", "")
+        parsed = text_format.model_validate(
+            {
+                "concise_summary": description[:160] or "Ingen beskrivning.",
+                "applicant_story": description,
+                "normalized_need_category": need_category,
+                "extra_keywords": [word.strip(".,").lower() for word in description.split() if len(word) > 6][:4],
+                "priority_facts": [f"Söker {payload.get('requested_amount_sek', 0)} SEK."],
+                "missing_information": [] if payload.get("documents") else ["Offert eller intyg saknas."],
+                "caution_flags": [],
+            }
+        )
+        return StubResponse(output_parsed=parsed, usage=_estimate_usage(input, parsed.model_dump_json()))
+
+    def create(self, *, model: str, input: Any, tools: Any = None, **_: Any) -> StubResponse:
+        if tools:
+            self._wait("research")
+            text = (
+                "## Ytterligare tips från webben\n\n- Lokal stubb: inga riktiga webbträffar.\n"
+                "\nKontrollera alltid kriterier och ansökningslänkar manuellt."
+            )
+            return StubResponse(output_text=text, usage=_estimate_usage(input, text))
+        self._wait("draft")
+        payload = json.loads(input[-1]["content"]) if isinstance(input, list) else {}
+        matches = payload.get("top_matches") or [{"name": "vald stiftelse"}]
+        text = f"Ansökan\n\nTill: {matches[0]['name']}\n\nUtkast skapat av lokal stubb.\n\n[NAMN]\n[E-POST]"
+        return StubResponse(output_text=text, usage=_estimate_usage(input, text))
+
+
+# Medians in seconds, roughly what the real endpoints take for this app's prompts.
+DEFAULT_LATENCY_MEDIANS = {"insights": 2.0, "draft": 4.0, "research": 12.0}
+
+
+def lognormal_latency(
+    medians: dict[str, float] | None = None,
+    sigma: float = 0.5,
+    scale: float = 1.0,
+    seed: int | None = None,
+) -> Callable[[str], float]:
+    """Latency sampler with a long right tail, like real API response times.
+
+    With sigma 0.5 the p95 is about 2.3x the median and the p99 about 3.2x.
+    ``scale`` shrinks or stretches every operation, e.g. for quick runs.
+    """
+    medians = {**DEFAULT_LATENCY_MEDIANS, **(medians or {})}
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def sample(operation: str) -> float:
+        with lock:
+            return medians.get(operation, 1.0) * scale * rng.lognormvariate(0.0, sigma)
+
+    return sample
+
+
+class StubOpenAI:
+    """Drop-in for ``openai.OpenAI`` with configurable latency per operation."""
+
+    def __init__(
+        self,
+        latency: Callable[[str], float] | None = None,
+        failure_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.responses = _StubResponses(latency or (lambda _: 0.0), failure_rate, random.Random(seed))
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List
+
+from config import PROFILE_DIR, PROFILE_KEEP, PROFILE_MODE, PROFILE_SAMPLE_INTERVAL_MS, PROFILE_TRACEMALLOC
+
+
+PROFILE_MODES = ("off", "sample", "cprofile")
+TOP_ALLOCATIONS = 15
+
+
+def _frame_label(frame: Any) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+def collapse_stack(frame: Any) -> str:
+    """Render a frame and its callers in the folded format flame graph tools read."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples one thread's stack from a helper thread at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter[str]:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+
+class _TracemallocLease:
+    # Concurrent sessions share one tracemalloc; the last one out stops it.
+    _lock = threading.Lock()
+    _users = 0
+    _started = False
+
+    @classmethod
+    def acquire(cls) -> None:
+        with cls._lock:
+            if cls._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                cls._started = True
+            cls._users += 1
+
+    @classmethod
+    def release(cls) -> None:
+        with cls._lock:
+            cls._users -= 1
+            if cls._users == 0 and cls._started:
+                tracemalloc.stop()
+                cls._started = False
+
+
+class Profiler:
+    """Writes one report per profiled block: stacks, allocations and a JSON summary.
+
+    Reports live in ``directory`` as ``<stem>.json`` plus ``<stem>.folded`` (sample
+    mode) or ``<stem>.prof``/``<stem>.txt`` (cprofile mode) and ``<stem>.alloc.txt``
+    when tracemalloc is on. Only the newest ``keep`` reports are kept.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        directory: Path,
+        keep: int = 200,
+        trace_memory: bool = False,
+        sample_interval: float = 0.005,
+    ) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Okänt profileringsläge: {mode}")
+        self.mode = mode
+        self.directory = Path(directory)
+        self.keep = keep
+        self.trace_memory = trace_memory
+        self.sample_interval = sample_interval
+        self._sequence = itertools.count()
+        self._local = threading.local()
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        sampler = profiler = before = None
+        # A submission is profiled inside its rerun. Only the outermost block
+        # snapshots memory (the inner diff would show up in the outer stacks) and
+        # runs cProfile (a nested one would replace the outer profiler hook).
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        if self.trace_memory and depth == 0:
+            _TracemallocLease.acquire()
+            before = tracemalloc.take_snapshot()
+        if self.mode == "sample":
+            sampler = StackSampler(threading.get_ident(), self.sample_interval).start()
+        elif depth == 0:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            seconds = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+            stacks = sampler.stop() if sampler is not None else Counter()
+            allocations: List[str] = []
+            peak_kib = None
+            if before is not None:
+                after = tracemalloc.take_snapshot()
+                allocations = [str(stat) for stat in after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]]
+                peak_kib = tracemalloc.get_traced_memory()[1] // 1024
+                _TracemallocLease.release()
+            self._write(label, started_at, seconds, stacks, profiler, allocations, peak_kib)
+
+    def _write(
+        self,
+        label: str,
+        started_at: datetime,
+        seconds: float,
+        stacks: Counter[str],
+        profiler: cProfile.Profile | None,
+        allocations: List[str],
+        peak_kib: int | None,
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = f"{started_at:%Y%m%dT%H%M%S%f}-{os.getpid()}-{next(self._sequence)}-{label}"
+        hot: Counter[str] = Counter()
+        if stacks:
+            (self.directory / f"{stem}.folded").write_text(
+                "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()), encoding="utf-8"
+            )
+            for stack, count in stacks.items():
+                hot[stack.rsplit(";", 1)[-1]] += count
+        if profiler is not None:
+            profiler.dump_stats(self.directory / f"{stem}.prof")
+            text = io.StringIO()
+            stats = pstats.Stats(profiler, stream=text).sort_stats("cumulative")
+            stats.print_stats(30)
+            (self.directory / f"{stem}.txt").write_text(text.getvalue(), encoding="utf-8")
+            for (filename, _, function), row in stats.stats.items():  # type: ignore[attr-defined]
+                hot[f"{os.path.basename(filename)}:{function}"] = row[2]
+        if allocations:
+            (self.directory / f"{stem}.alloc.txt").write_text("\n".join(allocations) + "\n", encoding="utf-8")
+        summary = {
+            "stem": stem,
+            "label": label,
+            "mode": self.mode,
+            "started_at": started_at.isoformat(timespec="milliseconds"),
+            "seconds": round(seconds, 4),
+            "samples": sum(stacks.values()),
+            "peak_kib": peak_kib,
+            "hot": [name for name, _ in hot.most_common(3)],
+        }
+        (self.directory / f"{stem}.json").write_text(json.dumps(summary, ensure_ascii=False), encoding="utf-8")
+        self._rotate()
+
+    def _rotate(self) -> None:
+        summaries = sorted(self.directory.glob("*.json"))
+        for summary in summaries[: max(0, len(summaries) - self.keep)]:
+            for path in self.directory.glob(f"{summary.stem}.*"):
+                path.unlink(missing_ok=True)
+
+
+def read_reports(directory: Path = PROFILE_DIR, label: str | None = None) -> List[Dict[str, Any]]:
+    reports = []
+    for path in sorted(Path(directory).glob("*.json")):
+        try:
+            report = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            continue  # rotated away or half-written by another process
+        if label is None or report["label"] == label:
+            reports.append(report)
+    return reports
+
+
+def slowest_reports(directory: Path = PROFILE_DIR, label: str | None = None, limit: int = 10) -> List[Dict[str, Any]]:
+    return sorted(read_reports(directory, label), key=lambda report: report["seconds"], reverse=True)[:limit]
+
+
+PROFILING_ENABLED = PROFILE_MODE != "off"
+
+if PROFILING_ENABLED:
+    _profiler = Profiler(
+        PROFILE_MODE,
+        PROFILE_DIR,
+        keep=PROFILE_KEEP,
+        trace_memory=PROFILE_TRACEMALLOC,
+        sample_interval=PROFILE_SAMPLE_INTERVAL_MS / 1000,
+    )
+    profiled = _profiler.profile
+else:
+    _disabled = nullcontext()
+
+    def profiled(label: str) -> ContextManager[None]:
+        """No-op when PROFILE_MODE is off; the shared nullcontext costs one call."""
+        return _disabled
@@ -1,82 +1,204 @@
 from __future__ import annotations
 
 import json
-from typing import List
+import re
+import sqlite3
+from typing import Any, Callable, Dict, Iterator, List, Sequence
 
 from db import get_connection, utc_now
-from models import ApplicantProfile, MatchResult
+from geography import fold
+from models import ApplicantInsights, ApplicantProfile, Foundation, MatchResult
+from stats import record_application_stats, record_match_stats
+
+
+APPLICATION_COLUMNS = (
+    "full_name",
+    "email",
+    "municipality",
+    "age",
+    "applicant_type",
+    "need_category",
+    "requested_amount_sek",
+    "monthly_income_sek",
+    "urgency",
+    "description",
+    "has_quote",
+    "has_invoice",
+    "has_medical_certificate",
+    "has_research_summary",
+    "created_at",
+)
+DOCUMENT_COLUMNS = ("has_quote", "has_invoice", "has_medical_certificate", "has_research_summary")
+
+
+def _insert_sql(table: str, columns: Sequence[str]) -> str:
+    placeholders = ", ".join("?" for _ in columns)
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+# Inserts also write municipality_key, the folded municipality reverse matching filters on.
+APPLICATION_INSERT_SQL = _insert_sql("applications", (*APPLICATION_COLUMNS, "municipality_key"))
+APPLICATION_INSERT_WITH_ID_SQL = _insert_sql("applications", ("id", *APPLICATION_COLUMNS, "municipality_key"))
+
+MATCH_COLUMNS = (
+    "application_id",
+    "foundation_id",
+    "foundation_name",
+    "score",
+    "reasons",
+    "warnings",
+    "created_at",
+)
+MATCH_INSERT_SQL = _insert_sql("matches", MATCH_COLUMNS)
+
+
+def _application_row(applicant: ApplicantProfile, created_at: str) -> tuple:
+    return (
+        applicant.full_name,
+        applicant.email,
+        applicant.municipality,
+        applicant.age,
+        applicant.applicant_type,
+        applicant.need_category,
+        applicant.requested_amount_sek,
+        applicant.monthly_income_sek,
+        applicant.urgency,
+        applicant.description,
+        int(applicant.has_quote),
+        int(applicant.has_invoice),
+        int(applicant.has_medical_certificate),
+        int(applicant.has_research_summary),
+        created_at,
+        fold(applicant.municipality),
+    )
+
+
+def _match_row(application_id: int, match: MatchResult, created_at: str) -> tuple:
+    return (
+        application_id,
+        match.foundation.id,
+        match.foundation.name,
+        match.score,
+        json.dumps(match.reasons, ensure_ascii=False),
+        json.dumps(match.warnings, ensure_ascii=False),
+        created_at,
+    )
 
 
 def save_application(applicant: ApplicantProfile) -> int:
     with get_connection() as connection:
         cursor = connection.cursor()
-        cursor.execute(
-            """
-            INSERT INTO applications (
-                full_name,
-                email,
-                municipality,
-                age,
-                applicant_type,
-                need_category,
-                requested_amount_sek,
-                monthly_income_sek,
-                urgency,
-                description,
-                has_quote,
-                has_invoice,
-                has_medical_certificate,
-                has_research_summary,
-                created_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                applicant.full_name,
-                applicant.email,
-                applicant.municipality,
-                applicant.age,
-                applicant.applicant_type,
-                applicant.need_category,
-                applicant.requested_amount_sek,
-                applicant.monthly_income_sek,
-                applicant.urgency,
-                applicant.description,
-                int(applicant.has_quote),
-                int(applicant.has_invoice),
-                int(applicant.has_medical_certificate),
-                int(applicant.has_research_summary),
-                utc_now(),
-            ),
-        )
+        cursor.execute(APPLICATION_INSERT_SQL, _application_row(applicant, utc_now()))
+        record_application_stats(connection, [applicant])
         return int(cursor.lastrowid)
 
 
-def save_matches(application_id: int, matches: List[MatchResult]) -> None:
+def save_application_with_matches(applicant: ApplicantProfile, matches: List[MatchResult]) -> int:
+    """Persist one application and its ranking in a single transaction.
+
+    Readers such as the exporter never see the application without its matches.
+    """
     with get_connection() as connection:
+        created_at = utc_now()
         cursor = connection.cursor()
-        for match in matches:
-            cursor.execute(
-                """
-                INSERT INTO matches (
-                    application_id,
-                    foundation_id,
-                    foundation_name,
-                    score,
-                    reasons,
-                    warnings,
-                    created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    application_id,
-                    match.foundation.id,
-                    match.foundation.name,
-                    match.score,
-                    json.dumps(match.reasons, ensure_ascii=False),
-                    json.dumps(match.warnings, ensure_ascii=False),
-                    utc_now(),
-                ),
-            )
+        cursor.execute(APPLICATION_INSERT_SQL, _application_row(applicant, created_at))
+        application_id = int(cursor.lastrowid)
+        connection.executemany(MATCH_INSERT_SQL, [_match_row(application_id, match, created_at) for match in matches])
+        record_application_stats(connection, [applicant])
+        record_match_stats(connection, matches)
+        return application_id
+
+
+def save_matches(application_id: int, matches: List[MatchResult]) -> None:
+    with get_connection() as connection:
+        created_at = utc_now()
+        connection.executemany(
+            MATCH_INSERT_SQL,
+            [_match_row(application_id, match, created_at) for match in matches],
+        )
+        record_match_stats(connection, matches)
+
+
+def replace_matches(application_id: int, matches: List[MatchResult]) -> None:
+    """Swap an application's stored matches for a new ranking, keeping the aggregates in step."""
+    with get_connection() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        replace_rankings(connection, [(application_id, matches)])
+
+
+def replace_rankings(connection: sqlite3.Connection, rankings: Sequence[tuple[int, List[MatchResult]]]) -> None:
+    """``replace_matches`` for several applications inside the caller's write transaction."""
+    if not rankings:
+        return
+    application_ids = [application_id for application_id, _ in rankings]
+    placeholders = ", ".join("?" for _ in application_ids)
+    old_rows = connection.execute(
+        f"SELECT foundation_id, foundation_name, score, warnings FROM matches WHERE application_id IN ({placeholders})",
+        application_ids,
+    ).fetchall()
+    record_match_stats(connection, [_stored_match(row) for row in old_rows], sign=-1)
+    connection.execute(f"DELETE FROM matches WHERE application_id IN ({placeholders})", application_ids)
+    created_at = utc_now()
+    connection.executemany(
+        MATCH_INSERT_SQL,
+        [_match_row(application_id, match, created_at) for application_id, matches in rankings for match in matches],
+    )
+    record_match_stats(connection, (match for _, matches in rankings for match in matches))
+
+
+def _stored_match(row: sqlite3.Row) -> MatchResult:
+    """Lightweight MatchResult for aggregate bookkeeping of an already stored match row."""
+    foundation = Foundation.model_construct(id=row["foundation_id"], name=row["foundation_name"])
+    return MatchResult(foundation=foundation, score=row["score"], warnings=json.loads(row["warnings"]))
+
+
+def save_applications_batch(
+    batch: Sequence[tuple[ApplicantProfile, List[MatchResult]]],
+) -> List[int]:
+    """Persist applications and their matches in one write transaction.
+
+    Ids are reserved up front under an immediate lock so that both tables can be
+    written with ``executemany`` instead of one round trip per row.
+    """
+    if not batch:
+        return []
+
+    with get_connection() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        first_id = _next_application_id(connection)
+        created_at = utc_now()
+        application_ids = list(range(first_id, first_id + len(batch)))
+
+        connection.executemany(
+            APPLICATION_INSERT_WITH_ID_SQL,
+            [
+                (application_id, *_application_row(applicant, created_at))
+                for application_id, (applicant, _) in zip(application_ids, batch)
+            ],
+        )
+        connection.executemany(
+            MATCH_INSERT_SQL,
+            [
+                _match_row(application_id, match, created_at)
+                for application_id, (_, matches) in zip(application_ids, batch)
+                for match in matches
+            ],
+        )
+        record_application_stats(connection, (applicant for applicant, _ in batch))
+        record_match_stats(connection, (match for _, matches in batch for match in matches))
+        return application_ids
+
+
+def _next_application_id(connection: sqlite3.Connection) -> int:
+    row = connection.execute(
+        """
+        SELECT MAX(
+            COALESCE((SELECT MAX(id) FROM applications), 0),
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'applications'), 0)
+        )
+        """
+    ).fetchone()
+    return int(row[0]) + 1
 
 
 def list_recent_applications(limit: int = 20) -> list[dict]:
@@ -94,6 +216,48 @@ def list_recent_applications(limit: int = 20) -> list[dict]:
         return [dict(row) for row in cursor.fetchall()]
 
 
+SEARCH_TERM_PATTERN = re.compile(r"\w+")
+
+
+def build_search_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match as a prefix.
+
+    Words are quoted, so operators and punctuation in the input are never parsed
+    as FTS5 syntax.
+    """
+    return " ".join(f'"{term}"*' for term in SEARCH_TERM_PATTERN.findall(text.lower()))
+
+
+def search_applications(text: str, limit: int = 20, offset: int = 0) -> list[dict]:
+    """Applications whose description, category or municipality match ``text``, best first."""
+    query = build_search_query(text)
+    if not query:
+        return []
+    with get_connection() as connection:
+        # Rank inside FTS5 first so the join and snippet only run for one page of hits.
+        rows = connection.execute(
+            """
+            WITH hits AS (
+                SELECT rowid, bm25(applications_fts, 4.0, 1.0, 1.0) AS rank
+                FROM applications_fts
+                WHERE applications_fts MATCH :query
+                ORDER BY rank
+                LIMIT :limit OFFSET :offset
+            )
+            SELECT a.id, a.full_name, a.municipality, a.need_category, a.created_at,
+                   snippet(applications_fts, 0, '**', '**', '…', 12) AS snippet,
+                   hits.rank
+            FROM hits
+            JOIN applications_fts ON applications_fts.rowid = hits.rowid
+            JOIN applications AS a ON a.id = hits.rowid
+            WHERE applications_fts MATCH :query
+            ORDER BY hits.rank, a.id DESC
+            """,
+            {"query": query, "limit": limit, "offset": offset},
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
 def list_matches_for_application(application_id: int) -> list[dict]:
     with get_connection() as connection:
         cursor = connection.cursor()
@@ -107,3 +271,242 @@ def list_matches_for_application(application_id: int) -> list[dict]:
             (application_id,),
         )
         return [dict(row) for row in cursor.fetchall()]
+
+
+EXPORT_COLUMNS = (
+    "application_id",
+    *APPLICATION_COLUMNS,
+    "match_id",
+    "foundation_id",
+    "foundation_name",
+    "score",
+    "reasons",
+    "warnings",
+    "matched_at",
+)
+
+
+def iter_application_match_chunks(
+    after_id: int = 0,
+    until_id: int | None = None,
+    chunk_size: int = 5000,
+    after_match_id: int = 0,
+    until_match_id: int = 0,
+) -> Iterator[list[tuple]]:
+    """Stream applications joined with their matches in fixed-size chunks.
+
+    Rows come out in application id order straight from the primary key, so SQLite
+    never has to sort or buffer the full result. Applications up to ``after_id``
+    are included too when they have match rows with ids in
+    ``(after_match_id, until_match_id]``, i.e. their matches were written or
+    rewritten since an earlier export.
+    """
+    application_columns = ", ".join(f"a.{column}" for column in APPLICATION_COLUMNS)
+    with get_connection() as connection:
+        cursor = connection.execute(
+            f"""
+            SELECT
+                a.id,
+                {application_columns},
+                m.id,
+                m.foundation_id,
+                m.foundation_name,
+                m.score,
+                m.reasons,
+                m.warnings,
+                m.created_at
+            FROM applications AS a
+            LEFT JOIN matches AS m ON m.application_id = a.id
+            WHERE (a.id > ? AND a.id <= ?)
+               OR a.id IN (SELECT application_id FROM matches WHERE id > ? AND id <= ?)
+            ORDER BY a.id
+            """,
+            (
+                after_id,
+                until_id if until_id is not None else max_application_id(connection),
+                after_match_id,
+                until_match_id,
+            ),
+        )
+        while rows := cursor.fetchmany(chunk_size):
+            yield [tuple(row) for row in rows]
+
+
+def max_application_id(connection: sqlite3.Connection | None = None) -> int:
+    if connection is None:
+        with get_connection() as owned:
+            return max_application_id(owned)
+    row = connection.execute("SELECT COALESCE(MAX(id), 0) FROM applications").fetchone()
+    return int(row[0])
+
+
+def max_match_id(connection: sqlite3.Connection) -> int:
+    row = connection.execute("SELECT COALESCE(MAX(id), 0) FROM matches").fetchone()
+    return int(row[0])
+
+
+def export_high_water() -> tuple[int, int]:
+    """The newest application id and match id, read in one snapshot."""
+    with get_connection() as connection:
+        connection.execute("BEGIN")
+        return max_application_id(connection), max_match_id(connection)
+
+
+def get_export_watermark(name: str) -> tuple[int, int]:
+    """(last application id, last match id) the named export has written up to."""
+    with get_connection() as connection:
+        row = connection.execute(
+            "SELECT last_application_id, last_match_id FROM export_watermarks WHERE name = ?",
+            (name,),
+        ).fetchone()
+        return (int(row[0]), int(row[1])) if row else (0, 0)
+
+
+def set_export_watermark(name: str, last_application_id: int, last_match_id: int = 0) -> None:
+    with get_connection() as connection:
+        connection.execute(
+            """
+            INSERT INTO export_watermarks (name, last_application_id, last_match_id, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                last_application_id = excluded.last_application_id,
+                last_match_id = excluded.last_match_id,
+                updated_at = excluded.updated_at
+            """,
+            (name, last_application_id, last_match_id, utc_now()),
+        )
+
+
+def profile_from_row(row: sqlite3.Row) -> ApplicantProfile:
+    """Rebuild a stored applicant without validating it again.
+
+    Rows only reach ``applications`` from validated profiles, and bulk readers
+    (ranking, re-scoring, exports) load them by the hundred thousand, where the
+    e-mail check alone dominates. SQLite hands the document flags back as 0/1.
+    """
+    values = {column: row[column] for column in APPLICATION_COLUMNS[:-1]}
+    for column in DOCUMENT_COLUMNS:
+        values[column] = bool(values[column])
+    return ApplicantProfile.model_construct(**values)
+
+
+def load_application(application_id: int) -> ApplicantProfile | None:
+    with get_connection() as connection:
+        row = connection.execute("SELECT * FROM applications WHERE id = ?", (application_id,)).fetchone()
+    return profile_from_row(row) if row is not None else None
+
+
+def save_insights(application_id: int, insights: ApplicantInsights, model: str, prompt_hash: str) -> None:
+    with get_connection() as connection:
+        connection.execute(
+            """
+            INSERT INTO application_insights (application_id, model, prompt_hash, insights_json, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (application_id, model, prompt_hash, insights.model_dump_json(), utc_now()),
+        )
+
+
+def load_insights(application_id: int) -> ApplicantInsights | None:
+    return _load_latest_insights("application_id", application_id)
+
+
+def find_insights(prompt_hash: str) -> ApplicantInsights | None:
+    """Reuse insights from any earlier application that sent the exact same prompt."""
+    return _load_latest_insights("prompt_hash", prompt_hash)
+
+
+def _load_latest_insights(column: str, value: Any) -> ApplicantInsights | None:
+    with get_connection() as connection:
+        row = connection.execute(
+            f"SELECT insights_json FROM application_insights WHERE {column} = ? ORDER BY id DESC LIMIT 1",
+            (value,),
+        ).fetchone()
+    return ApplicantInsights.model_validate_json(row["insights_json"]) if row else None
+
+
+def save_draft(application_id: int, body: str, source: str, foundation_id: str = "") -> int:
+    """Store a new draft version and return its version number."""
+    with get_connection() as connection:
+        connection.execute("BEGIN IMMEDIATE")
+        row = connection.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM application_drafts WHERE application_id = ? AND foundation_id = ?",
+            (application_id, foundation_id),
+        ).fetchone()
+        version = int(row[0]) + 1
+        connection.execute(
+            """
+            INSERT INTO application_drafts (application_id, foundation_id, version, source, body, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (application_id, foundation_id, version, source, body, utc_now()),
+        )
+        return version
+
+
+def load_latest_drafts(application_id: int) -> Dict[str, dict]:
+    """Latest draft per foundation id (``""`` is the general draft)."""
+    with get_connection() as connection:
+        rows = connection.execute(
+            """
+            SELECT d.*
+            FROM application_drafts AS d
+            JOIN (
+                SELECT foundation_id, MAX(version) AS version
+                FROM application_drafts
+                WHERE application_id = ?
+                GROUP BY foundation_id
+            ) AS latest USING (foundation_id, version)
+            WHERE d.application_id = ?
+            """,
+            (application_id, application_id),
+        ).fetchall()
+    return {row["foundation_id"]: dict(row) for row in rows}
+
+
+def save_research(application_id: int, markdown: str, model: str, prompt_hash: str) -> None:
+    with get_connection() as connection:
+        connection.execute(
+            """
+            INSERT INTO application_research (application_id, model, prompt_hash, markdown, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (application_id, model, prompt_hash, markdown, utc_now()),
+        )
+
+
+def load_research(application_id: int) -> str:
+    return _load_latest_research("application_id", application_id)
+
+
+def find_research(prompt_hash: str) -> str:
+    return _load_latest_research("prompt_hash", prompt_hash)
+
+
+def _load_latest_research(column: str, value: Any) -> str:
+    with get_connection() as connection:
+        row = connection.execute(
+            f"SELECT markdown FROM application_research WHERE {column} = ? ORDER BY id DESC LIMIT 1",
+            (value,),
+        ).fetchone()
+    return row["markdown"] if row else ""
+
+
+def load_match_results(
+    application_id: int,
+    find_foundation: Callable[[str], Foundation | None],
+) -> List[MatchResult]:
+    """Rebuild stored matches against the current catalog, skipping foundations that no longer exist."""
+    results = []
+    for row in list_matches_for_application(application_id):
+        foundation = find_foundation(row["foundation_id"])
+        if foundation is not None:
+            results.append(
+                MatchResult(
+                    foundation=foundation,
+                    score=row["score"],
+                    reasons=json.loads(row["reasons"]),
+                    warnings=json.loads(row["warnings"]),
+                )
+            )
+    return results
@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import heapq
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Set
+
+from catalog_db import ensure_catalog_imported
+from config import STIFTELSER_PATH, TOP_MATCH_COUNT, USE_SQLITE_CATALOG
+from db import ensure_db, get_connection, utc_now
+from matching import ScoringPlan, get_scoring_plan
+from models import ApplicantInsights, ApplicantProfile, Foundation, MatchResult
+from repository import APPLICATION_COLUMNS, profile_from_row, replace_rankings
+from seed import load_foundations
+
+
+RESCORE_BATCH_SIZE = 200
+
+
+@dataclass(slots=True)
+class CatalogDiff:
+    added: List[str]
+    removed: List[str]
+    changed: List[str]
+    unchanged: int
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+
+def foundation_hash(foundation: Foundation) -> str:
+    return hashlib.sha256(foundation.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def scored_hashes(connection: sqlite3.Connection) -> Dict[str, str]:
+    return dict(connection.execute("SELECT foundation_id, content_hash FROM scored_foundations").fetchall())
+
+
+def diff_catalog(foundations: Sequence[Foundation]) -> CatalogDiff:
+    """Compare ``foundations`` with the catalog version the stored matches were scored against."""
+    with get_connection() as connection:
+        previous = scored_hashes(connection)
+    current = {foundation.id: foundation_hash(foundation) for foundation in foundations}
+    return CatalogDiff(
+        added=[foundation_id for foundation_id in current if foundation_id not in previous],
+        removed=sorted(foundation_id for foundation_id in previous if foundation_id not in current),
+        changed=[
+            foundation_id
+            for foundation_id, content_hash in current.items()
+            if foundation_id in previous and previous[foundation_id] != content_hash
+        ],
+        unchanged=sum(1 for foundation_id, content_hash in current.items() if previous.get(foundation_id) == content_hash),
+    )
+
+
+def mark_scored(connection: sqlite3.Connection, foundations: Sequence[Foundation]) -> None:
+    """Record ``foundations`` as the catalog version the stored matches reflect."""
+    scored_at = utc_now()
+    connection.execute("DELETE FROM scored_foundations")
+    connection.executemany(
+        "INSERT INTO scored_foundations (foundation_id, content_hash, scored_at) VALUES (?, ?, ?)",
+        [(foundation.id, foundation_hash(foundation), scored_at) for foundation in foundations],
+    )
+
+
+def _placeholders(values: Sequence[Any]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def _latest_insights(connection: sqlite3.Connection, application_ids: List[int]) -> Dict[int, ApplicantInsights]:
+    rows = connection.execute(
+        f"""
+        SELECT application_id, insights_json FROM application_insights
+        WHERE id IN (
+            SELECT MAX(id) FROM application_insights
+            WHERE application_id IN ({_placeholders(application_ids)})
+            GROUP BY application_id
+        )
+        """,
+        application_ids,
+    ).fetchall()
+    return {row["application_id"]: ApplicantInsights.model_validate_json(row["insights_json"]) for row in rows}
+
+
+def _stored_rankings(connection: sqlite3.Connection, application_ids: List[int]) -> Dict[int, List[sqlite3.Row]]:
+    rankings: Dict[int, List[sqlite3.Row]] = {application_id: [] for application_id in application_ids}
+    rows = connection.execute(
+        f"""
+        SELECT application_id, foundation_id, foundation_name, score, reasons, warnings FROM matches
+        WHERE application_id IN ({_placeholders(application_ids)})
+        ORDER BY id
+        """,
+        application_ids,
+    )
+    for row in rows:
+        rankings[row["application_id"]].append(row)
+    return rankings
+
+
+def _same_ranking(stored: List[sqlite3.Row], ranking: List[MatchResult]) -> bool:
+    return [
+        (row["foundation_id"], row["foundation_name"], row["score"], json.loads(row["reasons"]), json.loads(row["warnings"]))
+        for row in stored
+    ] == [(match.foundation.id, match.foundation.name, match.score, match.reasons, match.warnings) for match in ranking]
+
+
+def _eligible_positions(catalog: Iterable[Foundation], applicant: ApplicantProfile) -> Set[int] | None:
+    # The same narrowing match_foundations applies through catalog.prefilter, as
+    # catalog positions, so a re-scored ranking equals a fresh submission's.
+    if hasattr(catalog, "candidate_positions"):
+        return set(catalog.candidate_positions(applicant))
+    return None
+
+
+def rescore_changed(
+    foundations: Iterable[Foundation],
+    batch_size: int = RESCORE_BATCH_SIZE,
+    pause: float = 0.05,
+    top_n: int = TOP_MATCH_COUNT,
+    plan: ScoringPlan | None = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """Bring every stored top-``top_n`` ranking up to date with ``foundations``.
+
+    Only pairs with an added or changed foundation are scored. Unchanged entries of
+    the stored ranking are kept as they are, and entries of changed or removed
+    foundations are dropped. That merge is exact unless the new last place could be
+    an unchanged foundation that never made the stored list. In that case the
+    application is re-scored against the rest of the catalog as well. Rankings that come out
+    identical are not rewritten.
+
+    ``foundations`` may be a ``catalog_db.SqliteCatalog``; its prefilter then limits
+    which foundations each applicant is scored against, as in ``submit_profile``.
+    Each batch is read and scored without a write lock, which is taken only to
+    replace the rankings that changed. A ranking rewritten by someone else in the
+    meantime (an insights job) is left to that writer.
+    """
+    plan = plan or get_scoring_plan()
+    catalog = foundations
+    foundations = list(catalog)
+    diff = diff_catalog(foundations)
+    positions = {foundation.id: position for position, foundation in enumerate(foundations)}
+    by_id = {foundation.id: foundation for foundation in foundations}
+    dirty = set(diff.added) | set(diff.changed)
+    rescored = [foundation for foundation in foundations if foundation.id in dirty]
+    partial = len(rescored) < len(foundations)
+
+    def rank_key(match: MatchResult) -> tuple[int, int]:
+        # Same order as match_foundations: score, then catalog order.
+        return match.score, -positions[match.foundation.id]
+
+    report: Dict[str, Any] = {
+        "added": len(diff.added),
+        "removed": len(diff.removed),
+        "changed": len(diff.changed),
+        "applications": 0,
+        "rewritten": 0,
+        "full_rescores": 0,
+        "scored_pairs": 0,
+    }
+    last_id = 0
+    while not diff.empty:
+        with get_connection() as connection:
+            connection.execute("BEGIN")
+            rows = connection.execute(
+                f"SELECT id, {', '.join(APPLICATION_COLUMNS)} FROM applications WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            application_ids = [row["id"] for row in rows]
+            stored_rankings = _stored_rankings(connection, application_ids)
+            insights = _latest_insights(connection, application_ids)
+
+        rewrites = []
+        for row in rows:
+            application_id = row["id"]
+            applicant = profile_from_row(row)
+            found = insights.get(application_id)
+            context = plan.context(applicant, found.extra_keywords if found else None)
+            eligible = _eligible_positions(catalog, applicant)
+            stored = stored_rankings[application_id]
+            kept = [
+                MatchResult(
+                    foundation=by_id[entry["foundation_id"]],
+                    score=entry["score"],
+                    reasons=json.loads(entry["reasons"]),
+                    warnings=json.loads(entry["warnings"]),
+                )
+                for entry in stored
+                if entry["foundation_id"] in by_id and entry["foundation_id"] not in dirty
+            ]
+            candidates = [
+                foundation for foundation in rescored if eligible is None or positions[foundation.id] in eligible
+            ]
+            fresh = [plan.score(context, foundation) for foundation in candidates]
+            ranking = heapq.nlargest(top_n, kept + fresh, key=rank_key)
+            report["scored_pairs"] += len(candidates)
+
+            # Unchanged foundations missing from a full stored list scored at most
+            # its last score, so only a fresh entry at or below it is in doubt.
+            if partial and len(stored) >= top_n and (
+                len(ranking) < top_n
+                or (ranking[-1].foundation.id in dirty and ranking[-1].score <= min(entry["score"] for entry in stored))
+            ):
+                unchanged = [
+                    plan.score(context, foundation)
+                    for foundation in foundations
+                    if foundation.id not in dirty and (eligible is None or positions[foundation.id] in eligible)
+                ]
+                ranking = heapq.nlargest(top_n, fresh + unchanged, key=rank_key)
+                report["full_rescores"] += 1
+                report["scored_pairs"] += len(unchanged)
+            if not _same_ranking(stored, ranking):
+                rewrites.append((application_id, ranking))
+
+        if rewrites and not dry_run:
+            with get_connection() as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                current = _stored_rankings(connection, [application_id for application_id, _ in rewrites])
+                rewrites = [
+                    (application_id, ranking)
+                    for application_id, ranking in rewrites
+                    if list(map(tuple, current[application_id])) == list(map(tuple, stored_rankings[application_id]))
+                ]
+                replace_rankings(connection, rewrites)
+        report["applications"] += len(rows)
+        report["rewritten"] += len(rewrites)
+        last_id = application_ids[-1]
+        if pause:
+            time.sleep(pause)  # let queued writers take the lock between batches
+
+    if diff.empty:
+        with get_connection() as connection:
+            report["applications"] = connection.execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+    elif not dry_run:
+        with get_connection() as connection:
+            mark_scored(connection, foundations)
+    report["full_pairs"] = report["applications"] * len(foundations)
+    report["avoided_pairs"] = report["full_pairs"] - report["scored_pairs"]
+    return report
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Poängsätt sparade matchningar på nytt för ändrade stiftelser.")
+    parser.add_argument("source", type=Path, nargs="?", default=STIFTELSER_PATH)
+    parser.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=0.05, help="Sekunder mellan batcher.")
+    parser.add_argument("--dry-run", action="store_true", help="Visa vad som skulle ändras.")
+    parser.add_argument(
+        "--mark-current",
+        action="store_true",
+        help="Registrera katalogen som poängsatt utan att räkna om något.",
+    )
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    # Score through the same catalog as the app, so the prefilter matches submit_profile.
+    catalog = ensure_catalog_imported(args.source) if USE_SQLITE_CATALOG else load_foundations(args.source)
+    foundations = list(catalog)
+    diff = diff_catalog(foundations)
+    print(
+        f"Katalogen: {len(diff.added)} nya, {len(diff.changed)} ändrade, {len(diff.removed)} borttagna, "
+        f"{diff.unchanged} oförändrade."
+    )
+    if args.mark_current:
+        with get_connection() as connection:
+            mark_scored(connection, foundations)
+        print("Registrerade katalogen som poängsatt.")
+        return 0
+    if diff.empty:
+        return 0
+
+    report = rescore_changed(catalog, args.batch_size, args.pause, dry_run=args.dry_run)
+    verb = "Skulle skriva om" if args.dry_run else "Skrev om"
+    print(
+        f"{verb} {report['rewritten']} av {report['applications']} rankningar "
+        f"({report['full_rescores']} fick räknas om mot hela katalogen)."
+    )
+    print(
+        f"Poängsatte {report['scored_pairs']:,} par i stället för {report['full_pairs']:,}; "
+        f"{report['avoided_pairs']:,} undvikna."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+from typing import Any, Iterator, List
+
+from catalog_db import OPEN_GEOGRAPHIES
+from db import get_connection
+from geography import get_geography_index
+from matching import APPLICANT_GROUP_ALIASES, ScoringPlan, get_scoring_plan, normalize
+from models import APPLICANT_TYPE_VALUES, ApplicantProfile, Foundation, MatchResult
+from repository import APPLICATION_COLUMNS, profile_from_row
+
+
+@dataclass(slots=True)
+class ApplicantMatch:
+    application_id: int
+    created_at: str
+    applicant: ApplicantProfile
+    result: MatchResult
+
+
+@dataclass(slots=True)
+class ApplicantRanking:
+    total: int
+    matches: List[ApplicantMatch]
+
+
+def _placeholders(values: List[Any]) -> str:
+    return ", ".join("?" for _ in values)
+
+
+def applicant_filter(foundation: Foundation) -> tuple[str, List[Any]]:
+    """SQL conditions on ``applications`` for the applicants a foundation can take.
+
+    The mirror image of ``SqliteCatalog.candidate_positions``: the need category or
+    applicant type must fit and the municipality must be covered. On top of that
+    the age window and income cap must hold. Every condition can use an index.
+    """
+    clauses = ["age BETWEEN ? AND ?"]
+    params: List[Any] = [foundation.age_min, foundation.age_max]
+    if foundation.monthly_income_cap_sek is not None:
+        clauses.append("monthly_income_sek <= ?")
+        params.append(foundation.monthly_income_cap_sek)
+
+    categories = sorted({normalize(category) for category in foundation.categories})
+    target_groups = {normalize(group) for group in foundation.target_groups}
+    applicant_types = [
+        applicant_type
+        for applicant_type in APPLICANT_TYPE_VALUES
+        if not target_groups.isdisjoint(APPLICANT_GROUP_ALIASES.get(applicant_type, [applicant_type]))
+    ]
+    fits = []
+    if categories:
+        fits.append(f"need_category IN ({_placeholders(categories)})")
+        params.extend(categories)
+    if applicant_types:
+        fits.append(f"applicant_type IN ({_placeholders(applicant_types)})")
+        params.extend(applicant_types)
+    if not fits:
+        return "0", []
+    clauses.append(f"({' OR '.join(fits)})")
+
+    if {normalize(geography) for geography in foundation.geographies}.isdisjoint(OPEN_GEOGRAPHIES):
+        spellings = get_geography_index().municipality_spellings(foundation.geographies)
+        clauses.append(f"municipality_key IN ({_placeholders(spellings)})")
+        params.extend(spellings)
+    return " AND ".join(clauses), params
+
+
+def candidate_ids(foundation: Foundation) -> List[int]:
+    where, params = applicant_filter(foundation)
+    with get_connection() as connection:
+        return [row[0] for row in connection.execute(f"SELECT id FROM applications WHERE {where} ORDER BY id", params)]
+
+
+def _iter_candidates(ids: List[int], chunk_size: int) -> Iterator[tuple[int, str, ApplicantProfile]]:
+    # One short read per chunk, so a large ranking never holds the database
+    # lock while it scores.
+    columns = ", ".join(APPLICATION_COLUMNS)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start : start + chunk_size]
+        with get_connection() as connection:
+            rows = connection.execute(
+                f"SELECT id, {columns} FROM applications WHERE id IN ({_placeholders(chunk)})", chunk
+            ).fetchall()
+        for row in rows:
+            yield row["id"], row["created_at"], profile_from_row(row)
+
+
+def rank_applicant_ids(
+    foundation: Foundation,
+    depth: int | None = None,
+    plan: ScoringPlan | None = None,
+    chunk_size: int = 500,
+) -> tuple[int, List[tuple[int, int]]]:
+    """The candidate count and the best ``depth`` candidates as ``(score, application_id)``, best first.
+
+    Only the order is kept, so callers can hold on to it and serve any page inside
+    it with ``applicant_page`` instead of scoring every candidate again. Ties go to
+    the newest application, so pages are stable while no new applications arrive.
+    ``depth=None`` keeps every candidate.
+    """
+    plan = plan or get_scoring_plan()
+    ids = candidate_ids(foundation)
+    scored = (
+        (plan.score(plan.context(applicant), foundation).score, application_id)
+        for application_id, _, applicant in _iter_candidates(ids, chunk_size)
+    )
+    order = sorted(scored, reverse=True) if depth is None else heapq.nlargest(depth, scored)
+    return len(ids), order
+
+
+def applicant_page(
+    foundation: Foundation,
+    order: List[tuple[int, int]],
+    offset: int,
+    limit: int,
+    plan: ScoringPlan | None = None,
+) -> List[ApplicantMatch]:
+    """Load and score only the applicants on one page of an order from ``rank_applicant_ids``.
+
+    Applications that have been removed since the order was computed are skipped.
+    """
+    plan = plan or get_scoring_plan()
+    page_ids = [application_id for _, application_id in order[offset : offset + limit]]
+    loaded = {
+        application_id: ApplicantMatch(
+            application_id, created_at, applicant, plan.score(plan.context(applicant), foundation)
+        )
+        for application_id, created_at, applicant in _iter_candidates(page_ids, max(len(page_ids), 1))
+    }
+    return [loaded[application_id] for application_id in page_ids if application_id in loaded]
+
+
+def rank_applicants(
+    foundation: Foundation,
+    limit: int = 20,
+    offset: int = 0,
+    plan: ScoringPlan | None = None,
+    chunk_size: int = 500,
+) -> ApplicantRanking:
+    """Stored applicants ranked by ``score_foundation`` for one foundation, one page at a time.
+
+    Only applicants that pass ``applicant_filter`` are loaded and scored. ``total`` is
+    the number of applicants that passed the filter. Every call scores all candidates;
+    to page through one ranking, keep the order from ``rank_applicant_ids`` and pass
+    it to ``applicant_page``.
+    """
+    plan = plan or get_scoring_plan()
+    total, order = rank_applicant_ids(foundation, offset + limit, plan, chunk_size)
+    return ApplicantRanking(total=total, matches=applicant_page(foundation, order, offset, limit, plan))
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+from config import SCORING_RULES_PATH
+from models import URGENCY_VALUES
+
+
+class _RuleWeights(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+
+class TargetGroupWeights(_RuleWeights):
+    match: int
+
+
+class CategoryWeights(_RuleWeights):
+    match: int
+    description_keywords: int
+
+
+class GeographyWeights(_RuleWeights):
+    match: int
+    regional: int
+
+
+class AgeWeights(_RuleWeights):
+    within: int
+    outside: int
+
+
+class IncomeWeights(_RuleWeights):
+    no_cap: int
+    within: int
+    over: int
+
+
+class AmountWeights(_RuleWeights):
+    within: int
+    below: int
+    above: int
+
+
+class DocumentWeights(_RuleWeights):
+    complete: int
+    missing_each: int
+
+
+class AiKeywordWeights(_RuleWeights):
+    per_keyword: int
+    max: int = Field(ge=0)
+
+
+class ScoringRules(_RuleWeights):
+    target_group: TargetGroupWeights
+    category: CategoryWeights
+    geography: GeographyWeights
+    age: AgeWeights
+    income: IncomeWeights
+    amount: AmountWeights
+    documents: DocumentWeights
+    urgency: Dict[str, int]
+    description_keywords: int
+    ai_keywords: AiKeywordWeights
+
+    @model_validator(mode="after")
+    def _check_urgency_levels(self) -> "ScoringRules":
+        unknown = set(self.urgency) - set(URGENCY_VALUES)
+        if unknown:
+            raise ValueError(f"Okända brådskenivåer i regelfilen: {', '.join(sorted(unknown))}.")
+        return self
+
+
+def load_scoring_rules(path: Path = SCORING_RULES_PATH) -> ScoringRules:
+    with path.open("r", encoding="utf-8") as file:
+        raw = json.load(file)
+    return ScoringRules.model_validate(raw)
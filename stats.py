@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from collections import Counter
+from typing import Any, Iterable, Sequence
+
+from db import ensure_db, get_connection
+from matching import MISSING_DOC_WARNING
+from models import ApplicantProfile, MatchResult
+
+
+# Aggregates are maintained incrementally by the repository inside the same
+# transaction as the rows they describe, so reading them never scans
+# applications or matches.
+
+
+def record_application_stats(connection: sqlite3.Connection, applicants: Iterable[ApplicantProfile]) -> None:
+    categories = Counter(applicant.need_category for applicant in applicants)
+    if not categories:
+        return
+    _add_categories(connection, list(categories.items()))
+    _add_total(connection, "applications", sum(categories.values()))
+
+
+def record_match_stats(connection: sqlite3.Connection, matches: Iterable[MatchResult], sign: int = 1) -> None:
+    """Add (``sign=1``) or subtract (``sign=-1``) matches from the aggregates."""
+    per_foundation: dict[str, list[Any]] = {}
+    for match in matches:
+        row = per_foundation.setdefault(match.foundation.id, [match.foundation.name, 0, 0, 0])
+        row[1] += 1
+        row[2] += match.score
+        row[3] += int(MISSING_DOC_WARNING in match.warnings)
+    if not per_foundation:
+        return
+
+    _add_foundations(
+        connection,
+        [
+            (foundation_id, name, sign * count, sign * score_total, sign * missing)
+            for foundation_id, (name, count, score_total, missing) in per_foundation.items()
+        ],
+    )
+    _add_total(connection, "matches", sign * sum(row[1] for row in per_foundation.values()))
+    _add_total(connection, "matches_missing_documents", sign * sum(row[3] for row in per_foundation.values()))
+
+
+def forget_application_stats(connection: sqlite3.Connection, application_ids: Sequence[int]) -> None:
+    """Subtract stored applications and their matches, before the rows leave the database."""
+    if not application_ids:
+        return
+    placeholders = ", ".join("?" for _ in application_ids)
+    categories = connection.execute(
+        f"""
+        SELECT need_category, -COUNT(*) FROM applications
+        WHERE id IN ({placeholders})
+        GROUP BY need_category
+        """,
+        application_ids,
+    ).fetchall()
+    _add_categories(connection, [tuple(row) for row in categories])
+    _add_total(connection, "applications", sum(row[1] for row in categories))
+
+    foundations = connection.execute(
+        f"""
+        SELECT foundation_id, MAX(foundation_name), -COUNT(*), -SUM(score), -SUM(instr(warnings, ?) > 0)
+        FROM matches
+        WHERE application_id IN ({placeholders})
+        GROUP BY foundation_id
+        """,
+        (MISSING_DOC_WARNING, *application_ids),
+    ).fetchall()
+    _add_foundations(connection, [tuple(row) for row in foundations])
+    _add_total(connection, "matches", sum(row[2] for row in foundations))
+    _add_total(connection, "matches_missing_documents", sum(row[4] for row in foundations))
+
+
+def _add_categories(connection: sqlite3.Connection, rows: list[tuple]) -> None:
+    connection.executemany(
+        """
+        INSERT INTO stats_categories (need_category, application_count) VALUES (?, ?)
+        ON CONFLICT(need_category) DO UPDATE SET
+            application_count = application_count + excluded.application_count
+        """,
+        rows,
+    )
+
+
+def _add_foundations(connection: sqlite3.Connection, rows: list[tuple]) -> None:
+    connection.executemany(
+        """
+        INSERT INTO stats_foundations (
+            foundation_id, foundation_name, match_count, score_total, missing_documents_count
+        ) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(foundation_id) DO UPDATE SET
+            foundation_name = excluded.foundation_name,
+            match_count = match_count + excluded.match_count,
+            score_total = score_total + excluded.score_total,
+            missing_documents_count = missing_documents_count + excluded.missing_documents_count
+        """,
+        rows,
+    )
+
+
+def _add_total(connection: sqlite3.Connection, name: str, delta: int) -> None:
+    connection.execute(
+        """
+        INSERT INTO stats_totals (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        """,
+        (name, delta),
+    )
+
+
+def rebuild_stats(connection: sqlite3.Connection) -> None:
+    """Recompute every aggregate from the base tables."""
+    connection.execute("DELETE FROM stats_totals")
+    connection.execute("DELETE FROM stats_categories")
+    connection.execute("DELETE FROM stats_foundations")
+    connection.execute(
+        """
+        INSERT INTO stats_categories (need_category, application_count)
+        SELECT need_category, COUNT(*) FROM applications GROUP BY need_category
+        """
+    )
+    connection.execute(
+        """
+        INSERT INTO stats_foundations (
+            foundation_id, foundation_name, match_count, score_total, missing_documents_count
+        )
+        SELECT
+            foundation_id,
+            MAX(foundation_name),
+            COUNT(*),
+            SUM(score),
+            SUM(instr(warnings, ?) > 0)
+        FROM matches
+        GROUP BY foundation_id
+        """,
+        (MISSING_DOC_WARNING,),
+    )
+    connection.execute(
+        """
+        INSERT INTO stats_totals (name, value)
+        SELECT 'applications', COUNT(*) FROM applications
+        UNION ALL
+        SELECT 'matches', COALESCE(SUM(match_count), 0) FROM stats_foundations
+        UNION ALL
+        SELECT 'matches_missing_documents', COALESCE(SUM(missing_documents_count), 0) FROM stats_foundations
+        """
+    )
+
+
+def read_stats(top_n: int = 5) -> dict[str, Any]:
+    with get_connection() as connection:
+        return _read_stats(connection, top_n)
+
+
+def _read_stats(connection: sqlite3.Connection, top_n: int | None) -> dict[str, Any]:
+    totals = {row["name"]: row["value"] for row in connection.execute("SELECT name, value FROM stats_totals")}
+    categories = {
+        row["need_category"]: row["application_count"]
+        for row in connection.execute(
+            "SELECT need_category, application_count FROM stats_categories WHERE application_count > 0"
+        )
+    }
+    foundations = [
+        {
+            "foundation_id": row["foundation_id"],
+            "foundation_name": row["foundation_name"],
+            "match_count": row["match_count"],
+            "average_score": round(row["score_total"] / row["match_count"], 1),
+            "missing_documents_share": round(row["missing_documents_count"] / row["match_count"], 3),
+        }
+        for row in connection.execute(
+            """
+            SELECT foundation_id, foundation_name, match_count, score_total, missing_documents_count
+            FROM stats_foundations
+            WHERE match_count > 0
+            ORDER BY match_count DESC, foundation_id
+            LIMIT ?
+            """,
+            (-1 if top_n is None else top_n,),
+        )
+    ]
+    matches = totals.get("matches", 0)
+    return {
+        "applications": totals.get("applications", 0),
+        "matches": matches,
+        "missing_documents_share": round(totals.get("matches_missing_documents", 0) / matches, 3) if matches else 0.0,
+        "applications_per_category": categories,
+        "top_foundations": foundations,
+    }
+
+
+def check_stats() -> list[str]:
+    """Compare the maintained aggregates with a fresh rebuild without changing anything."""
+    with get_connection() as connection:
+        stored = _read_stats(connection, top_n=None)
+        rebuild_stats(connection)
+        rebuilt = _read_stats(connection, top_n=None)
+        connection.rollback()
+
+    differences = []
+    for key in ("applications", "matches", "missing_documents_share", "applications_per_category"):
+        if stored[key] != rebuilt[key]:
+            differences.append(f"{key}: lagrat {stored[key]!r}, beräknat {rebuilt[key]!r}")
+    stored_foundations = {row["foundation_id"]: row for row in stored["top_foundations"]}
+    for row in rebuilt["top_foundations"]:
+        if stored_foundations.pop(row["foundation_id"], None) != row:
+            differences.append(f"stiftelse {row['foundation_id']} avviker")
+    differences.extend(f"stiftelse {foundation_id} saknas i basdata" for foundation_id in stored_foundations)
+    return differences
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Kontrollera eller bygg om statistiktabellerna.")
+    parser.add_argument("--rebuild", action="store_true", help="Räkna om all statistik från grunddata.")
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    if args.rebuild:
+        with get_connection() as connection:
+            rebuild_stats(connection)
+        print("Statistiken är ombyggd.")
+        return 0
+
+    differences = check_stats()
+    for difference in differences:
+        print(difference)
+    print("Statistiken stämmer." if not differences else f"{len(differences)} avvikelser hittades.")
+    return 0 if not differences else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
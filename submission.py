@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List
+
+from config import TOP_MATCH_COUNT
+from drafting import create_application_draft
+from jobs import enqueue_job
+from matching import match_foundations
+from models import ApplicantProfile, Foundation, MatchResult
+from repository import save_application_with_matches, save_draft
+
+
+SUBMIT_STAGES = ("match", "save", "draft", "enqueue")
+
+
+@dataclass(slots=True)
+class Submission:
+    application_id: int
+    matches: List[MatchResult]
+    draft: str = ""
+    job_ids: List[int] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+@contextmanager
+def _stage(timings: Dict[str, float], name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
+def submit_profile(
+    profile: ApplicantProfile,
+    foundations: Iterable[Foundation],
+    use_ai: bool,
+    use_web_research: bool,
+    multi_draft: bool = False,
+) -> Submission:
+    """The synchronous part of a submission: local matching, storage and queued AI work.
+
+    AI insights, the AI draft and web research run later as background jobs.
+    ``Submission.timings`` holds the seconds spent in each of ``SUBMIT_STAGES``.
+    """
+    timings: Dict[str, float] = {}
+    with _stage(timings, "match"):
+        matches = match_foundations(profile, foundations, top_n=TOP_MATCH_COUNT)
+    with _stage(timings, "save"):
+        application_id = save_application_with_matches(profile, matches)
+
+    draft = ""
+    if not multi_draft:
+        with _stage(timings, "draft"):
+            draft = create_application_draft(profile, matches)
+            save_draft(application_id, draft, "lokal")
+
+    job_ids = []
+    if use_ai:
+        with _stage(timings, "enqueue"):
+            job_ids.append(enqueue_job("insights", application_id, {"draft": not multi_draft}))
+            if use_web_research:
+                job_ids.append(enqueue_job("research", application_id))
+    return Submission(application_id, matches, draft, job_ids, timings)
@@ -0,0 +1,71 @@
+"""Fixtures shared by the test modules."""
+from __future__ import annotations
+
+import itertools
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import db
+from models import ApplicantProfile
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Runs every test against a fresh database in its own temporary directory."""
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = mock.patch.object(db, "DB_PATH", Path(self.tmp.name) / "test.db")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        db.ensure_db()
+
+
+def make_profile(need_category: str, has_quote: bool) -> ApplicantProfile:
+    return ApplicantProfile(
+        full_name="Anna Andersson",
+        email="anna@example.se",
+        municipality="Stockholm",
+        age=70,
+        applicant_type="senior",
+        need_category=need_category,
+        requested_amount_sek=12000,
+        monthly_income_sek=15000,
+        urgency="Hög",
+        description="Jag är pensionär och behöver stöd efter en kostnadsberäkning.",
+        has_quote=has_quote,
+    )
+
+
+def applicant_grid() -> list[ApplicantProfile]:
+    profiles = []
+    for applicant_type, need_category, municipality, age, income, amount, urgency, docs in itertools.product(
+        ["behövande", "senior", "student", "forskare"],
+        ["tandvård", "glasögon", "boende", "studier", "forskning", "allmänt_stöd"],
+        ["Stockholm", "Malmö"],
+        [20, 70],
+        [15000, 50000],
+        [1000, 20000, 400000],
+        ["Låg", "Akut"],
+        [False, True],
+    ):
+        profiles.append(
+            ApplicantProfile(
+                full_name="Test Person",
+                email="test@example.se",
+                municipality=municipality,
+                age=age,
+                applicant_type=applicant_type,
+                need_category=need_category,
+                requested_amount_sek=amount,
+                monthly_income_sek=income,
+                urgency=urgency,
+                description="Jag behöver stöd till tandvård, hyra och en kurs inom forskning.",
+                has_quote=docs,
+                has_medical_certificate=docs,
+                has_research_summary=docs,
+            )
+        )
+    return profiles
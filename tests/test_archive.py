@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import sqlite3
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import archive
+import db
+from jobs import enqueue_job
+from matching import match_foundations
+from repository import list_recent_applications, save_applications_batch, save_draft, search_applications
+from seed import load_foundations
+from stats import check_stats, read_stats
+from tests.support import DatabaseTestCase, make_profile
+
+
+class ArchiveTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = Path(self.tmp.name) / "archive"
+
+        foundations = load_foundations()
+        categories = ["tandvård", "glasögon", "boende", "tandvård", "studier", "boende"]
+        profiles = [make_profile(category, has_quote=index % 2 == 0) for index, category in enumerate(categories)]
+        self.ids = save_applications_batch(
+            [(profile, match_foundations(profile, foundations, top_n=3)) for profile in profiles]
+        )
+        with db.get_connection() as connection:
+            connection.executemany(
+                "UPDATE applications SET created_at = ? WHERE id = ?",
+                zip(["2023-03-01T10:00:00", "2023-11-30T10:00:00", "2024-06-01T10:00:00"], self.ids),
+            )
+        save_draft(self.ids[0], "Utkast", "lokal")
+
+    def test_old_applications_move_to_yearly_archives(self) -> None:
+        enqueue_job("insights", self.ids[2], {})
+
+        self.assertEqual(archive.archive_applications(365, directory=self.directory, dry_run=True), {"2023": 2})
+        self.assertEqual(archive.list_archives(self.directory), [])
+
+        moved = archive.archive_applications(365, batch_size=1, pause=0, directory=self.directory)
+
+        self.assertEqual(moved, {"2023": 2})
+        self.assertEqual([period for period, _ in archive.list_archives(self.directory)], ["2023"])
+        hot_ids = [row["id"] for row in list_recent_applications()]
+        self.assertEqual(sorted(hot_ids), self.ids[2:])
+        self.assertEqual(read_stats()["applications"], 4)
+        self.assertEqual(check_stats(), [])
+        self.assertNotIn(self.ids[0], [row["id"] for row in search_applications("pensionär")])
+        with sqlite3.connect(db.DB_PATH) as connection:
+            self.assertEqual(
+                connection.execute("SELECT COUNT(*) FROM matches WHERE application_id IN (?, ?)", self.ids[:2]).fetchone(),
+                (0,),
+            )
+
+        stored = archive.load_archived_application(self.ids[0], self.directory)
+        self.assertEqual((stored["archive"], stored["need_category"]), ("2023", "tandvård"))
+        self.assertEqual(len(stored["matches"]), 3)
+        self.assertIsNone(archive.load_archived_application(self.ids[2], self.directory))
+        with sqlite3.connect(archive.archive_path("2023", self.directory)) as connection:
+            self.assertEqual(connection.execute("SELECT body FROM application_drafts").fetchall(), [("Utkast",)])
+
+        with archive.archive_connection(self.directory) as connection:
+            counts = dict(connection.execute("SELECT archive, COUNT(*) FROM all_applications GROUP BY archive").fetchall())
+            self.assertEqual(counts, {"": 4, "2023": 2})
+            with self.assertRaises(sqlite3.OperationalError):
+                connection.execute("DELETE FROM archive_2023.applications")
+
+        self.assertEqual(archive.archive_applications(365, pause=0, directory=self.directory), {})
+
+    def test_interrupted_run_is_completed_by_the_next_one(self) -> None:
+        with mock.patch.object(archive, "forget_application_stats", side_effect=RuntimeError("avbruten")):
+            with self.assertRaises(RuntimeError):
+                archive.archive_applications(365, pause=0, directory=self.directory)
+        self.assertEqual(read_stats()["applications"], 6)
+
+        # A copy left behind by a crash between copy and delete is ignored on the rerun.
+        with sqlite3.connect(db.DB_PATH) as connection:
+            connection.execute("ATTACH DATABASE ? AS leftover", (str(archive.archive_path("2023", self.directory)),))
+            connection.execute("INSERT INTO leftover.applications SELECT * FROM main.applications WHERE id = ?", (self.ids[0],))
+
+        self.assertEqual(archive.archive_applications(365, pause=0, directory=self.directory), {"2023": 2, "2024": 1})
+        with archive.archive_connection(self.directory) as connection:
+            self.assertEqual(connection.execute("SELECT COUNT(*) FROM all_applications WHERE archive != ''").fetchone()[0], 3)
+        self.assertEqual(check_stats(), [])
+
+    def test_archive_from_before_a_new_column_still_works(self) -> None:
+        archive.archive_applications(365, pause=0, directory=self.directory)
+        with sqlite3.connect(archive.archive_path("2023", self.directory)) as connection:
+            connection.execute("DROP INDEX idx_applications_folded_municipality")
+            connection.execute("ALTER TABLE applications DROP COLUMN municipality_key")
+
+        self.assertIsNone(archive.load_archived_application(self.ids[0], self.directory)["municipality_key"])
+        with db.get_connection() as connection:
+            connection.execute("UPDATE applications SET created_at = '2023-12-01T10:00:00' WHERE id = ?", (self.ids[3],))
+        self.assertEqual(archive.archive_applications(365, pause=0, directory=self.directory), {"2023": 1})
+        stored = archive.load_archived_application(self.ids[3], self.directory)
+        self.assertEqual(stored["municipality_key"], "stockholm")
+
+    def test_compact_returns_free_pages(self) -> None:
+        with db.get_connection() as connection:
+            connection.execute("UPDATE applications SET description = ? WHERE id = ?", ("x" * 200_000, self.ids[3]))
+        with db.get_connection() as connection:
+            connection.execute("UPDATE applications SET description = 'kort' WHERE id = ?", (self.ids[3],))
+        size = db.DB_PATH.stat().st_size
+
+        result = archive.compact(pages_per_step=10, pause=0)
+
+        self.assertEqual(result["mode"], "incremental")
+        self.assertGreater(result["freed_pages"], 10)
+        self.assertLess(db.DB_PATH.stat().st_size, size)
+        report = archive.database_report(repeats=1)
+        self.assertEqual((report["applications"], report["free_mib"]), (6, 0.0))
+        self.assertEqual(set(report["latency_ms"]), set(archive.LATENCY_QUERIES))
+
+
+if __name__ == "__main__":
+    unittest.main()
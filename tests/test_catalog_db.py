@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import catalog_db
+import db
+from catalog_db import SqliteCatalog, ensure_catalog_imported, import_foundations
+from matching import APPLICANT_GROUP_ALIASES, match_foundations
+from models import ApplicantProfile, Foundation
+from seed import load_foundations
+from tests.support import DatabaseTestCase, applicant_grid
+
+
+def is_eligible(applicant: ApplicantProfile, foundation: Foundation) -> bool:
+    aliases = APPLICANT_GROUP_ALIASES.get(applicant.applicant_type, [applicant.applicant_type])
+    shares_need = applicant.need_category in foundation.categories or any(
+        alias in foundation.target_groups for alias in aliases
+    )
+    covers_area = not {"hela sverige", "regional", applicant.municipality.lower()}.isdisjoint(foundation.geographies)
+    return shares_need and covers_area
+
+
+class SqliteCatalogTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.foundations = load_foundations()
+        self.catalog = ensure_catalog_imported()
+
+    def test_import_round_trips_the_json_catalog(self) -> None:
+        self.assertEqual(list(SqliteCatalog(batch_size=2)), self.foundations)
+        self.assertEqual(len(self.catalog), len(self.foundations))
+        self.assertEqual(self.catalog.find(self.foundations[2].id), self.foundations[2])
+        self.assertIsNone(self.catalog.find("okänd"))
+        self.assertEqual(
+            self.catalog.term_counts("categories")["tandvård"],
+            sum("tandvård" in foundation.categories for foundation in self.foundations),
+        )
+
+        self.assertEqual(import_foundations(self.foundations[:2]), 2)
+        self.assertEqual(list(self.catalog), self.foundations[:2])
+
+    def test_edited_source_file_is_reimported(self) -> None:
+        source = Path(self.tmp.name) / "stiftelser.json"
+        items = [foundation.model_dump() for foundation in self.foundations]
+        source.write_text(json.dumps(items[:3], ensure_ascii=False), encoding="utf-8")
+        self.assertEqual(len(ensure_catalog_imported(source)), 3)
+
+        items[0]["name"] = "Omdöpt stiftelse"
+        source.write_text(json.dumps(items[:4], ensure_ascii=False), encoding="utf-8")
+        os.utime(source, ns=(source.stat().st_atime_ns, source.stat().st_mtime_ns + 1_000_000))
+        catalog = ensure_catalog_imported(source)
+        self.assertEqual(len(catalog), 4)
+        self.assertEqual(catalog.find("sf-001").name, "Omdöpt stiftelse")
+
+        with mock.patch("catalog_db.import_foundations") as import_foundations_:
+            ensure_catalog_imported(source)
+        import_foundations_.assert_not_called()
+        self.assertEqual(len(ensure_catalog_imported()), len(self.foundations))
+
+    def test_catalog_keyed_the_old_way_is_reimported(self) -> None:
+        ensure_catalog_imported()
+        with db.get_connection() as connection:
+            connection.execute("UPDATE foundation_geographies SET value_key = 'gammal nyckel'")
+            connection.execute("DELETE FROM catalog_meta WHERE name = 'value_keys'")
+
+        catalog = ensure_catalog_imported()
+        self.assertNotIn("gammal nyckel", catalog.term_counts("geographies"))
+        with mock.patch("catalog_db.VALUE_KEY_VERSION", catalog_db.VALUE_KEY_VERSION + 1), mock.patch(
+            "catalog_db.import_foundations"
+        ) as import_foundations_:
+            ensure_catalog_imported()
+        import_foundations_.assert_called_once()
+
+    def test_prefilter_matches_python_eligibility_and_scoring(self) -> None:
+        for applicant in applicant_grid()[::7]:
+            eligible = [foundation for foundation in self.foundations if is_eligible(applicant, foundation)]
+            self.assertEqual(list(self.catalog.prefilter(applicant)), eligible)
+            expected = match_foundations(applicant, eligible, top_n=3)
+            actual = match_foundations(applicant, self.catalog, top_n=3)
+            self.assertEqual(
+                [(match.foundation.id, match.score) for match in actual],
+                [(match.foundation.id, match.score) for match in expected],
+            )
+
+    def test_prefilter_can_be_bypassed(self) -> None:
+        applicant = applicant_grid()[0]
+        self.assertEqual(
+            [match.foundation.id for match in match_foundations(applicant, self.catalog, top_n=6, prefilter=False)],
+            [match.foundation.id for match in match_foundations(applicant, self.foundations, top_n=6)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import catalog_store
+from catalog_store import SharedCatalog, attach_shared_catalog, publish_catalog, read_generation
+from matching import match_foundations
+from models import ApplicantProfile
+from seed import load_foundations
+
+
+class SharedCatalogTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = Path(self.tmp.name)
+        self.foundations = load_foundations()
+        publish_catalog(self.foundations, self.directory)
+
+    def test_round_trips_every_foundation(self) -> None:
+        catalog = SharedCatalog(self.directory)
+        self.addCleanup(catalog.close)
+
+        self.assertEqual(len(catalog), len(self.foundations))
+        self.assertEqual([item.model_dump() for item in catalog], [item.model_dump() for item in self.foundations])
+        self.assertEqual(catalog[-1].id, "sf-006")
+        self.assertIsNone(catalog[-1].monthly_income_cap_sek)
+
+    def test_posting_lists_and_matching_use_the_mapping(self) -> None:
+        catalog = SharedCatalog(self.directory)
+        self.addCleanup(catalog.close)
+
+        self.assertEqual(list(catalog.postings("categories", "Tandvård")), [0, 1, 4])
+        self.assertEqual(len(catalog.postings("categories", "okänt")), 0)
+        self.assertEqual(catalog.term_counts("categories")["boende"], 3)
+        self.assertEqual(
+            [item.id for item in catalog.candidates(categories=["forskning"], target_groups=["student"])],
+            ["sf-003", "sf-004", "sf-006"],
+        )
+
+        applicant = ApplicantProfile(
+            full_name="Anna Andersson",
+            email="anna@example.se",
+            municipality="Stockholm",
+            age=72,
+            applicant_type="senior",
+            need_category="tandvård",
+            requested_amount_sek=12000,
+            monthly_income_sek=15000,
+            urgency="Hög",
+            description="Jag är pensionär med låg inkomst och behöver tandvård.",
+            has_quote=True,
+        )
+        shared = match_foundations(applicant, catalog, top_n=3)
+        private = match_foundations(applicant, self.foundations, top_n=3)
+        self.assertEqual([(item.foundation.id, item.score) for item in shared], [(item.foundation.id, item.score) for item in private])
+
+    def test_new_generation_gets_a_new_view_and_old_readers_keep_theirs(self) -> None:
+        self.addCleanup(catalog_store._attached.pop, self.directory, None)
+        catalog = attach_shared_catalog(self.directory)
+        self.addCleanup(catalog.close)
+        self.assertEqual(catalog.generation, 1)
+        self.assertIs(attach_shared_catalog(self.directory), catalog)
+        reader = iter(catalog)
+        first = next(reader)
+
+        publish_catalog(self.foundations[:2], self.directory)
+        current = attach_shared_catalog(self.directory)
+        self.addCleanup(current.close)
+
+        self.assertEqual(read_generation(self.directory), 2)
+        self.assertIsNot(current, catalog)
+        self.assertEqual((current.generation, len(current)), (2, 2))
+        self.assertIs(attach_shared_catalog(self.directory), current)
+        # A thread still iterating the old generation is not torn down under it.
+        self.assertEqual([first.id, *(item.id for item in reader)], [item.id for item in self.foundations])
+        self.assertEqual((catalog.generation, len(catalog)), (1, len(self.foundations)))
+        self.assertEqual(catalog.find("sf-006").id, "sf-006")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import unittest
+
+from drafting import create_application_draft, create_application_drafts
+from matching import match_foundations
+from models import ApplicantProfile
+from seed import load_foundations
+
+
+class DraftingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.applicant = ApplicantProfile(
+            full_name="Anna Andersson",
+            email="anna@example.se",
+            municipality="Stockholm",
+            age=72,
+            applicant_type="senior",
+            need_category="tandvård",
+            requested_amount_sek=12000,
+            monthly_income_sek=15000,
+            urgency="Hög",
+            description="Jag är pensionär med låg inkomst och behöver tandvård efter en kostnadsberäkning.",
+            has_quote=True,
+        )
+        self.matches = match_foundations(self.applicant, load_foundations(), top_n=3)
+
+    def test_one_tailored_draft_per_match(self) -> None:
+        drafts = create_application_drafts(self.applicant, self.matches)
+
+        self.assertEqual(len(drafts), 3)
+        for draft, match in zip(drafts, self.matches):
+            self.assertIn(f"Till: {match.foundation.name}", draft)
+            self.assertIn(f"- {match.reasons[0]}", draft)
+        self.assertEqual(drafts[0], create_application_draft(self.applicant, self.matches))
+
+    def test_template_output_is_dedented(self) -> None:
+        draft = create_application_draft(self.applicant, self.matches)
+
+        self.assertTrue(draft.startswith("Ansökningsutkast\n"))
+        self.assertIn("\nJag söker 12,000 SEK för detta behov.", draft)
+        self.assertIn("\n- offert\n", draft)
+        self.assertTrue(draft.endswith("Anna Andersson\nanna@example.se"))
+
+    def test_draft_without_matches_falls_back_to_generic_target(self) -> None:
+        draft = create_application_draft(self.applicant, [])
+
+        self.assertIn("Till: vald stiftelse", draft)
+        self.assertIn("- Matchningen behöver granskas manuellt.", draft)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import csv
+import unittest
+from pathlib import Path
+
+from exporter import export_applications
+from matching import match_foundations
+from models import ApplicantProfile
+from repository import (
+    replace_matches,
+    save_application,
+    save_application_with_matches,
+    save_applications_batch,
+    save_matches,
+)
+from seed import load_foundations
+from tests.support import DatabaseTestCase
+
+
+def make_profile(index: int) -> ApplicantProfile:
+    return ApplicantProfile(
+        full_name=f"Person {index}",
+        email=f"person{index}@example.se",
+        municipality="Stockholm",
+        age=70,
+        applicant_type="senior",
+        need_category="tandvård",
+        requested_amount_sek=12000,
+        monthly_income_sek=15000,
+        urgency="Hög",
+        description="Jag är pensionär och behöver tandvård efter en kostnadsberäkning.",
+        has_quote=True,
+    )
+
+
+class ExporterTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.foundations = load_foundations()
+
+    def _save(self, indexes: range) -> None:
+        save_applications_batch(
+            [(make_profile(index), match_foundations(make_profile(index), self.foundations, top_n=2)) for index in indexes]
+        )
+
+    def _read(self, path: Path) -> list[dict]:
+        with path.open("r", encoding="utf-8", newline="") as file:
+            return list(csv.DictReader(file))
+
+    def _export_pairs(self, name: str) -> list[tuple[str, str]]:
+        path = Path(self.tmp.name) / name
+        export_applications(path, incremental=True)
+        return [(row["application_id"], row["foundation_id"]) for row in self._read(path)]
+
+    def test_csv_export_joins_matches_in_chunks(self) -> None:
+        self._save(range(3))
+        path = Path(self.tmp.name) / "export.csv"
+
+        report = export_applications(path, chunk_size=2)
+
+        rows = self._read(path)
+        self.assertEqual(report.rows_written, 6)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row["application_id"] for row in rows], ["1", "1", "2", "2", "3", "3"])
+        self.assertEqual(rows[0]["foundation_id"], "sf-001")
+
+    def test_incremental_export_only_emits_new_applications(self) -> None:
+        self._save(range(2))
+        first = Path(self.tmp.name) / "first.csv"
+        second = Path(self.tmp.name) / "second.csv"
+
+        export_applications(first, incremental=True)
+        self._save(range(2, 3))
+        report = export_applications(second, incremental=True)
+
+        self.assertEqual(report.first_application_id, 3)
+        self.assertEqual({row["application_id"] for row in self._read(second)}, {"3"})
+        empty = export_applications(Path(self.tmp.name) / "third.csv", incremental=True)
+        self.assertEqual(empty.rows_written, 0)
+
+    def test_matches_written_after_an_export_are_exported_next_time(self) -> None:
+        self._save(range(1))
+        # An export that runs between saving an application and its matches.
+        application_id = save_application(make_profile(1))
+        export_applications(Path(self.tmp.name) / "first.csv", incremental=True)
+        save_matches(application_id, match_foundations(make_profile(1), self.foundations, top_n=2))
+
+        self.assertEqual(self._export_pairs("second.csv"), [("2", "sf-001"), ("2", "sf-002")])
+
+        # Rewritten matches (insights job, rescoring) are exported again too.
+        replace_matches(1, match_foundations(make_profile(0), self.foundations, top_n=1))
+        self.assertEqual(self._export_pairs("third.csv"), [("1", "sf-001")])
+        self.assertEqual(self._export_pairs("fourth.csv"), [])
+
+        save_application_with_matches(make_profile(2), match_foundations(make_profile(2), self.foundations, top_n=2))
+        self.assertEqual(self._export_pairs("fifth.csv"), [("3", "sf-001"), ("3", "sf-002")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import unittest
+
+import db
+
+from catalog_db import SqliteCatalog, import_foundations
+from geography import NATIONWIDE_BIT, fold, get_geography_index
+from matching import score_foundation
+from repository import save_application
+from reverse_matching import candidate_ids
+from seed import load_foundations
+from tests.support import DatabaseTestCase, make_profile
+
+
+class GeographyIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = get_geography_index()
+
+    def test_spelling_variants_resolve_to_one_municipality(self) -> None:
+        self.assertEqual(fold(" Upplands-Bro "), "upplands bro")
+        gothenburg = self.index.applicant_bits("Göteborg")
+        for spelling in ("Goteborg", "GÖTEBORG", "göteborg", "Gothenburg", "Göteborgs stad"):
+            self.assertEqual(self.index.applicant_bits(spelling), gothenburg, spelling)
+        self.assertEqual(self.index.canonical("Goteborg"), "göteborg")
+        self.assertEqual(self.index.applicant_bits("Atlantis"), NATIONWIDE_BIT)
+
+    def test_folded_collisions_only_resolve_when_spelled_exactly(self) -> None:
+        self.assertNotEqual(self.index.applicant_bits("Håbo"), self.index.applicant_bits("Habo"))
+        self.assertEqual(self.index.area_keys("Håbo")[1], "uppsala län")
+        self.assertEqual(self.index.area_keys("HABO")[1], "jönköpings län")
+
+    def test_county_and_region_tags_cover_their_municipalities(self) -> None:
+        skane = self.index.coverage(["Skane"])
+        self.assertTrue(skane.bits & self.index.applicant_bits("Malmö"))
+        self.assertFalse(skane.bits & self.index.applicant_bits("Göteborg"))
+        south = self.index.coverage(["Riksområde Sydsverige"])
+        self.assertTrue(south.bits & self.index.applicant_bits("Karlskrona"))
+        self.assertEqual(skane.bits & ~south.bits, 0)
+        # A municipality name wins over the county that shares it.
+        self.assertEqual(bin(self.index.coverage(["Uppsala"]).bits).count("1"), 1)
+        self.assertEqual(bin(self.index.coverage(["Uppsala län"]).bits).count("1"), 8)
+
+        mixed = self.index.coverage(["regional", "Atlantis"])
+        self.assertTrue(mixed.regional)
+        self.assertEqual((mixed.bits, mixed.places), (0, frozenset({"atlantis"})))
+        self.assertIs(self.index.coverage(["regional", "Atlantis"]), mixed)
+
+    def test_applicant_area_matches_the_same_or_a_wider_area(self) -> None:
+        county = self.index.applicant_places("Stockholms lan")
+        self.assertFalse(county.isdisjoint(self.index.coverage(["Stockholms län"]).places))
+        self.assertFalse(county.isdisjoint(self.index.coverage(["Riksområde Stockholm"]).places))
+        self.assertTrue(county.isdisjoint(self.index.coverage(["Stockholm"]).places))
+        self.assertEqual(self.index.applicant_bits("Stockholms län"), NATIONWIDE_BIT)
+        self.assertEqual(self.index.area_keys("Region Skåne"), ["skåne län", "riksområde sydsverige"])
+        self.assertIn("stockholms lan", self.index.municipality_spellings(["Riksområde Stockholm"]))
+
+
+class GeographyMatchingTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        base = load_foundations()[1]
+        self.foundations = [
+            base.model_copy(update={"id": "geo-skane", "geographies": ["Skåne län"]}),
+            base.model_copy(update={"id": "geo-goteborg", "geographies": ["Goteborg"]}),
+            base.model_copy(update={"id": "geo-syd", "geographies": ["Riksområde Sydsverige"]}),
+            base.model_copy(update={"id": "geo-okand", "geographies": ["Atlantis"]}),
+        ]
+        import_foundations(self.foundations)
+        self.malmo = make_profile("tandvård", has_quote=True).model_copy(update={"municipality": "malmo"})
+
+    def test_scoring_and_catalog_prefilter_agree_on_areas(self) -> None:
+        matched = {
+            foundation.id
+            for foundation in self.foundations
+            if "Geografin matchar." in score_foundation(self.malmo, foundation).reasons
+        }
+        self.assertEqual(matched, {"geo-skane", "geo-syd"})
+        self.assertEqual([foundation.id for foundation in SqliteCatalog().prefilter(self.malmo)], ["geo-skane", "geo-syd"])
+        self.assertEqual(SqliteCatalog().term_counts("geographies")["göteborg"], 1)
+
+        gothenburg = self.malmo.model_copy(update={"municipality": "Göteborg"})
+        self.assertIn("Geografin matchar.", score_foundation(gothenburg, self.foundations[1]).reasons)
+        atlantis = self.malmo.model_copy(update={"municipality": "ATLANTIS"})
+        self.assertEqual([foundation.id for foundation in SqliteCatalog().prefilter(atlantis)], ["geo-okand"])
+
+    def test_applicant_giving_a_county_meets_county_and_region_tags(self) -> None:
+        skane = self.malmo.model_copy(update={"municipality": "Skåne län"})
+        matched = {
+            foundation.id
+            for foundation in self.foundations
+            if "Geografin matchar." in score_foundation(skane, foundation).reasons
+        }
+        self.assertEqual(matched, {"geo-skane", "geo-syd"})
+        self.assertEqual([foundation.id for foundation in SqliteCatalog().prefilter(skane)], ["geo-skane", "geo-syd"])
+        application_id = save_application(skane)
+        self.assertEqual(candidate_ids(self.foundations[0]), [application_id])
+        self.assertEqual(candidate_ids(self.foundations[2]), [application_id])
+
+    def test_reverse_filter_finds_every_spelling_in_the_area(self) -> None:
+        ids = [
+            save_application(self.malmo.model_copy(update={"municipality": municipality}))
+            for municipality in ("Malmö", "MALMO", "Ängelholm", "Göteborg", "Gothenburg", "Atlantis")
+        ]
+        self.assertEqual(candidate_ids(self.foundations[0]), ids[:3])
+        self.assertEqual(candidate_ids(self.foundations[1]), ids[3:5])
+        self.assertEqual(candidate_ids(self.foundations[3]), ids[5:])
+
+    def test_older_database_gets_a_backfilled_municipality_key(self) -> None:
+        ids = [
+            save_application(self.malmo.model_copy(update={"municipality": municipality}))
+            for municipality in ("Malmö", " Upplands-Bro ", "Göteborg")
+        ]
+        with db.get_connection() as connection:
+            connection.execute("DROP INDEX idx_applications_folded_municipality")
+            connection.execute("ALTER TABLE applications DROP COLUMN municipality_key")
+
+        db.ensure_db()
+        with db.get_connection() as connection:
+            keys = [row[0] for row in connection.execute("SELECT municipality_key FROM applications ORDER BY id")]
+            indexed = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'idx_applications_folded_municipality'"
+            ).fetchone()
+        self.assertEqual(keys, ["malmo", "upplands bro", "goteborg"])
+        self.assertIsNotNone(indexed)
+        self.assertEqual(candidate_ids(self.foundations[0]), ids[:1])
+
+
+if __name__ == "__main__":
+    unittest.main()
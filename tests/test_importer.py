@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+import unittest
+from pathlib import Path
+
+from importer import import_applications
+from repository import list_matches_for_application, list_recent_applications
+from seed import load_foundations
+from tests.support import DatabaseTestCase
+
+
+VALID_ROW = {
+    "full_name": "Anna Andersson",
+    "email": "anna@example.se",
+    "municipality": "Stockholm",
+    "age": "72",
+    "applicant_type": "senior",
+    "need_category": "tandvård",
+    "requested_amount_sek": "12000",
+    "monthly_income_sek": "15000",
+    "urgency": "Hög",
+    "description": "Jag är pensionär med låg inkomst och behöver tandvård efter en kostnadsberäkning.",
+    "has_quote": "ja",
+}
+
+
+class ImporterTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.foundations = load_foundations()
+
+    def _write(self, name: str, content: str) -> Path:
+        path = Path(self.tmp.name) / name
+        path.write_text(content, encoding="utf-8")
+        return path
+
+    def test_csv_import_collects_row_errors_without_aborting(self) -> None:
+        header = list(VALID_ROW)
+        lines = [",".join(header)]
+        for index in range(5):
+            row = dict(VALID_ROW, full_name=f"Person {index}")
+            lines.append(",".join(row[column] for column in header))
+        lines.append(",".join(dict(VALID_ROW, age="9").values()))
+        path = self._write("ansokningar.csv", "\n".join(lines) + "\n")
+
+        report = import_applications(path, foundations=self.foundations, chunk_size=2)
+
+        self.assertEqual(report.rows_read, 6)
+        self.assertEqual(report.rows_imported, 5)
+        self.assertEqual(report.rows_failed, 1)
+        self.assertEqual(report.errors[0].line, 7)
+        self.assertIn("age", report.errors[0].message)
+
+        applications = list_recent_applications(limit=10)
+        self.assertEqual(len(applications), 5)
+        matches = list_matches_for_application(applications[0]["id"])
+        self.assertEqual(matches[0]["foundation_id"], "sf-001")
+
+    def test_jsonl_import_continues_after_existing_rows(self) -> None:
+        path = self._write(
+            "ansokningar.jsonl",
+            "\n".join(
+                [
+                    json.dumps(VALID_ROW, ensure_ascii=False),
+                    "{inte json",
+                    json.dumps(dict(VALID_ROW, need_category="okänt"), ensure_ascii=False),
+                    json.dumps(VALID_ROW, ensure_ascii=False),
+                ]
+            ),
+        )
+
+        import_applications(path, foundations=self.foundations)
+        report = import_applications(path, foundations=self.foundations)
+
+        self.assertEqual(report.rows_imported, 2)
+        self.assertEqual([error.line for error in report.errors], [2, 3])
+        ids = [row["id"] for row in list_recent_applications(limit=10)]
+        self.assertEqual(ids, [4, 3, 2, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
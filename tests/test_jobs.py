@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import time
+import unittest
+from unittest import mock
+
+import db
+import jobs
+import openai_service
+from jobs import (
+    JobCancelled,
+    JobWorkerPool,
+    build_enrichment_handlers,
+    cancel_job,
+    claim_job,
+    complete_job,
+    enqueue_job,
+    fail_job,
+    get_jobs,
+    list_jobs_for_application,
+    renew_lease,
+)
+from models import ApplicantProfile, MatchResult
+from openai_stub import StubOpenAI
+from repository import (
+    load_insights,
+    load_latest_drafts,
+    load_research,
+    replace_matches,
+    save_application,
+    save_insights,
+)
+from seed import load_foundations
+from tests.support import DatabaseTestCase
+
+
+class JobQueueTests(DatabaseTestCase):
+    def test_claim_complete_and_retry(self) -> None:
+        job_id = enqueue_job("insights", None, {"draft": True}, max_attempts=2)
+        job = claim_job("worker-a", ["insights"])
+        self.assertEqual((job.id, job.attempts, job.payload), (job_id, 1, {"draft": True}))
+        self.assertIsNone(claim_job("worker-b", ["insights"]))
+
+        self.assertEqual(fail_job(job, "tillfälligt fel", backoff_seconds=0), "queued")
+        retry = claim_job("worker-b", ["insights"])
+        self.assertEqual(retry.attempts, 2)
+        self.assertEqual(fail_job(retry, "fel igen", backoff_seconds=0), "failed")
+        self.assertIsNone(claim_job("worker-a", ["insights"]))
+        self.assertEqual(get_jobs([job_id])[0].error, "fel igen")
+
+        done_id = enqueue_job("research", None)
+        self.assertTrue(complete_job(claim_job("worker-a", ["research"])))
+        self.assertEqual(get_jobs([done_id])[0].status, "done")
+
+    def test_expired_lease_is_reclaimed_and_stale_owner_cannot_complete(self) -> None:
+        job_id = enqueue_job("research", None)
+        stale = claim_job("worker-a", ["research"], lease_seconds=-1)
+        fresh = claim_job("worker-b", ["research"])
+        self.assertEqual((fresh.id, fresh.attempts), (job_id, 2))
+        self.assertFalse(complete_job(stale))
+        self.assertTrue(complete_job(fresh))
+
+    def test_cancelled_job_is_not_claimed_or_completed(self) -> None:
+        queued_id = enqueue_job("research", None)
+        self.assertTrue(cancel_job(queued_id))
+        self.assertIsNone(claim_job("worker-a", ["research"]))
+
+        enqueue_job("research", None)
+        running = claim_job("worker-a", ["research"])
+        self.assertTrue(cancel_job(running.id))
+        self.assertFalse(complete_job(running))
+        self.assertEqual(get_jobs([running.id])[0].status, "cancelled")
+
+    def test_lease_is_renewed_while_the_handler_runs(self) -> None:
+        job_id = enqueue_job("research", None)
+        renewed = []
+
+        def lease_expires_at() -> str:
+            with db.get_connection() as connection:
+                return connection.execute("SELECT lease_expires_at FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+        def slow_handler(job) -> None:
+            claimed_until = lease_expires_at()
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                if lease_expires_at() > claimed_until:
+                    renewed.append(job.id)
+                    return
+                time.sleep(0.05)
+
+        JobWorkerPool({"research": slow_handler}, workers=0, lease_seconds=1.5).run_once()
+        self.assertEqual(renewed, [job_id])
+        self.assertEqual(get_jobs([job_id])[0].status, "done")
+
+        enqueue_job("research", None)
+        stale = claim_job("worker-a", ["research"], lease_seconds=-1)
+        fresh = claim_job("worker-b", ["research"])
+        self.assertFalse(renew_lease(stale))
+        self.assertTrue(renew_lease(fresh))
+        cancel_job(fresh.id)
+        self.assertFalse(renew_lease(fresh))
+
+    def _stub_application(self) -> int:
+        openai_service.set_client_factory(StubOpenAI)
+        self.addCleanup(openai_service.set_client_factory, None)
+        profile = ApplicantProfile(
+            full_name="Anna Andersson",
+            email="anna@example.se",
+            municipality="Stockholm",
+            age=72,
+            applicant_type="senior",
+            need_category="tandvård",
+            requested_amount_sek=12000,
+            monthly_income_sek=15000,
+            urgency="Hög",
+            description="Jag är pensionär med låg inkomst och behöver tandvård och tandprotes.",
+            has_quote=True,
+        )
+        return save_application(profile)
+
+    def test_enrichment_jobs_run_against_the_stub(self) -> None:
+        application_id = self._stub_application()
+        enqueue_job("insights", application_id, {"draft": True})
+        enqueue_job("research", application_id)
+
+        pool = JobWorkerPool(build_enrichment_handlers(load_foundations), workers=0)
+        while pool.run_once():
+            pass
+
+        jobs = list_jobs_for_application(application_id)
+        self.assertEqual(
+            [(job.kind, job.status) for job in jobs], [("insights", "done"), ("research", "done"), ("draft", "done")]
+        )
+        self.assertIsNotNone(load_insights(application_id))
+        self.assertEqual(load_latest_drafts(application_id)[""]["source"], "ai")
+        self.assertTrue(load_research(application_id))
+
+    def test_draft_uses_the_stored_matches(self) -> None:
+        application_id = self._stub_application()
+        stored = [MatchResult(foundation=foundation, score=1) for foundation in load_foundations()[-2:]]
+        replace_matches(application_id, stored)
+        enqueue_job("draft", application_id)
+        pool = JobWorkerPool(build_enrichment_handlers(load_foundations), workers=0)
+
+        with mock.patch("jobs.create_application_draft_ai", wraps=jobs.create_application_draft_ai) as create_draft:
+            self.assertTrue(pool.run_once())
+        matches = create_draft.call_args.args[1]
+        self.assertEqual([match.foundation.id for match in matches], [match.foundation.id for match in stored])
+        self.assertEqual(load_latest_drafts(application_id)[""]["source"], "ai")
+
+    def test_failed_steps_do_not_repeat_or_block_the_others(self) -> None:
+        application_id = self._stub_application()
+        research_id = enqueue_job("research", application_id)
+        insights_id = enqueue_job("insights", application_id, {"draft": True})
+        pool = JobWorkerPool(build_enrichment_handlers(load_foundations), workers=0)
+        # Keep the deferred research job out of the queue however slowly the test runs.
+        poll = mock.patch("jobs.JOB_POLL_SECONDS", 60)
+        poll.start()
+        self.addCleanup(poll.stop)
+
+        # Research waits for the insights job without using up an attempt.
+        self.assertTrue(pool.run_once())
+        research = get_jobs([research_id])[0]
+        self.assertEqual((research.status, research.attempts), ("queued", 0))
+
+        with mock.patch("jobs.create_application_draft_ai", side_effect=RuntimeError("utkast")), mock.patch(
+            "jobs.replace_matches", wraps=jobs.replace_matches
+        ) as replace_matches:
+            self.assertTrue(pool.run_once())
+            self.assertTrue(pool.run_once())
+        draft = list_jobs_for_application(application_id)[-1]
+        # Only the draft is retried; the insights and matches are not written again.
+        self.assertEqual((draft.kind, draft.status, draft.attempts, draft.error), ("draft", "queued", 1, "utkast"))
+        self.assertEqual(get_jobs([insights_id])[0].status, "done")
+        self.assertEqual(replace_matches.call_count, 1)
+
+    def test_research_still_runs_when_insights_give_up(self) -> None:
+        application_id = self._stub_application()
+        insights_id = enqueue_job("insights", application_id, {"draft": True}, max_attempts=1)
+        research_id = enqueue_job("research", application_id)
+        pool = JobWorkerPool(build_enrichment_handlers(load_foundations), workers=0)
+
+        with mock.patch("jobs.extract_applicant_insights", side_effect=RuntimeError("tolkning")):
+            while pool.run_once():
+                pass
+
+        self.assertEqual(get_jobs([insights_id])[0].status, "failed")
+        self.assertEqual(get_jobs([research_id])[0].status, "done")
+        self.assertTrue(load_research(application_id))
+        self.assertEqual([job.kind for job in list_jobs_for_application(application_id)], ["insights", "research"])
+
+    def test_cancelled_insights_write_nothing_after_the_cancel(self) -> None:
+        application_id = self._stub_application()
+        enqueue_job("insights", application_id, {"draft": True})
+        job = claim_job("worker-a", ["insights"])
+
+        def cancel_then_save(*args, **kwargs):
+            cancel_job(job.id)
+            return save_insights(*args, **kwargs)
+
+        with mock.patch("jobs.save_insights", side_effect=cancel_then_save), mock.patch(
+            "jobs.replace_matches"
+        ) as replace_matches:
+            with self.assertRaises(JobCancelled):
+                build_enrichment_handlers(load_foundations)["insights"](job)
+        replace_matches.assert_not_called()
+        self.assertEqual([job.kind for job in list_jobs_for_application(application_id)], ["insights"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import unittest
+from pathlib import Path
+
+from loadtest import LoadTestConfig, compare_results, percentiles, run_load_test, save_result
+from tests.support import DatabaseTestCase
+
+
+class LoadTestTests(DatabaseTestCase):
+    def test_percentiles(self) -> None:
+        row = percentiles([i / 1000 for i in range(1, 101)])
+        self.assertEqual((row["count"], row["p50_ms"], row["max_ms"]), (100, 50.5, 100.0))
+        self.assertEqual(row["p99_ms"], 99.01)
+        self.assertEqual(percentiles([0.002])["p95_ms"], 2.0)
+        self.assertEqual(percentiles([]), {"count": 0})
+
+    def test_small_run_is_measured_saved_and_comparable(self) -> None:
+        config = LoadTestConfig(
+            applicants=8,
+            rate=200,
+            concurrency=4,
+            job_workers=2,
+            latency_scale=0.001,
+            web_research_share=0.5,
+            requests_per_minute=10_000,
+            drain_timeout=20,
+            label="test",
+        )
+        result = run_load_test(config)
+
+        self.assertEqual(result["throughput"]["submissions"], 8)
+        self.assertTrue(result["throughput"]["drained"])
+        self.assertEqual(result["stages"]["enrichment_total"]["count"], 8)
+        for stage in ("admission", "match", "save", "submit_total", "insights_queue", "insights_run"):
+            self.assertIn(stage, result["stages"])
+        self.assertEqual(result["sqlite"]["jobs"]["lock_errors"], 0)
+        self.assertGreater(result["openai"]["calls"], 0)
+
+        results_dir = Path(self.tmp.name) / "results"
+        path = save_result(result, results_dir)
+        self.assertTrue(path.name.endswith("-test.json"))
+        lines = compare_results(results_dir)
+        self.assertEqual(len(lines), 2)
+        self.assertIn(path.stem, lines[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
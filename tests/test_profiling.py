@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+import profiling
+from profiling import Profiler, read_reports, slowest_reports
+
+
+def busy_wait(seconds: float) -> list[bytes]:
+    blocks = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        blocks.append(bytes(1024))
+    return blocks
+
+
+class ProfilerTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.directory = Path(self.tmp.name)
+
+    def test_sample_mode_writes_folded_stacks_and_allocations(self) -> None:
+        profiler = Profiler("sample", self.directory, trace_memory=True, sample_interval=0.001)
+        with profiler.profile("rerun"):
+            blocks = busy_wait(0.1)
+
+        [report] = read_reports(self.directory)
+        self.assertEqual((report["label"], report["mode"]), ("rerun", "sample"))
+        self.assertGreater(report["samples"], 0)
+        self.assertGreaterEqual(report["peak_kib"], len(blocks))
+        folded = (self.directory / f"{report['stem']}.folded").read_text(encoding="utf-8")
+        self.assertIn("test_profiling.py:busy_wait", folded)
+        stack, count = folded.splitlines()[0].rsplit(" ", 1)
+        self.assertTrue(int(count) > 0 and ";" in stack)
+        allocations = (self.directory / f"{report['stem']}.alloc.txt").read_text(encoding="utf-8")
+        self.assertIn("test_profiling.py", allocations)
+
+    def test_cprofile_mode_and_rotation(self) -> None:
+        profiler = Profiler("cprofile", self.directory, keep=2)
+        for seconds in (0.03, 0.01, 0.02):
+            with profiler.profile("submit"):
+                busy_wait(seconds)
+
+        reports = read_reports(self.directory, label="submit")
+        self.assertEqual(len(reports), 2)
+        self.assertEqual(len(list(self.directory.iterdir())), 6)
+        self.assertTrue((self.directory / f"{reports[0]['stem']}.prof").exists())
+        self.assertIn("test_profiling.py:busy_wait", reports[0]["hot"])
+        slowest = slowest_reports(self.directory, label="submit")
+        self.assertGreaterEqual(slowest[0]["seconds"], slowest[1]["seconds"])
+        self.assertEqual(read_reports(self.directory, label="rerun"), [])
+
+    def test_disabled_mode_is_a_shared_no_op(self) -> None:
+        with self.assertRaises(ValueError):
+            Profiler("off-ish", self.directory)
+        if not profiling.PROFILING_ENABLED:
+            self.assertIs(profiling.profiled("rerun"), profiling.profiled("submit"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import unittest
+
+import db
+from matching import match_foundations
+from models import ApplicantInsights, ApplicantProfile
+from repository import (
+    find_insights,
+    find_research,
+    load_application,
+    load_insights,
+    load_latest_drafts,
+    load_match_results,
+    load_research,
+    save_application,
+    save_draft,
+    save_insights,
+    save_matches,
+    save_research,
+    search_applications,
+)
+from seed import load_foundations
+from tests.support import DatabaseTestCase
+
+
+class ArtifactRepositoryTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.profile = ApplicantProfile(
+            full_name="Anna Andersson",
+            email="anna@example.se",
+            municipality="Stockholm",
+            age=72,
+            applicant_type="senior",
+            need_category="tandvård",
+            requested_amount_sek=12000,
+            monthly_income_sek=15000,
+            urgency="Hög",
+            description="Jag är pensionär med låg inkomst och behöver tandvård.",
+            has_quote=True,
+        )
+        self.application_id = save_application(self.profile)
+
+    def test_application_and_matches_are_rebuilt_from_storage(self) -> None:
+        foundations = {foundation.id: foundation for foundation in load_foundations()}
+        matches = match_foundations(self.profile, foundations.values(), top_n=3)
+        save_matches(self.application_id, matches)
+
+        loaded = load_application(self.application_id)
+        self.assertEqual(loaded, self.profile)
+        self.assertEqual(loaded.model_dump(), self.profile.model_dump())
+        self.assertIs(loaded.has_invoice, False)
+        self.assertEqual(loaded.document_flags, ["offert"])
+        self.assertIsNone(load_application(self.application_id + 1))
+        restored = load_match_results(self.application_id, foundations.get)
+        self.assertEqual(
+            [(item.foundation.id, item.score, item.reasons, item.warnings) for item in restored],
+            [(item.foundation.id, item.score, item.reasons, item.warnings) for item in matches],
+        )
+        self.assertEqual(len(load_match_results(self.application_id, lambda _: None)), 0)
+
+    def test_insights_and_research_are_found_by_application_and_prompt_hash(self) -> None:
+        insights = ApplicantInsights(
+            concise_summary="Pensionär som behöver tandvård.",
+            applicant_story="Anna behöver hjälp.",
+            normalized_need_category="tandvård",
+            extra_keywords=["tand"],
+        )
+        save_insights(self.application_id, insights, "gpt-test", "hash-1")
+        save_research(self.application_id, "## Tips", "gpt-web", "hash-2")
+
+        self.assertEqual(load_insights(self.application_id), insights)
+        self.assertEqual(find_insights("hash-1"), insights)
+        self.assertIsNone(find_insights("okänd"))
+        self.assertEqual(load_research(self.application_id), "## Tips")
+        self.assertEqual(find_research("hash-2"), "## Tips")
+        self.assertEqual(load_research(self.application_id + 1), "")
+
+    def test_drafts_are_versioned_per_foundation(self) -> None:
+        self.assertEqual(save_draft(self.application_id, "Första", "lokal"), 1)
+        self.assertEqual(save_draft(self.application_id, "Redigerad", "handläggare"), 2)
+        self.assertEqual(save_draft(self.application_id, "Till sf-001", "ai", "sf-001"), 1)
+
+        drafts = load_latest_drafts(self.application_id)
+
+        self.assertEqual(set(drafts), {"", "sf-001"})
+        self.assertEqual((drafts[""]["body"], drafts[""]["version"], drafts[""]["source"]), ("Redigerad", 2, "handläggare"))
+        self.assertEqual(drafts["sf-001"]["body"], "Till sf-001")
+
+    def test_search_folds_diacritics_and_matches_word_prefixes(self) -> None:
+        other_id = save_application(
+            self.profile.model_copy(
+                update={
+                    "municipality": "Malmö",
+                    "need_category": "boende",
+                    "description": "Vi har hyresskulder efter en lång sjukskrivning.",
+                }
+            )
+        )
+
+        self.assertEqual([row["id"] for row in search_applications("tandvard")], [self.application_id])
+        self.assertEqual([row["id"] for row in search_applications("hyresskuld")], [other_id])
+        self.assertIn("**hyresskulder**", search_applications("hyresskuld")[0]["snippet"])
+        self.assertEqual([row["id"] for row in search_applications("malmo sjuk")], [other_id])
+        self.assertEqual(search_applications('"tand" OR NOT'), [])
+        self.assertEqual(search_applications("  "), [])
+
+    def test_search_index_follows_updates_deletes_and_is_backfilled(self) -> None:
+        with db.get_connection() as connection:
+            connection.execute(
+                "UPDATE applications SET description = 'Behöver nya glasögon.' WHERE id = ?",
+                (self.application_id,),
+            )
+        self.assertEqual(search_applications("pensionär"), [])
+        self.assertEqual(len(search_applications("glasögon")), 1)
+
+        with db.get_connection() as connection:
+            connection.execute("DROP TABLE applications_fts")
+        db.ensure_db()
+        self.assertEqual(len(search_applications("glasogon")), 1)
+
+        with db.get_connection() as connection:
+            connection.execute("DELETE FROM applications WHERE id = ?", (self.application_id,))
+        self.assertEqual(search_applications("glasögon"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
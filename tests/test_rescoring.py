@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+import db
+import rescoring
+from catalog_db import SqliteCatalog, import_foundations
+from matching import match_foundations
+from models import ApplicantInsights
+from repository import (
+    list_matches_for_application,
+    load_application,
+    replace_matches,
+    save_applications_batch,
+    save_insights,
+)
+from seed import load_foundations
+from stats import check_stats
+from tests.support import DatabaseTestCase, make_profile
+
+
+class RescoringTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.foundations = load_foundations()
+        base = make_profile("tandvård", has_quote=True)
+        profiles = [
+            base,
+            base.model_copy(update={"need_category": "glasögon", "age": 24, "applicant_type": "student"}),
+            base.model_copy(update={"need_category": "boende", "municipality": "Malmö", "monthly_income_sek": 9000}),
+            base.model_copy(update={"need_category": "forskning", "applicant_type": "forskare", "age": 41}),
+        ]
+        self.ids = save_applications_batch(
+            [(profile, match_foundations(profile, self.foundations, top_n=3)) for profile in profiles]
+        )
+        insights = ApplicantInsights(
+            concise_summary="Tandvård",
+            applicant_story="Behöver tandprotes.",
+            normalized_need_category="tandvård",
+            extra_keywords=["tandprotes", "stockholm"],
+        )
+        # As the insights job does: store insights, then re-rank with their keywords.
+        save_insights(self.ids[0], insights, "stub", "hash")
+        replace_matches(
+            self.ids[0],
+            match_foundations(profiles[0], self.foundations, top_n=3, extra_keywords=insights.extra_keywords),
+        )
+        self.extra_keywords = {self.ids[0]: insights.extra_keywords}
+        with db.get_connection() as connection:
+            rescoring.mark_scored(connection, self.foundations)
+
+    def edited_catalog(self) -> list:
+        catalog = [foundation.model_copy(deep=True) for foundation in self.foundations]
+        stockholm = next(foundation for foundation in catalog if foundation.id == "sf-002")
+        stockholm.geographies = ["hela sverige"]
+        stockholm.categories.append("studier")
+        added = stockholm.model_copy(update={"id": "sf-900", "name": "Nya Boendefonden", "categories": ["boende"]})
+        return [foundation for foundation in catalog if foundation.id != "sf-001"] + [added]
+
+    def assert_rankings_match_full_recompute(self, catalog: list) -> None:
+        for application_id in self.ids:
+            expected = match_foundations(
+                load_application(application_id),
+                catalog,
+                top_n=3,
+                extra_keywords=self.extra_keywords.get(application_id),
+            )
+            stored = list_matches_for_application(application_id)
+            self.assertEqual(
+                [(row["foundation_id"], row["score"]) for row in stored],
+                [(match.foundation.id, match.score) for match in expected],
+            )
+
+    def test_only_pairs_with_changed_foundations_are_scored(self) -> None:
+        catalog = self.edited_catalog()
+        diff = rescoring.diff_catalog(catalog)
+        self.assertEqual((diff.added, diff.removed, diff.changed, diff.unchanged), (["sf-900"], ["sf-001"], ["sf-002"], 4))
+
+        report = rescoring.rescore_changed(catalog, batch_size=3, pause=0)
+
+        self.assert_rankings_match_full_recompute(catalog)
+        self.assertEqual(check_stats(), [])
+        self.assertEqual(report["full_pairs"], 4 * 6)
+        self.assertEqual(report["scored_pairs"], 4 * 2 + 4 * report["full_rescores"])
+        self.assertEqual(report["avoided_pairs"], report["full_pairs"] - report["scored_pairs"])
+        self.assertGreater(report["avoided_pairs"], 0)
+        self.assertTrue(rescoring.diff_catalog(catalog).empty)
+
+        again = rescoring.rescore_changed(catalog, pause=0)
+        self.assertEqual((again["applications"], again["scored_pairs"], again["rewritten"]), (4, 0, 0))
+
+    def test_dry_run_leaves_matches_and_catalog_version_alone(self) -> None:
+        before = [list_matches_for_application(application_id) for application_id in self.ids]
+
+        report = rescoring.rescore_changed(self.edited_catalog(), pause=0, dry_run=True)
+
+        self.assertGreater(report["rewritten"], 0)
+        self.assertEqual([list_matches_for_application(application_id) for application_id in self.ids], before)
+        self.assertFalse(rescoring.diff_catalog(self.edited_catalog()).empty)
+
+    def test_first_run_without_a_recorded_version_scores_everything(self) -> None:
+        with db.get_connection() as connection:
+            connection.execute("DELETE FROM scored_foundations")
+
+        report = rescoring.rescore_changed(self.foundations, pause=0)
+
+        self.assertEqual((report["added"], report["scored_pairs"], report["avoided_pairs"]), (6, 24, 0))
+        self.assertEqual(report["rewritten"], 0)
+
+    def test_sqlite_catalog_rescores_through_its_prefilter(self) -> None:
+        import_foundations(self.foundations)
+        for application_id in self.ids:
+            replace_matches(
+                application_id,
+                match_foundations(
+                    load_application(application_id),
+                    SqliteCatalog(),
+                    top_n=3,
+                    extra_keywords=self.extra_keywords.get(application_id),
+                ),
+            )
+        catalog = self.edited_catalog()
+        import_foundations(catalog)
+
+        report = rescoring.rescore_changed(SqliteCatalog(), top_n=3, pause=0)
+
+        self.assert_rankings_match_full_recompute(SqliteCatalog())
+        self.assertLess(report["scored_pairs"], 4 * 2 + 4 * report["full_rescores"])
+        self.assertEqual(check_stats(), [])
+
+    def test_ranking_rewritten_while_scoring_is_left_alone(self) -> None:
+        eligible_positions = rescoring._eligible_positions
+
+        def job_writes_first(catalog, applicant):
+            # An insights job replaces the first ranking after the batch was read.
+            if applicant.need_category == "tandvård":
+                replace_matches(self.ids[0], [])
+            return eligible_positions(catalog, applicant)
+
+        with mock.patch("rescoring._eligible_positions", side_effect=job_writes_first):
+            report = rescoring.rescore_changed(self.edited_catalog(), pause=0)
+
+        self.assertEqual(list_matches_for_application(self.ids[0]), [])
+        # Three rankings change with the edited catalog; the job's write keeps one of them.
+        self.assertEqual(report["rewritten"], 2)
+        self.assertEqual(check_stats(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import unittest
+
+from matching import score_foundation
+from repository import load_application, save_application
+from db import get_connection
+from reverse_matching import applicant_page, candidate_ids, rank_applicant_ids, rank_applicants
+from seed import load_foundations
+from tests.support import DatabaseTestCase, make_profile
+
+
+class ReverseMatchingTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.foundations = {foundation.id: foundation for foundation in load_foundations()}
+
+        base = make_profile("tandvård", has_quote=True)
+        variants = [
+            {},
+            {"municipality": "STOCKHOLM", "has_quote": False},
+            {"municipality": "Örebro"},
+            {"age": 45, "applicant_type": "behövande", "municipality": " stockholm "},
+            {"monthly_income_sek": 30000},
+            {"need_category": "glasögon", "age": 22, "applicant_type": "student"},
+            {"need_category": "forskning", "age": 40, "applicant_type": "forskare", "municipality": "Umeå"},
+            {"need_category": "boende", "age": 30, "applicant_type": "student", "municipality": "Malmö"},
+        ]
+        self.ids = [save_application(base.model_copy(update=update)) for update in variants]
+
+    def test_filter_keeps_only_applicants_the_foundation_can_take(self) -> None:
+        tandstod, stockholm = self.foundations["sf-001"], self.foundations["sf-002"]
+
+        self.assertEqual(candidate_ids(tandstod), [self.ids[0], self.ids[1], self.ids[2]])
+        self.assertEqual(candidate_ids(stockholm), [self.ids[0], self.ids[1], self.ids[3], self.ids[5]])
+        self.assertEqual(candidate_ids(self.foundations["sf-006"]), [self.ids[6]])
+
+    def test_ranking_agrees_with_scoring_every_candidate(self) -> None:
+        for foundation in self.foundations.values():
+            expected = sorted(
+                ((score_foundation(load_application(id_), foundation).score, id_) for id_ in candidate_ids(foundation)),
+                reverse=True,
+            )
+            ranking = rank_applicants(foundation, limit=len(self.ids), chunk_size=2)
+            self.assertEqual(ranking.total, len(expected))
+            self.assertEqual([(match.result.score, match.application_id) for match in ranking.matches], expected)
+
+    def test_pages_split_the_ranking_without_gaps(self) -> None:
+        foundation = self.foundations["sf-002"]
+        everything = [match.application_id for match in rank_applicants(foundation, limit=10).matches]
+        pages = [
+            match.application_id
+            for offset in (0, 2)
+            for match in rank_applicants(foundation, limit=2, offset=offset).matches
+        ]
+        self.assertEqual(pages, everything)
+        self.assertEqual(rank_applicants(foundation, limit=2, offset=10).matches, [])
+        top = rank_applicants(foundation, limit=1).matches[0]
+        self.assertEqual((top.applicant.full_name, top.result.foundation.id), ("Anna Andersson", "sf-002"))
+
+    def test_one_order_serves_every_page(self) -> None:
+        foundation = self.foundations["sf-002"]
+        total, order = rank_applicant_ids(foundation)
+        self.assertEqual(total, len(order))
+        self.assertEqual(rank_applicant_ids(foundation, depth=2), (total, order[:2]))
+        expected = [match.application_id for match in rank_applicants(foundation, limit=10).matches]
+        pages = [match.application_id for offset in (0, 2) for match in applicant_page(foundation, order, offset, 2)]
+        self.assertEqual(pages, expected)
+
+        with get_connection() as connection:
+            connection.execute("DELETE FROM applications WHERE id = ?", (expected[0],))
+        self.assertEqual([match.application_id for match in applicant_page(foundation, order, 0, 2)], expected[1:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
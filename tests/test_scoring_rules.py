@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List, Sequence
+from unittest import mock
+
+from pydantic import ValidationError
+
+from config import SCORING_RULES_PATH
+from matching import (
+    APPLICANT_GROUP_ALIASES,
+    KEYWORDS_BY_CATEGORY,
+    MISSING_DOC_WARNING,
+    _contains_any,
+    _keyword_boost,
+    get_scoring_plan,
+    match_foundations,
+    normalize,
+    score_foundation,
+)
+from models import ApplicantProfile, Foundation, MatchResult
+from scoring_rules import load_scoring_rules
+from seed import load_foundations
+from tests.support import applicant_grid
+
+
+def legacy_score_foundation(
+    applicant: ApplicantProfile,
+    foundation: Foundation,
+    extra_keywords: Sequence[str] | None = None,
+) -> MatchResult:
+    """The hard-coded scorer as it was before the weights moved to scoring_rules.json."""
+    score = 0
+    reasons: List[str] = []
+    warnings: List[str] = []
+    applicant_type = normalize(applicant.applicant_type)
+    need_category = normalize(applicant.need_category)
+    municipality = normalize(applicant.municipality)
+
+    aliases = APPLICANT_GROUP_ALIASES.get(applicant_type, [applicant_type])
+    if any(alias in map(normalize, foundation.target_groups) for alias in aliases):
+        score += 25
+        reasons.append("Rätt målgrupp för stiftelsen.")
+    if need_category in map(normalize, foundation.categories):
+        score += 30
+        reasons.append("Stiftelsens ändamål matchar behovet väl.")
+    else:
+        keywords = KEYWORDS_BY_CATEGORY.get(need_category, [])
+        if keywords and _contains_any(foundation.description, keywords):
+            score += 12
+            reasons.append("Beskrivningen antyder att stiftelsen kan passa behovet.")
+    geographies = list(map(normalize, foundation.geographies))
+    if "hela sverige" in geographies or municipality in geographies:
+        score += 15
+        reasons.append("Geografin matchar.")
+    elif "regional" in geographies:
+        score += 8
+        reasons.append("Regionalt stöd kan vara möjligt.")
+    if foundation.age_min <= applicant.age <= foundation.age_max:
+        score += 10
+        reasons.append("Ålderskraven ser ut att passa.")
+    else:
+        warnings.append("Åldern ligger utanför normal målgrupp.")
+        score -= 15
+    if foundation.monthly_income_cap_sek is None:
+        score += 4
+    elif applicant.monthly_income_sek <= foundation.monthly_income_cap_sek:
+        score += 12
+        reasons.append("Inkomstnivån verkar ligga inom kriterierna.")
+    else:
+        warnings.append("Inkomstnivån kan ligga över stiftelsens gräns.")
+        score -= 8
+    if foundation.typical_amount_min_sek <= applicant.requested_amount_sek <= foundation.typical_amount_max_sek:
+        score += 10
+        reasons.append("Beloppet ligger nära stiftelsens normala nivå.")
+    elif applicant.requested_amount_sek < foundation.typical_amount_min_sek:
+        score += 4
+    else:
+        warnings.append("Beloppet är högre än stiftelsens normala spann.")
+        score -= 6
+    if foundation.required_documents:
+        missing_docs = [doc for doc in foundation.required_documents if doc not in applicant.document_flags]
+        if missing_docs:
+            warnings.append(f"Saknade dokument: {', '.join(missing_docs)}.")
+            warnings.append(MISSING_DOC_WARNING)
+            score -= 5 * len(missing_docs)
+        else:
+            score += 8
+            reasons.append("Nödvändiga underlag verkar finnas.")
+    score += {"Låg": 0, "Medel": 2, "Hög": 4, "Akut": 6}.get(applicant.urgency, 0)
+    if _contains_any(applicant.description, KEYWORDS_BY_CATEGORY.get(need_category, [])):
+        score += 4
+    keyword_score, keyword_reasons = _keyword_boost(foundation, extra_keywords)
+    score += keyword_score
+    reasons.extend(keyword_reasons)
+    return MatchResult(foundation=foundation, score=max(score, 0), reasons=reasons, warnings=warnings)
+
+
+class ScoringRulesTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.foundations = load_foundations()
+
+    def test_compiled_plan_matches_legacy_scoring(self) -> None:
+        plan = get_scoring_plan()
+        for applicant in applicant_grid():
+            for extra_keywords in (None, ["tand", "protes", "syn"]):
+                for foundation in self.foundations:
+                    expected = legacy_score_foundation(applicant, foundation, extra_keywords)
+                    actual = score_foundation(applicant, foundation, extra_keywords, plan=plan)
+                    self.assertEqual(
+                        (actual.score, actual.reasons, actual.warnings),
+                        (expected.score, expected.reasons, expected.warnings),
+                    )
+
+    def test_explain_breakdown_sums_to_score(self) -> None:
+        applicant = applicant_grid()[0]
+        for match in match_foundations(applicant, self.foundations, top_n=6, explain=True):
+            self.assertEqual(max(sum(match.contributions.values()), 0), match.score)
+            self.assertIn("målgrupp", match.contributions)
+        self.assertEqual(match_foundations(applicant, self.foundations, top_n=1)[0].contributions, {})
+
+    def test_rules_file_is_reloaded_when_changed(self) -> None:
+        raw = json.loads(SCORING_RULES_PATH.read_text(encoding="utf-8"))
+        with tempfile.TemporaryDirectory() as tmp, mock.patch("matching.SCORING_RULES_CHECK_SECONDS", 0):
+            path = Path(tmp) / "rules.json"
+            path.write_text(json.dumps(raw), encoding="utf-8")
+            first = get_scoring_plan(path)
+            self.assertIs(get_scoring_plan(path), first)
+
+            raw["category"]["match"] = 100
+            path.write_text(json.dumps(raw), encoding="utf-8")
+            mtime = path.stat().st_mtime + 5
+            os.utime(path, (mtime, mtime))
+            reloaded = get_scoring_plan(path)
+
+        self.assertIsNot(reloaded, first)
+        applicant = applicant_grid()[0]
+        before = score_foundation(applicant, self.foundations[1], plan=first, explain=True)
+        after = score_foundation(applicant, self.foundations[1], plan=reloaded, explain=True)
+        self.assertEqual(after.contributions["ändamål"] - before.contributions["ändamål"], 70)
+
+    def test_broken_rules_file_keeps_the_last_good_plan(self) -> None:
+        raw = SCORING_RULES_PATH.read_text(encoding="utf-8")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "rules.json"
+            path.write_text(raw, encoding="utf-8")
+            good = get_scoring_plan(path)
+
+            path.write_text('{"broken":', encoding="utf-8")
+            mtime = path.stat().st_mtime + 5
+            os.utime(path, (mtime, mtime))
+            # Within the check interval the file is not looked at at all.
+            with mock.patch.object(Path, "stat", side_effect=AssertionError("stat")):
+                self.assertIs(get_scoring_plan(path), good)
+            with mock.patch("matching.SCORING_RULES_CHECK_SECONDS", 0):
+                with self.assertLogs("matching", "WARNING"):
+                    self.assertIs(get_scoring_plan(path), good)
+
+                path.write_text(raw, encoding="utf-8")
+                os.utime(path, (mtime + 5, mtime + 5))
+                self.assertIsNot(get_scoring_plan(path), good)
+
+        with self.assertRaises(json.JSONDecodeError), tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "rules.json"
+            path.write_text('{"broken":', encoding="utf-8")
+            get_scoring_plan(path)
+
+    def test_invalid_rules_are_rejected(self) -> None:
+        raw = json.loads(SCORING_RULES_PATH.read_text(encoding="utf-8"))
+        raw["urgency"]["Omedelbart"] = 10
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "rules.json"
+            path.write_text(json.dumps(raw), encoding="utf-8")
+            with self.assertRaises(ValidationError):
+                load_scoring_rules(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
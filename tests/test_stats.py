@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import unittest
+
+import db
+from matching import match_foundations
+from repository import save_application, save_applications_batch, save_matches
+from seed import load_foundations
+from stats import check_stats, read_stats
+from tests.support import DatabaseTestCase, make_profile
+
+
+class StatsTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.foundations = load_foundations()
+
+    def test_aggregates_follow_single_and_batched_saves(self) -> None:
+        first = make_profile("tandvård", has_quote=True)
+        application_id = save_application(first)
+        save_matches(application_id, match_foundations(first, self.foundations, top_n=3))
+        batch = [make_profile("glasögon", has_quote=False), make_profile("tandvård", has_quote=False)]
+        save_applications_batch([(profile, match_foundations(profile, self.foundations, top_n=3)) for profile in batch])
+
+        stats = read_stats()
+
+        self.assertEqual(stats["applications"], 3)
+        self.assertEqual(stats["matches"], 9)
+        self.assertEqual(stats["applications_per_category"], {"tandvård": 2, "glasögon": 1})
+        self.assertGreater(stats["missing_documents_share"], 0)
+        self.assertEqual(stats["top_foundations"][0]["match_count"], 3)
+        self.assertEqual(check_stats(), [])
+
+    def test_check_reports_drift(self) -> None:
+        profile = make_profile("tandvård", has_quote=True)
+        save_application(profile)
+        with db.get_connection() as connection:
+            connection.execute("UPDATE stats_totals SET value = 5 WHERE name = 'applications'")
+
+        self.assertEqual(len(check_stats()), 1)
+        self.assertEqual(read_stats()["applications"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+
+from throttling import GuardedCaller, RateLimiter, RateLimitExceeded, SingleFlight, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class ThrottlingTests(unittest.TestCase):
+    def test_single_flight_shares_one_execution(self) -> None:
+        flight: SingleFlight[int] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow() -> int:
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return 42
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("key", slow)))
+        leader.start()
+        started.wait(2)
+        followers = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(2)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [(42, False), (42, True), (42, True), (42, True)])
+        self.assertEqual(flight.do("key", lambda: 7), (7, False))
+
+    def test_token_bucket_queues_and_rejects_past_deadline(self) -> None:
+        clock = FakeClock()
+        bucket = TokenBucket(per_minute=60, clock=clock)
+
+        self.assertEqual(bucket.reserve(60, max_wait=0), 0.0)
+        self.assertAlmostEqual(bucket.reserve(2, max_wait=5), 2.0)
+        self.assertAlmostEqual(bucket.reserve(2, max_wait=5), 4.0)
+        self.assertIsNone(bucket.reserve(2, max_wait=5))
+        clock.now += 10
+        self.assertAlmostEqual(bucket.reserve(2, max_wait=5), 0.0)
+
+    def test_guarded_caller_counts_coalesced_throttled_and_rejected(self) -> None:
+        clock = FakeClock()
+        slept = []
+        limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000, clock=clock, sleep=slept.append)
+        caller = GuardedCaller(limiter, max_wait=45)
+
+        self.assertEqual(caller.call("a", 100, lambda: "a"), "a")
+        self.assertEqual(caller.call("b", 100, lambda: "b"), "b")
+        self.assertEqual(caller.call("c", 100, lambda: "c"), "c")
+        with self.assertRaises(RateLimitExceeded):
+            caller.call("d", 100, lambda: "d")
+
+        self.assertEqual(slept, [30.0])
+        metrics = caller.metrics()
+        self.assertEqual(metrics["calls"], 3)
+        self.assertEqual(metrics["throttled"], 1)
+        self.assertAlmostEqual(metrics["throttled_seconds"], 30.0)
+        self.assertEqual(metrics["rejected"], 1)
+        self.assertEqual(metrics["coalesced"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import json
+import unittest
+
+import openai_service
+from matching import match_foundations
+from openai_stub import StubOpenAI
+from seed import load_foundations
+from usage import format_report, usage_report
+from tests.support import DatabaseTestCase, make_profile
+
+
+class PromptPayloadTests(unittest.TestCase):
+    def test_payloads_are_compact_and_leave_out_contact_details(self) -> None:
+        first = make_profile("tandvård", has_quote=True)
+        second = make_profile("glasögon", has_quote=False)
+        first_input = openai_service._insights_input(first)
+        second_input = openai_service._insights_input(second)
+
+        self.assertEqual(first_input[0], second_input[0])
+        content = first_input[1]["content"]
+        self.assertNotIn("Anna", content)
+        self.assertNotIn("@", content)
+        self.assertNotIn("\n", content)
+        self.assertNotIn(", ", content.replace(json.loads(content)["description"], ""))
+        self.assertEqual(json.loads(content)["documents"], ["offert"])
+
+    def test_drafts_for_one_applicant_share_everything_before_the_matches(self) -> None:
+        profile = make_profile("tandvård", has_quote=True)
+        matches = match_foundations(profile, load_foundations(), top_n=2)
+        first, second = (openai_service._draft_input(profile, [match], None)[1]["content"] for match in matches)
+
+        prefix = first[: first.index('"top_matches"')]
+        self.assertTrue(second.startswith(prefix))
+        self.assertNotIn("insights", prefix)
+
+
+class UsageRecordingTests(DatabaseTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        openai_service.set_client_factory(StubOpenAI)
+        self.addCleanup(openai_service.set_client_factory, None)
+
+    def test_calls_are_recorded_and_reported(self) -> None:
+        profile = make_profile("tandvård", has_quote=True)
+        insights = openai_service.extract_applicant_insights(profile)
+        matches = match_foundations(profile, load_foundations(), top_n=3)
+        draft = openai_service.create_application_draft_ai(profile, matches, insights)
+        self.assertIn(profile.full_name, draft)
+        self.assertNotIn(openai_service.NAME_PLACEHOLDER, draft)
+
+        openai_service.set_client_factory(lambda: StubOpenAI(failure_rate=1.0))
+        with self.assertRaises(RuntimeError):
+            openai_service.research_foundations_on_web(profile, insights)
+
+        report = {row["operation"]: row for row in usage_report()}
+        self.assertEqual(set(report), {"insights", "draft", "research"})
+        self.assertEqual((report["insights"]["calls"], report["insights"]["errors"]), (1, 0))
+        self.assertGreater(report["draft"]["input_tokens"], report["insights"]["input_tokens"])
+        self.assertGreater(report["draft"]["output_tokens"], 0)
+        self.assertEqual((report["research"]["errors"], report["research"]["input_tokens"]), (1, 0))
+        self.assertEqual(sum(row["calls"] for row in usage_report(days=1)), 3)
+        self.assertEqual(usage_report(days=-1), [])
+        self.assertEqual(len(format_report(usage_report())), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
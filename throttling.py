@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from threading import Lock
+from typing import Callable, Dict, Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when a call would have to queue longer than its deadline."""
+
+
+class SingleFlight(Generic[T]):
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers that arrive while it is
+    in flight wait for and share its result (or exception).
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, function: Callable[[], T]) -> tuple[T, bool]:
+        """Return ``(result, shared)`` where ``shared`` is True for coalesced callers."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = function()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class TokenBucket:
+    """Per-minute budget that refills continuously.
+
+    Capacity is reserved up front, so the balance can go negative; later callers
+    then see a longer wait, which queues them behind earlier reservations.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = Lock()
+
+    def reserve(self, amount: float, max_wait: float) -> float | None:
+        """Reserve ``amount`` and return the seconds to wait, or None if that exceeds ``max_wait``."""
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (amount - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= amount
+            return wait
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + min(float(amount), self.capacity))
+
+
+@dataclass(slots=True)
+class CallMetrics:
+    calls: int = 0
+    coalesced: int = 0
+    throttled: int = 0
+    rejected: int = 0
+    throttled_seconds: float = 0.0
+
+
+class RateLimiter:
+    """Client-side request and token limits with a bounded queueing deadline."""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self._sleep = sleep
+
+    def acquire(self, estimated_tokens: int, max_wait: float) -> float:
+        """Block until both budgets allow the call and return the time waited.
+
+        Raises ``RateLimitExceeded`` without waiting if the queue is longer than
+        ``max_wait``, so the caller can fall back to local logic immediately.
+        """
+        request_wait = self.requests.reserve(1, max_wait)
+        if request_wait is None:
+            raise RateLimitExceeded("För många AI-anrop just nu. Den lokala logiken används i stället.")
+        token_wait = self.tokens.reserve(estimated_tokens, max_wait)
+        if token_wait is None:
+            self.requests.refund(1)
+            raise RateLimitExceeded("AI-kvoten för tokens är slut för stunden. Den lokala logiken används i stället.")
+        wait = max(request_wait, token_wait)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+class GuardedCaller:
+    """Single-flight deduplication in front of a rate limiter, with counters."""
+
+    def __init__(self, limiter: RateLimiter, max_wait: float) -> None:
+        self.limiter = limiter
+        self.max_wait = max_wait
+        self._flight: SingleFlight = SingleFlight()
+        self._metrics = CallMetrics()
+        self._lock = Lock()
+
+    def call(self, key: str, estimated_tokens: int, function: Callable[[], T]) -> T:
+        def limited() -> T:
+            try:
+                waited = self.limiter.acquire(estimated_tokens, self.max_wait)
+            except RateLimitExceeded:
+                with self._lock:
+                    self._metrics.rejected += 1
+                raise
+            with self._lock:
+                self._metrics.calls += 1
+                if waited > 0:
+                    self._metrics.throttled += 1
+                    self._metrics.throttled_seconds += waited
+            return function()
+
+        result, shared = self._flight.do(key, limited)
+        if shared:
+            with self._lock:
+                self._metrics.coalesced += 1
+        return result
+
+    def metrics(self) -> dict[str, float]:
+        with self._lock:
+            return asdict(self._metrics)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import sqlite3
+import statistics
+from typing import Any, Dict, List, Sequence
+
+from db import ensure_db, get_connection, utc_now
+
+
+logger = logging.getLogger(__name__)
+
+
+def usage_counts(response: Any) -> Dict[str, int]:
+    """Token counts from a Responses API ``usage`` object; zero for anything it lacks."""
+    usage = getattr(response, "usage", None)
+    input_details = getattr(usage, "input_tokens_details", None)
+    output_details = getattr(usage, "output_tokens_details", None)
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "cached_tokens": getattr(input_details, "cached_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "reasoning_tokens": getattr(output_details, "reasoning_tokens", 0) or 0,
+    }
+
+
+def record_usage(
+    operation: str,
+    model: str,
+    prompt_hash: str,
+    response: Any,
+    wait_seconds: float,
+    seconds: float,
+    error: str = "",
+) -> None:
+    """Store one OpenAI call. Bookkeeping must never fail the call, so database errors are only logged."""
+    counts = usage_counts(response)
+    try:
+        with get_connection() as connection:
+            connection.execute(
+                """
+                INSERT INTO openai_usage (
+                    operation, model, prompt_hash, input_tokens, cached_tokens, output_tokens,
+                    reasoning_tokens, wait_seconds, seconds, error, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    operation,
+                    model,
+                    prompt_hash,
+                    counts["input_tokens"],
+                    counts["cached_tokens"],
+                    counts["output_tokens"],
+                    counts["reasoning_tokens"],
+                    round(wait_seconds, 4),
+                    round(seconds, 4),
+                    error[:500],
+                    utc_now(),
+                ),
+            )
+    except sqlite3.Error:
+        logger.warning("Kunde inte spara tokenförbrukning för %s", operation, exc_info=True)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[round(fraction * 100) - 1]
+
+
+def usage_report(days: float | None = None) -> List[Dict[str, Any]]:
+    """Calls, tokens and latency per operation and model, optionally for the last ``days`` only."""
+    since = utc_now(-days * 86400) if days is not None else ""
+    with get_connection() as connection:
+        rows = connection.execute(
+            """
+            SELECT operation, model, input_tokens, cached_tokens, output_tokens, reasoning_tokens,
+                   wait_seconds, seconds, error
+            FROM openai_usage
+            WHERE created_at >= ?
+            ORDER BY operation, model
+            """,
+            (since,),
+        ).fetchall()
+
+    groups: Dict[tuple[str, str], List[sqlite3.Row]] = {}
+    for row in rows:
+        groups.setdefault((row["operation"], row["model"]), []).append(row)
+    report = []
+    for (operation, model), calls in groups.items():
+        input_tokens = sum(row["input_tokens"] for row in calls)
+        cached_tokens = sum(row["cached_tokens"] for row in calls)
+        seconds = [row["seconds"] for row in calls]
+        report.append(
+            {
+                "operation": operation,
+                "model": model,
+                "calls": len(calls),
+                "errors": sum(1 for row in calls if row["error"]),
+                "input_tokens": input_tokens,
+                "cached_tokens": cached_tokens,
+                "cached_share": round(cached_tokens / input_tokens, 3) if input_tokens else 0.0,
+                "output_tokens": sum(row["output_tokens"] for row in calls),
+                "reasoning_tokens": sum(row["reasoning_tokens"] for row in calls),
+                "input_tokens_per_call": round(input_tokens / len(calls)),
+                "p50_seconds": round(_percentile(sorted(seconds), 0.5), 2),
+                "p95_seconds": round(_percentile(sorted(seconds), 0.95), 2),
+                "wait_seconds": round(sum(row["wait_seconds"] for row in calls), 2),
+            }
+        )
+    return report
+
+
+def format_report(report: List[Dict[str, Any]]) -> List[str]:
+    lines = [
+        f"{'anrop':<22}{'antal':>7}{'fel':>5}{'in':>11}{'cachat':>8}{'ut':>10}{'resonemang':>12}"
+        f"{'in/anrop':>10}{'p50 s':>8}{'p95 s':>8}{'kö s':>8}"
+    ]
+    for row in report:
+        lines.append(
+            f"{row['operation'] + ' ' + row['model']:<22}{row['calls']:>7}{row['errors']:>5}"
+            f"{row['input_tokens']:>11,}{row['cached_share']:>8.0%}{row['output_tokens']:>10,}"
+            f"{row['reasoning_tokens']:>12,}{row['input_tokens_per_call']:>10,}"
+            f"{row['p50_seconds']:>8.2f}{row['p95_seconds']:>8.2f}{row['wait_seconds']:>8.1f}"
+        )
+    return lines
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Visa tokenförbrukning och svarstider för OpenAI-anrop.")
+    parser.add_argument("--days", type=float, help="Bara de senaste N dagarna.")
+    args = parser.parse_args(argv)
+
+    ensure_db()
+    report = usage_report(args.days)
+    if not report:
+        print("Inga OpenAI-anrop registrerade.")
+        return 0
+    for line in format_report(report):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())